@@ -0,0 +1,223 @@
+import os
+from typing import Dict, List, Optional
+
+from coding.python.runPython import get_random_identifier
+from courses.models import ExerciseTestCase
+
+# the submitted code is compiled with its main function renamed to this
+STUDENT_MAIN_IDENTIFIER = "__evo_student_main"
+
+# wall-clock limit for each test case, on top of the cpu time limit that
+# jobe applies to each process (and therefore to each test case)
+TESTCASE_TIME_LIMIT_SECONDS = 10
+
+HARNESS_TEMPLATE = """
+#undef main
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <signal.h>
+#include <unistd.h>
+#include <sys/stat.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+
+struct __evo_testcase {
+    const char *stdin_data;
+    size_t stdin_length;
+    /* pairs of names of the files injected by jobe and of their copies */
+    const char *files[%(max_files)d];
+};
+
+static const struct __evo_testcase __evo_testcases[] = {
+%(testcases)s
+};
+
+static void __evo_copy_file(const char *source, const char *destination) {
+    char buffer[4096];
+    size_t n;
+    FILE *in = fopen(source, "rb");
+    FILE *out = fopen(destination, "wb");
+    if (in != NULL && out != NULL) {
+        while ((n = fread(buffer, 1, sizeof buffer, in)) > 0) {
+            fwrite(buffer, 1, n, out);
+        }
+    }
+    if (in != NULL) fclose(in);
+    if (out != NULL) fclose(out);
+}
+
+static long __evo_output_length(FILE *f) {
+    fseek(f, 0, SEEK_END);
+    return ftell(f);
+}
+
+static void __evo_write_output(FILE *f) {
+    char buffer[4096];
+    size_t n;
+    rewind(f);
+    while ((n = fread(buffer, 1, sizeof buffer, f)) > 0) {
+        fwrite(buffer, 1, n, stdout);
+    }
+    fclose(f);
+}
+
+int main(int argc, char **argv) {
+    int i, j, status;
+    for (i = 0; i < %(testcase_count)d; i++) {
+        const struct __evo_testcase *testcase = &__evo_testcases[i];
+        char directory[32];
+        FILE *in = tmpfile(), *out = tmpfile(), *err = tmpfile();
+        if (in == NULL || out == NULL || err == NULL) {
+            return 1;
+        }
+        fwrite(testcase->stdin_data, 1, testcase->stdin_length, in);
+        rewind(in);
+
+        /* each test case runs in its own directory with its own files */
+        snprintf(directory, sizeof directory, "testcase_%%d", i);
+        mkdir(directory, 0700);
+        for (j = 0; testcase->files[j] != NULL; j += 2) {
+            char destination[320];
+            snprintf(destination, sizeof destination, "%%s/%%s", directory,
+                     testcase->files[j + 1]);
+            __evo_copy_file(testcase->files[j], destination);
+        }
+
+        fflush(stdout);
+        pid_t pid = fork();
+        if (pid < 0) {
+            return 1;
+        }
+        if (pid == 0) {
+            if (chdir(directory) != 0) {
+                _exit(1);
+            }
+            dup2(fileno(in), 0);
+            dup2(fileno(out), 1);
+            dup2(fileno(err), 2);
+            alarm(%(time_limit)d);
+            exit(((int (*)(int, char **))%(student_main)s)(argc, argv));
+        }
+        waitpid(pid, &status, 0);
+        fclose(in);
+
+        printf("%(nonce)s %%d %%d %%d %%ld %%ld\\n", i,
+               WIFSIGNALED(status) ? WTERMSIG(status) : 0,
+               WIFEXITED(status) ? WEXITSTATUS(status) : 0,
+               __evo_output_length(out), __evo_output_length(err));
+        __evo_write_output(out);
+        __evo_write_output(err);
+    }
+    return 0;
+}
+"""
+
+
+def get_c_string_literal(value: bytes) -> str:
+    # octal escapes are always safe, including before digits and question marks
+    return '"' + "".join(f"\\{b:03o}" for b in value) + '"'
+
+
+def get_testcase_files(testcase: ExerciseTestCase) -> Dict[str, str]:
+    """
+    Returns a dict mapping the id in jobe of each of the attachments of the
+    given test case to the name the program expects it to have
+    """
+    from coding.helpers import _get_file_id_for_jobe
+
+    return {
+        _get_file_id_for_jobe(a.attachment.name): os.path.basename(a.attachment.name)
+        for a in testcase.attachments.all()
+    }
+
+
+def get_c_program_for_vm(
+    code: str, testcases: List[ExerciseTestCase], nonce: str
+) -> str:
+    """
+    Returns a program that runs the given C code against all of the test cases.
+
+    The submitted code is compiled with its main function renamed, and the
+    program forks a process for each test case in which it runs it with the
+    stdin of the test case and in a directory containing the test case's
+    attachments, capturing its output. The output of each test case is then
+    printed after a line containing `nonce`, the index of the test case, the
+    signal that terminated it (if any), its exit code, and the length in bytes
+    of its stdout and stderr, which are printed in this order
+    """
+    testcases_files = [get_testcase_files(t) for t in testcases]
+    max_files = 2 * max(len(files) for files in testcases_files) + 1
+    testcases_str = ",\n".join(
+        "    {"
+        + get_c_string_literal(t.stdin.encode("utf-8"))
+        + f", {len(t.stdin.encode('utf-8'))}, {{"
+        + "".join(
+            f'"{file_id}", {get_c_string_literal(filename.encode("utf-8"))}, '
+            for file_id, filename in files.items()
+        )
+        + "NULL}}"
+        for t, files in zip(testcases, testcases_files)
+    )
+    return (
+        f"#define main {STUDENT_MAIN_IDENTIFIER}\n"
+        + "#line 1\n"  # report errors in the submitted code with its line numbers
+        + f"{code}\n"
+        + HARNESS_TEMPLATE
+        % {
+            "max_files": max_files,
+            "testcases": testcases_str,
+            "testcase_count": len(testcases),
+            "time_limit": TESTCASE_TIME_LIMIT_SECONDS,
+            "student_main": STUDENT_MAIN_IDENTIFIER,
+            "nonce": nonce,
+        }
+    )
+
+
+def get_c_program_nonce() -> str:
+    return get_random_identifier()
+
+
+def parse_c_program_output(
+    output: str, nonce: str, testcase_count: int
+) -> Optional[List[dict]]:
+    """
+    Splits the output of a program returned by get_c_program_for_vm into
+    the stdout, stderr, exit code, and terminating signal of each test case.
+
+    Returns None if the output isn't well-formed, e.g. because it was truncated
+    """
+    output_bytes = output.encode("utf-8")
+    results = []
+    position = 0
+    try:
+        for i in range(testcase_count):
+            end = output_bytes.index(b"\n", position)
+            header = output_bytes[position:end].decode("utf-8").split(" ")
+            if len(header) != 6 or header[0] != nonce or int(header[1]) != i:
+                return None
+            signal, exit_code, stdout_length, stderr_length = map(int, header[2:])
+            stdout_end = end + 1 + stdout_length
+            stderr_end = stdout_end + stderr_length
+            if stderr_end > len(output_bytes):
+                return None
+            results.append(
+                {
+                    "signal": signal,
+                    "exit_code": exit_code,
+                    "stdout": output_bytes[end + 1 : stdout_end].decode(
+                        "utf-8", errors="replace"
+                    ),
+                    "stderr": output_bytes[stdout_end:stderr_end].decode(
+                        "utf-8", errors="replace"
+                    ),
+                }
+            )
+            position = stderr_end
+    except ValueError:
+        return None
+
+    if position != len(output_bytes):
+        return None
+    return results
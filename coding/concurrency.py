@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db import connections
+
+
+def _in_worker_thread(function: Callable) -> Callable:
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # database connections are per-thread: don't leak those opened here
+            connections.close_all()
+
+    return wrapper
+
+
+def _capture_exception(function: Callable) -> Callable:
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            return e
+
+    return wrapper
+
+
+def map_concurrently(
+    function: Callable,
+    items: Iterable,
+    max_threads: Optional[int] = None,
+    return_exceptions: bool = False,
+) -> Iterator:
+    """
+    Calls `function` on each of the items using up to `max_threads` threads
+    (settings.CODE_EXECUTION_MAX_THREADS by default), and yields the results
+    in the same order as the items as soon as they're available.
+
+    If `return_exceptions` is True, the exceptions raised by the calls are
+    yielded in place of their results, otherwise the first one is re-raised.
+
+    Meant for calls that spend most of their time waiting on Jobe: anything
+    that needs the database should be fetched by the caller beforehand, as
+    the threads don't share the caller's transaction
+    """
+    items = list(items)
+    max_threads = min(max_threads or settings.CODE_EXECUTION_MAX_THREADS, len(items))
+    if return_exceptions:
+        function = _capture_exception(function)
+
+    if max_threads <= 1:
+        yield from (function(item) for item in items)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        yield from executor.map(_in_worker_thread(function), items)
@@ -0,0 +1,107 @@
+"""
+Cache of the results of running code against the test cases of programming
+exercises.
+
+Results are addressed by the content of what is run: the language of the
+exercise, whether it requires TypeScript, a hash of the code, and a hash of
+the test cases and their attachments. Running the same code against the same
+test cases is answered from the cache, and changing the test cases of an
+exercise changes the keys of its results, so there's nothing to invalidate
+"""
+
+import hashlib
+import json
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+# increment whenever the way code is run changes the shape of its results
+EXECUTION_RESULTS_CACHE_VERSION = 1
+
+HITS_KEY = "code_execution_cache_hits"
+MISSES_KEY = "code_execution_cache_misses"
+
+# test case errors caused by the state of the sandbox rather than by the code
+TRANSIENT_ERRORS = ("overload", "internal_error")
+
+
+def get_testcases_fingerprint(testcases: Iterable) -> str:
+    """
+    Returns a hash of the given test cases and of the names of their attachments,
+    which are unique as uploaded files are never overwritten
+    """
+    return hashlib.sha256(
+        json.dumps(
+            [
+                [
+                    t.pk,
+                    t.code,
+                    t.stdin,
+                    t.expected_stdout,
+                    [a.attachment.name for a in t.attachments.all()],
+                ]
+                for t in testcases
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def get_execution_results_cache_key(exercise, code: str, testcases: Iterable) -> str:
+    code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    return (
+        f"code_execution_results_{EXECUTION_RESULTS_CACHE_VERSION}"
+        f"_{exercise.exercise_type}_{int(exercise.requires_typescript)}"
+        f"_{code_hash}_{get_testcases_fingerprint(testcases)}"
+    )
+
+
+def _increment(key: str):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the counter was reset in the meantime
+        pass
+
+
+def get_cached_execution_results(key: str) -> Optional[dict]:
+    results = cache.get(key)
+    _increment(HITS_KEY if results is not None else MISSES_KEY)
+    return results
+
+
+def is_cacheable(results: dict) -> bool:
+    """
+    Results are cached only if the code actually ran, and none of its test
+    cases failed because of the sandbox
+    """
+    return (
+        results.get("state") == "completed"
+        and any(
+            field in results
+            for field in ("tests", "compilation_errors", "execution_error")
+        )
+        and not any(
+            t.get("error") in TRANSIENT_ERRORS for t in results.get("tests", [])
+        )
+    )
+
+
+def cache_execution_results(key: str, results: dict):
+    if is_cacheable(results):
+        cache.set(key, results, settings.CODE_EXECUTION_CACHE_TIMEOUT_SECONDS)
+
+
+def get_execution_cache_stats() -> dict:
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses > 0 else None,
+    }
+
+
+def reset_execution_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,230 @@
+"""
+A minimal implementation of the REST API of Jobe, used to test and benchmark
+the code that runs programming exercises without a real Jobe server.
+
+C programs are compiled with gcc and Python programs are run with the local
+interpreter, without any sandboxing: only use it with trusted code. The server
+can add latency to each run and reject runs with the overload outcome when
+more than a given number of them are in progress, as Jobe does when it has no
+free runners, and keeps count of the requests and connections it handles
+"""
+
+import base64
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+RUNS_PATH = "/jobe/index.php/restapi/runs"
+FILES_PATH = "/jobe/index.php/restapi/files/"
+
+OUTCOME_COMPILATION_ERROR = 11
+OUTCOME_RUNTIME_ERROR = 12
+OUTCOME_TIMEOUT = 13
+OUTCOME_OK = 15
+OUTCOME_OVERLOAD = 21
+
+DEFAULT_CPU_TIME_SECONDS = 5
+
+
+class FakeJobeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body=None):
+        content = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_PUT(self):
+        body = self.read_json()
+        if not self.path.startswith(FILES_PATH):
+            return self.send_json(404)
+        file_id = self.path[len(FILES_PATH) :]
+        self.server.files[file_id] = base64.b64decode(body["file_contents"])
+        self.send_json(204)
+
+    def do_HEAD(self):
+        file_id = self.path[len(FILES_PATH) :]
+        self.send_json(204 if file_id in self.server.files else 404)
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.path != RUNS_PATH:
+            return self.send_json(404)
+        run_spec = body["run_spec"]
+        if any(f[0] not in self.server.files for f in run_spec.get("file_list", [])):
+            return self.send_json(404, "One or more of the specified files is missing")
+
+        with self.server.stats_lock:
+            self.server.stats["runs"] += 1
+            overloaded = (
+                self.server.overloaded_runs > 0
+                or self.server.running >= self.server.max_running
+            )
+            if overloaded:
+                self.server.overloaded_runs = max(0, self.server.overloaded_runs - 1)
+                self.server.stats["overloaded"] += 1
+            else:
+                self.server.running += 1
+                self.server.stats["max_running"] = max(
+                    self.server.stats["max_running"], self.server.running
+                )
+        if overloaded:
+            return self.send_json(200, {"outcome": OUTCOME_OVERLOAD})
+
+        try:
+            time.sleep(self.server.latency)
+            result = self.server.execute(run_spec)
+        finally:
+            with self.server.stats_lock:
+                self.server.running -= 1
+        self.send_json(200, result)
+
+
+class FakeJobeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: float = 0,
+        max_running: int = 64,
+        overloaded_runs: int = 0,
+        port: int = 0,
+    ):
+        """
+        `latency` is added to each run, runs beyond the `max_running` ones in
+        progress are rejected, and so are the first `overloaded_runs` runs
+        """
+        super().__init__(("127.0.0.1", port), FakeJobeRequestHandler)
+        self.latency = latency
+        self.max_running = max_running
+        self.overloaded_runs = overloaded_runs
+        self.running = 0
+        self.files = {}
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            "connections": 0,
+            "runs": 0,
+            "overloaded": 0,
+            "max_running": 0,
+            "compilations": 0,
+        }
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def runs_url(self) -> str:
+        return self.base_url + RUNS_PATH
+
+    @property
+    def files_url(self) -> str:
+        return self.base_url + FILES_PATH
+
+    def start(self) -> "FakeJobeServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def execute(self, run_spec: dict) -> dict:
+        workdir = tempfile.mkdtemp(prefix="fake_jobe_")
+        try:
+            for file_id, filename in run_spec.get("file_list", []):
+                with open(os.path.join(workdir, filename), "wb") as f:
+                    f.write(self.files[file_id])
+            parameters = run_spec.get("parameters", {})
+            language = run_spec["language_id"]
+            if language == "c":
+                source = os.path.join(workdir, "prog.c")
+                executable = os.path.join(workdir, "prog")
+                with open(source, "w") as f:
+                    f.write(run_spec["sourcecode"])
+                with self.stats_lock:
+                    self.stats["compilations"] += 1
+                compilation = subprocess.run(
+                    ["gcc", "-o", executable, source, *parameters.get("linkargs", [])],
+                    capture_output=True,
+                    text=True,
+                )
+                if compilation.returncode != 0:
+                    return {
+                        "outcome": OUTCOME_COMPILATION_ERROR,
+                        "cmpinfo": compilation.stderr,
+                        "stdout": "",
+                        "stderr": "",
+                    }
+                command = [executable]
+            elif language == "python3":
+                source = os.path.join(workdir, "prog.py")
+                with open(source, "w") as f:
+                    f.write(run_spec["sourcecode"])
+                command = [sys.executable, source]
+            else:
+                return {
+                    "outcome": OUTCOME_COMPILATION_ERROR,
+                    "cmpinfo": f"Unsupported language {language}",
+                    "stdout": "",
+                    "stderr": "",
+                }
+
+            try:
+                execution = subprocess.run(
+                    command,
+                    input=run_spec.get("input") or "",
+                    capture_output=True,
+                    text=True,
+                    cwd=workdir,
+                    timeout=parameters.get("cputime", DEFAULT_CPU_TIME_SECONDS),
+                )
+            except subprocess.TimeoutExpired:
+                return {
+                    "outcome": OUTCOME_TIMEOUT,
+                    "cmpinfo": "",
+                    "stdout": "",
+                    "stderr": "",
+                }
+            return {
+                "outcome": OUTCOME_OK
+                if execution.returncode == 0
+                else OUTCOME_RUNTIME_ERROR,
+                "cmpinfo": "",
+                "stdout": execution.stdout,
+                "stderr": execution.stderr,
+            }
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
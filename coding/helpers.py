@@ -2,14 +2,33 @@ import base64
 import hashlib
 import json
 import os
-import subprocess
+import signal
+from django.conf import settings
 from django.core.exceptions import ValidationError
 import requests
+from coding.c.runC import (
+    get_c_program_for_vm,
+    get_c_program_nonce,
+    get_testcase_files,
+    parse_c_program_output,
+)
+from coding.concurrency import map_concurrently
+from coding.execution_cache import (
+    cache_execution_results,
+    get_cached_execution_results,
+    get_execution_results_cache_key,
+)
+from coding.jobe import JobeFileNotFound, get_jobe_client
+from coding.node_pool import (
+    NodeWorkerError,
+    NodeWorkerTimeout,
+    get_node_worker_pool,
+)
 from coding.python.runPython import get_python_program_for_vm
 from courses.models import Exercise, ExerciseTestCase, ExerciseTestCaseAttachment
 from courses.serializers import ExerciseTestCaseSerializer
 from django.db.models.fields.files import FieldFile
-from django.db.models import QuerySet
+from django.db.models import QuerySet, prefetch_related_objects
 import hashlib
 
 JOBE_OUTCOMES = {
@@ -30,14 +49,11 @@ logger = logging.getLogger(__name__)
 
 
 def send_jobe_request(body, headers, req_method, url=""):
-    call_func = getattr(requests, req_method)
-    response = call_func(
-        url
-        or os.environ.get(
-            "JOBE_POST_RUN_URL",
-            "http://192.168.1.14:4001/jobe/index.php/restapi/runs",
-        ),
-        data=json.dumps(body),
+    client = get_jobe_client()
+    response = client.request(
+        req_method,
+        url or client.runs_url,
+        body,
         headers=headers or {"content-type": "application/json"},
     )
 
@@ -72,32 +88,11 @@ def _create_testcase_attachments_in_jobe(testcase):
     for t in attachments:
         file_id = _get_file_id_for_jobe(t.attachment.name)
         file_content = _encode_file_for_jobe(t.attachment)
-        response = requests.put(
-            os.environ.get(
-                "JOBE_FILES_URL",
-                "http://192.168.1.14:4001/jobe/index.php/restapi/files/",
-            )
-            + str(file_id),
-            data=json.dumps({"file_contents": file_content}),
-            headers={"content-type": "application/json"},
-        )
-
-        if str(response.status_code)[0] != "2":
-            logger.error(
-                "error while creating files for test case "
-                + str(testcase.pk)
-                + ": jobe responded with error: "
-                + str(response.status_code)
-                + " ("
-                + str(response.content)
-                + ")\n"
-                + "file id: "
-                + str(file_id)
-                + "file content: "
-                + str(file_content)
-                + "\n\n---\n\n"
-            )
-            response.raise_for_status()
+        try:
+            get_jobe_client().put_file(file_id, file_content)
+        except requests.HTTPError:
+            logger.error("error while creating files for test case " + str(testcase.pk))
+            raise
 
 
 class MissingTestCaseAttachment(Exception):
@@ -114,33 +109,20 @@ def _run_c_testcase(code, testcase):
         for s in testcase.attachments.all()
     ]
 
-    response = requests.post(
-        os.environ.get(
-            "JOBE_POST_RUN_URL",
-            "http://192.168.1.14:4001/jobe/index.php/restapi/runs",
-        ),
-        data=json.dumps(
+    try:
+        return get_jobe_client().run(
             {
-                "run_spec": {
-                    "language_id": "c",
-                    "input": testcase.stdin,
-                    "sourcecode": code,
-                    "parameters": {
-                        "linkargs": ["-lm"],
-                    },
-                    "file_list": injected_files,  # attach files from test case
-                }
+                "language_id": "c",
+                "input": testcase.stdin,
+                "sourcecode": code,
+                "parameters": {
+                    "linkargs": ["-lm"],
+                },
+                "file_list": injected_files,  # attach files from test case
             }
-        ),
-        headers={"content-type": "application/json"},
-    )
-    if response.status_code == 404:
+        )
+    except JobeFileNotFound:
         raise MissingTestCaseAttachment
-    if str(response.status_code)[0] != "2":
-        logger.error("jobe responded with error: " + str(response.status_code))
-        response.raise_for_status()
-
-    return response
 
 
 # def _run_c_testcase_with_retry(code, testcase):
@@ -157,29 +139,106 @@ def _run_c_testcase(code, testcase):
 #     raise Exception
 
 
-def run_c_code_in_vm(code, testcases):
-    ret = {}
-    for testcase in testcases:
-        try:
-            response = _run_c_testcase(code, testcase)
-        except MissingTestCaseAttachment:
-            # create missing attachments for the testcase and retry
+def _run_c_testcase_creating_attachments(code, testcase):
+    try:
+        return _run_c_testcase(code, testcase)
+    except MissingTestCaseAttachment:
+        # create missing attachments for the testcase and retry
+        _create_testcase_attachments_in_jobe(testcase)
+        return _run_c_testcase(code, testcase)
+
+
+def _get_c_testcase_error(result):
+    if result["signal"] in (signal.SIGALRM, signal.SIGXCPU, signal.SIGKILL):
+        return JOBE_OUTCOMES[13]
+    if result["signal"] != 0 or result["exit_code"] != 0:
+        return JOBE_OUTCOMES[12]
+    return None
+
+
+def _run_c_testcases_in_single_run(code, testcases):
+    """
+    Compiles the code once and runs it against all the test cases in a single
+    jobe run (see coding.c.runC). Returns None if the run doesn't complete
+    successfully, in which case the test cases should be run one by one, which
+    also gives the compiler output for the submitted code alone
+    """
+    testcases = list(testcases)
+    if len(testcases) == 0:
+        return None
+    prefetch_related_objects(testcases, "attachments")
+
+    nonce = get_c_program_nonce()
+    file_ids = {file_id for t in testcases for file_id in get_testcase_files(t)}
+    run_spec = {
+        "language_id": "c",
+        "sourcecode": get_c_program_for_vm(code, testcases, nonce),
+        "parameters": {
+            "linkargs": ["-lm"],
+        },
+        # files are copied to the directory of each test case by the program
+        "file_list": [[file_id, file_id] for file_id in sorted(file_ids)],
+    }
+    try:
+        response_body = get_jobe_client().run(run_spec)
+    except JobeFileNotFound:
+        for testcase in testcases:
             _create_testcase_attachments_in_jobe(testcase)
-            response = _run_c_testcase(code, testcase)
+        response_body = get_jobe_client().run(run_spec)
 
-        try:
-            response_body = response.json()
-        except Exception as e:
-            # TODO better handling
-            logger.error(
-                "couldn't decode "
-                + str(response.status_code)
-                + " ("
-                + str(response.content)
-                + ")\n"
+    if response_body["outcome"] != 15:
+        return None
+    results = parse_c_program_output(
+        response_body.get("stdout") or "", nonce, len(testcases)
+    )
+    if results is None:
+        logger.warning("couldn't parse the output of a compile-once C run")
+        return None
+
+    tests = []
+    for testcase, result in zip(testcases, results):
+        error = _get_c_testcase_error(result)
+        tests.append(
+            {
+                "id": testcase.id,
+                "passed": error is None
+                and _program_stdout_matches_expected(
+                    result["stdout"], testcase.expected_stdout
+                ),
+                "stdout": result["stdout"],
+                "stderr": result["stderr"],
+                "error": error,
+            }
+        )
+    return {"tests": tests, "state": "completed"}
+
+
+def run_c_code_in_vm(code, testcases):
+    if settings.JOBE_C_COMPILE_ONCE:
+        ret = _run_c_testcases_in_single_run(code, testcases)
+        if ret is not None:
+            return ret
+
+    testcases = list(testcases)
+    # fetched here, as the test cases are run in other threads
+    prefetch_related_objects(testcases, "attachments")
+
+    # the first test case is run on its own so that code that doesn't
+    # compile isn't sent to jobe once for every test case
+    response_bodies = [
+        _run_c_testcase_creating_attachments(code, testcase)
+        for testcase in testcases[:1]
+    ]
+    if len(response_bodies) == 1 and response_bodies[0]["outcome"] != 11:
+        response_bodies += list(
+            map_concurrently(
+                lambda testcase: _run_c_testcase_creating_attachments(code, testcase),
+                testcases[1:],
             )
-            raise
+        )
 
+    ret = {}
+    for testcase, response_body in zip(testcases, response_bodies):
         outcome_code = response_body["outcome"]
 
         # compilation errors
@@ -213,6 +272,16 @@ JS/TS
 """
 
 
+def _get_js_sandbox_error_results(execution_error, testcases):
+    return {
+        "execution_error": execution_error,
+        "tests": [
+            {"id": t.id, "passed": False, "error": "internal_error"} for t in testcases
+        ],
+        "state": "completed",
+    }
+
+
 def run_js_code_in_vm(code, exercise, testcases, use_ts):
     """
     Takes in a string containing JS code and a list of testcases; runs the code in a JS
@@ -221,36 +290,22 @@ def run_js_code_in_vm(code, exercise, testcases, use_ts):
 
     # return JavaScriptCodeRunner(exercise, code).run()
 
-    node_vm_path = os.environ.get("NODE_VM_PATH", "coding/ts/runJs.js")
-
     testcases_json = [{"id": t.id, "assertion": t.code} for t in testcases]
 
-    # call node subprocess and run user code against test cases
+    # run user code against test cases in one of the node workers
     try:
-        res = subprocess.check_output(
-            [
-                "node",
-                node_vm_path,
-                code,
-                json.dumps(testcases_json),
-                json.dumps(use_ts),
-            ]
-        )
-        return {**json.loads(res), "state": "completed"}
-    except subprocess.CalledProcessError as e:
-        print(
-            "-----\n\n\n",
-            e.returncode,
-            "\n\n",
-            e.output,
-            "\n\n",
-            e.stdout,
-            "\n\n",
-            e.cmd,
-            "\n\n",
-            e.args,
-            "\n\n-----",
-        )
+        results = get_node_worker_pool().run(code, testcases_json, use_ts)
+    except NodeWorkerTimeout:
+        # the sandbox times out on its own, so this takes either code that the
+        # TypeScript compiler takes forever to compile or workers slowed down
+        # by load: like sandbox errors of C code, the test cases are marked as
+        # internal errors so that the results aren't cached
+        return _get_js_sandbox_error_results("Execution timed out", testcases)
+    except NodeWorkerError as e:
+        # likewise for workers that crash or can't be started
+        logger.error("couldn't run JS code: %s", e, exc_info=1)
+        return _get_js_sandbox_error_results("Couldn't run the code", testcases)
+    return {**results, "state": "completed"}
 
 
 """
@@ -261,25 +316,14 @@ Python
 def run_python_code_in_vm(code, testcases):
     code_to_run = get_python_program_for_vm(code, testcases)
     print("CODE TO RUN\n", code_to_run)
-    response = requests.post(
-        os.environ.get(
-            "JOBE_POST_RUN_URL",
-            "http://192.168.1.14:4001/jobe/index.php/restapi/runs",
-        ),
-        data=json.dumps(
-            {
-                "run_spec": {
-                    "language_id": "python3",
-                    # "input": testcase.stdin,
-                    "sourcecode": code_to_run,
-                    # "parameters": {"linkargs": ["-lm"]},
-                }
-            }
-        ),
-        headers={"content-type": "application/json"},
+    response_body = get_jobe_client().run(
+        {
+            "language_id": "python3",
+            # "input": testcase.stdin,
+            "sourcecode": code_to_run,
+            # "parameters": {"linkargs": ["-lm"]},
+        }
     )
-    print("RESPONSE", response)
-    response_body = response.json()
     outcome_code = response_body["outcome"]
 
     # compilation errors
@@ -307,26 +351,35 @@ Exposed function
 
 
 def get_code_execution_results(slot=None, **kwargs):
-    ret = None
     exercise: Exercise = (
         slot.exercise if kwargs.get("exercise") is None else kwargs.get("exercise")
     )
     code: str = slot.answer_text if kwargs.get("code") is None else kwargs.get("code")
 
     testcases: QuerySet[ExerciseTestCase] = exercise.testcases.all()
+    prefetch_related_objects(testcases, "attachments")
+
+    # identical code run against identical test cases gives identical results
+    cache_key = get_execution_results_cache_key(exercise, code, testcases)
+    ret = get_cached_execution_results(cache_key)
+
+    if ret is None:
+        if exercise.exercise_type == Exercise.JS:
+            # return run_js_code_in_vm(code, exercise, [], False)
+            ret = run_js_code_in_vm(
+                code, exercise, testcases, exercise.requires_typescript
+            )
 
-    if exercise.exercise_type == Exercise.JS:
-        # return run_js_code_in_vm(code, exercise, [], False)
-        ret = run_js_code_in_vm(code, exercise, testcases, exercise.requires_typescript)
+        elif exercise.exercise_type == Exercise.C:
+            ret = run_c_code_in_vm(code, testcases)
 
-    elif exercise.exercise_type == Exercise.C:
-        ret = run_c_code_in_vm(code, testcases)
+        elif exercise.exercise_type == Exercise.PYTHON:
+            ret = run_python_code_in_vm(code, testcases)
 
-    elif exercise.exercise_type == Exercise.PYTHON:
-        ret = run_python_code_in_vm(code, testcases)
+        if ret is None:
+            raise ValidationError("Non-coding exercise " + str(exercise.pk))
 
-    if ret is None:
-        raise ValidationError("Non-coding exercise " + str(exercise.pk))
+        cache_execution_results(cache_key, ret)
 
     # add md5 of executed code to results object to keep track of what code the object refers to
     ret["code_md5"] = hashlib.md5(code.encode("utf-8")).hexdigest()
@@ -0,0 +1,241 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOBE_OUTCOME_OK = 15
+JOBE_OUTCOME_OVERLOAD = 21
+
+GLOBAL_SLOT_KEY_PREFIX = "jobe_global_slot_"
+GLOBAL_SLOT_RETRY_DELAY_SECONDS = 0.05
+
+
+class JobeFileNotFound(Exception):
+    """
+    Raised when a run refers to a file that doesn't exist in Jobe
+    """
+
+    pass
+
+
+@contextmanager
+def global_concurrency_slot(max_concurrency: int, lease_seconds: float, wait_seconds):
+    """
+    Holds one of `max_concurrency` slots shared by all the processes that use
+    the cache, which must therefore be shared among them (e.g. Redis, see
+    CACHE_URL). Slots are leased for `lease_seconds`, so that those held by
+    processes that die are eventually freed. Raises TimeoutError if no slot
+    frees up within `wait_seconds`. Does nothing if `max_concurrency` is 0
+    """
+    if not max_concurrency:
+        yield
+        return
+
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        key = next(
+            (
+                key
+                for key in (
+                    f"{GLOBAL_SLOT_KEY_PREFIX}{i}"
+                    for i in random.sample(range(max_concurrency), max_concurrency)
+                )
+                if cache.add(key, True, math.ceil(lease_seconds))
+            ),
+            None,
+        )
+        if key is not None:
+            break
+        if time.monotonic() >= deadline:
+            raise TimeoutError("Couldn't acquire a global Jobe concurrency slot")
+        time.sleep(random.uniform(0, 2 * GLOBAL_SLOT_RETRY_DELAY_SECONDS))
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+class JobeClient:
+    """
+    Client for the REST API of the Jobe sandbox.
+
+    Requests go through a session with a pool of keep-alive connections, so
+    that consecutive runs reuse the same connections, and at most
+    `max_concurrency` of them are in flight at once, and at most
+    `global_max_concurrency` across all processes if set. Runs that Jobe rejects
+    because it's overloaded are retried after an exponential backoff with
+    full jitter, so that the retries of many clients don't happen in bursts
+    """
+
+    def __init__(
+        self,
+        runs_url: Optional[str] = None,
+        files_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None,
+        global_max_concurrency: Optional[int] = None,
+    ):
+        self.runs_url = runs_url or settings.JOBE_RUNS_URL
+        self.files_url = files_url or settings.JOBE_FILES_URL
+        self.timeout = timeout or settings.JOBE_TIMEOUT_SECONDS
+        self.max_concurrency = max_concurrency or settings.JOBE_MAX_CONCURRENCY
+        self.max_retries = (
+            max_retries if max_retries is not None else settings.JOBE_MAX_RETRIES
+        )
+        self.retry_backoff = (
+            retry_backoff
+            if retry_backoff is not None
+            else settings.JOBE_RETRY_BACKOFF_SECONDS
+        )
+
+        self.global_max_concurrency = (
+            global_max_concurrency
+            if global_max_concurrency is not None
+            else settings.JOBE_GLOBAL_MAX_CONCURRENCY
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_concurrency,
+            pool_block=True,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"content-type": "application/json"})
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def get_backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.retry_backoff * 2**attempt)
+
+    def send(self, method: str, url: str, body=None, **kwargs):
+        """
+        Sends a request to Jobe once, waiting for one of the concurrency slots of
+        the client, and then for one of the global ones, to be free. Raises
+        TimeoutError if no global slot frees up in time
+        """
+        with self._slots, global_concurrency_slot(
+            self.global_max_concurrency,
+            # leave time to read the response after the timeout
+            lease_seconds=2 * self.timeout,
+            wait_seconds=self.timeout,
+        ):
+            return self.session.request(
+                method,
+                url,
+                data=json.dumps(body) if body is not None else None,
+                timeout=self.timeout,
+                **kwargs,
+            )
+
+    def request(self, method: str, url: str, body=None, **kwargs):
+        """
+        Sends a request to Jobe (see `send`), retrying it up to `max_retries`
+        times if it fails to connect
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.send(method, url, body, **kwargs)
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Couldn't connect to Jobe, retrying ({attempt + 1})")
+                time.sleep(self.get_backoff(attempt))
+
+    def run(self, run_spec: dict) -> dict:
+        """
+        Submits a run to Jobe and returns its result. Runs that fail to connect
+        or that Jobe rejects because it's overloaded are retried, up to
+        `max_retries` times in all, after which the overload result is returned,
+        or the connection error raised. The overload result is also returned if
+        no global concurrency slot frees up in time
+        """
+        overload_result = {"outcome": JOBE_OUTCOME_OVERLOAD, "stdout": "", "stderr": ""}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.send("post", self.runs_url, {"run_spec": run_spec})
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Couldn't connect to Jobe, retrying ({attempt + 1})")
+                time.sleep(self.get_backoff(attempt))
+                continue
+            except TimeoutError:
+                logger.warning("Timed out waiting for a global Jobe concurrency slot")
+                return overload_result
+
+            if response.status_code == 404:
+                raise JobeFileNotFound
+            if response.status_code != 503:
+                if str(response.status_code)[0] != "2":
+                    logger.error(
+                        "jobe responded with error: " + str(response.status_code)
+                    )
+                    response.raise_for_status()
+                result = response.json()
+                if result.get("outcome") != JOBE_OUTCOME_OVERLOAD:
+                    return result
+            if attempt == self.max_retries:
+                break
+            logger.warning(f"Jobe is overloaded, retrying run ({attempt + 1})")
+            time.sleep(self.get_backoff(attempt))
+
+        return overload_result
+
+    def put_file(self, file_id: str, file_contents: str):
+        """
+        Uploads a file, whose contents are base64-encoded, to Jobe
+        """
+        response = self.request(
+            "put", self.files_url + str(file_id), {"file_contents": file_contents}
+        )
+        if str(response.status_code)[0] != "2":
+            logger.error(
+                "jobe responded with error while creating file "
+                + str(file_id)
+                + ": "
+                + str(response.status_code)
+                + " ("
+                + str(response.content)
+                + ")"
+            )
+            response.raise_for_status()
+
+
+_clients = {}
+
+
+def get_jobe_client() -> JobeClient:
+    """
+    Returns the Jobe client of the current process, so that each worker has its
+    own pool of connections which isn't shared with the processes forked from it
+    """
+    key = (
+        os.getpid(),
+        settings.JOBE_RUNS_URL,
+        settings.JOBE_FILES_URL,
+        settings.JOBE_TIMEOUT_SECONDS,
+        settings.JOBE_MAX_CONCURRENCY,
+        settings.JOBE_MAX_RETRIES,
+        settings.JOBE_RETRY_BACKOFF_SECONDS,
+        settings.JOBE_GLOBAL_MAX_CONCURRENCY,
+    )
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = JobeClient()
+    return client
@@ -0,0 +1,231 @@
+"""
+Pool of long-lived Node.js processes running the code of JS/TS exercises.
+
+Each worker runs coding/ts/worker.js, which loads vm2 and the TypeScript
+compiler once, and then runs jobs it receives on stdin as line-delimited JSON,
+writing a line with the result of each job to stdout. Each worker runs one job
+at a time. Workers are replaced after a number of jobs or when their memory
+grows past a limit, and are killed if a job doesn't complete in time, if they
+die, or if they're still busy with work left behind by a job (e.g. promise
+callbacks, which the timeout of the sandbox doesn't bound) once it's complete,
+so that a job can't affect the ones after it
+"""
+
+import atexit
+import itertools
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+from django.conf import settings
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORKER_STARTUP_TIMEOUT_SECONDS = 30
+
+
+class NodeWorkerError(Exception):
+    """
+    Raised when a worker couldn't run a job
+    """
+
+    pass
+
+
+class NodeWorkerTimeout(NodeWorkerError):
+    pass
+
+
+class NodeWorkerCrashed(NodeWorkerError):
+    pass
+
+
+class NodeWorker:
+    """
+    A Node.js process running the worker script, used by one thread at a time
+    """
+
+    def __init__(self, command: List[str]):
+        self.jobs = 0
+        self.memory = 0
+        # whether the worker went back to idle after its last job
+        self.idle = True
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, daemon=True).start()
+        # wait for the worker to be ready
+        try:
+            self._read_response(time.monotonic() + WORKER_STARTUP_TIMEOUT_SECONDS)
+        except NodeWorkerError:
+            self.stop()
+            raise
+
+    def _read_lines(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def _read_response(self, deadline: float) -> dict:
+        while True:
+            try:
+                line = self._lines.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise NodeWorkerTimeout
+            if line is None:
+                raise NodeWorkerCrashed(
+                    f"Node worker exited with code {self.process.wait()}"
+                )
+            try:
+                return json.loads(line)
+            except ValueError:
+                logger.warning(f"Unexpected output from node worker: {line.rstrip()}")
+
+    def run(self, job: dict, timeout: float) -> dict:
+        self.jobs += 1
+        deadline = time.monotonic() + timeout
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            raise NodeWorkerCrashed("Couldn't send job to node worker")
+
+        response = self._read_response(deadline)
+        while response.get("id") != job["id"]:
+            response = self._read_response(deadline)
+
+        # the worker reports when it has no more work left from the job
+        self.idle = False
+        try:
+            while not self.idle:
+                self.idle = self._read_response(deadline).get("idle") == job["id"]
+        except NodeWorkerError:
+            logger.warning("Node worker didn't go back to idle after a job")
+
+        self.memory = response.get("memory", 0)
+        if "error" in response:
+            raise NodeWorkerError(response["error"])
+        return response["result"]
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+
+class NodeWorkerPool:
+    """
+    Runs jobs on up to `size` workers at the same time, starting them as they're
+    needed and reusing them until they've run `max_jobs` jobs or their memory
+    exceeds `max_memory_mb`. A worker that doesn't complete a job and go back
+    to idle within `job_timeout` seconds, or that dies, is discarded
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+        max_memory_mb: Optional[int] = None,
+        job_timeout: Optional[float] = None,
+        command: Optional[List[str]] = None,
+    ):
+        self.size = size or settings.NODE_WORKER_POOL_SIZE
+        self.max_jobs = max_jobs or settings.NODE_WORKER_MAX_JOBS
+        self.max_memory_mb = max_memory_mb or settings.NODE_WORKER_MAX_MEMORY_MB
+        self.job_timeout = job_timeout or settings.NODE_WORKER_JOB_TIMEOUT_SECONDS
+        self.command = command or ["node", settings.NODE_WORKER_PATH]
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle_workers = queue.LifoQueue()
+        self._job_ids = itertools.count()
+        self.stats = {"started": 0, "recycled": 0, "discarded": 0}
+
+    def run(self, code: str, testcases: List[dict], use_ts: bool) -> dict:
+        """
+        Runs the given code against the given test cases, which are dicts
+        containing their id and assertion, and returns the results
+        """
+        job = {
+            "id": next(self._job_ids),
+            "code": code,
+            "testcases": testcases,
+            "use_ts": use_ts,
+        }
+        with self._slots:
+            worker = self._get_worker()
+            try:
+                result = worker.run(job, self.job_timeout)
+            except (NodeWorkerTimeout, NodeWorkerCrashed):
+                self.stats["discarded"] += 1
+                worker.stop()
+                raise
+            except NodeWorkerError:
+                self._release_worker(worker)
+                raise
+            self._release_worker(worker)
+            return result
+
+    def _get_worker(self) -> NodeWorker:
+        try:
+            return self._idle_workers.get_nowait()
+        except queue.Empty:
+            self.stats["started"] += 1
+            return NodeWorker(self.command)
+
+    def _release_worker(self, worker: NodeWorker):
+        if not worker.idle:
+            self.stats["discarded"] += 1
+            worker.stop()
+        elif (
+            worker.jobs >= self.max_jobs
+            or worker.memory > self.max_memory_mb * 1024 * 1024
+        ):
+            self.stats["recycled"] += 1
+            worker.stop()
+        else:
+            self._idle_workers.put(worker)
+
+    def stop(self):
+        while True:
+            try:
+                self._idle_workers.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+
+
+def get_node_worker_pool() -> NodeWorkerPool:
+    """
+    Returns the pool of node workers of the current process
+    """
+    key = (
+        os.getpid(),
+        settings.NODE_WORKER_PATH,
+        settings.NODE_WORKER_POOL_SIZE,
+        settings.NODE_WORKER_MAX_JOBS,
+        settings.NODE_WORKER_MAX_MEMORY_MB,
+        settings.NODE_WORKER_JOB_TIMEOUT_SECONDS,
+    )
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = NodeWorkerPool()
+        atexit.register(pool.stop)
+    return pool
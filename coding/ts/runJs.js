@@ -3,82 +3,63 @@
 const { VM } = require("vm2");
 const assert = require("assert");
 const AssertionError = require("assert").AssertionError;
-const compileTsToJs = require("./tsCompilation").tsToJs;
+const {
+  compileStandalone,
+  transpileOnly,
+  typeCheck,
+} = require("./tsCompilation");
 const utils = require("./utils");
 
-// rename assert and AssertionError inside generated program to make them inaccessible to user
-const assertIdentifier = utils.getRandomIdentifier(20);
-const assertionErrorIdentifier = utils.getRandomIdentifier(20);
-const prettyPrintErrorIdentifier = utils.getRandomIdentifier(20);
-const prettyPrintAssertionErrorIdentifier = utils.getRandomIdentifier(20);
-
 const SANDBOX_TIMEOUT = utils.SANDBOX_TIMEOUT;
 
-// instantiation of the vm that'll run the user-submitted program
-const safeVm = new VM({
-  timeout: SANDBOX_TIMEOUT, // set timeout to prevent endless loops from running forever
-  sandbox: {
-    [prettyPrintErrorIdentifier]: utils.prettyPrintError,
-    [prettyPrintAssertionErrorIdentifier]: utils.prettyPrintAssertionError,
-    [assertIdentifier]: assert,
-    [assertionErrorIdentifier]: AssertionError,
-  },
-});
-
-const compileFromTs = JSON.parse(process.argv[4] ?? "false");
-
-const testcases = JSON.parse(process.argv[3]);
-
-const outputArrIdentifier = utils.getRandomIdentifier(32);
-const testDetailsObjIdentifier = utils.getRandomIdentifier(32);
-const testcaseCounterIdentifier = utils.getRandomIdentifier(32);
-
-const vmIdentifiers = [
-  // outputArrIdentifier,
-  //testDetailsObjIdentifier,
-  //testcaseCounterIdentifier,
-  assertIdentifier,
-  assertionErrorIdentifier,
-  prettyPrintErrorIdentifier,
-  prettyPrintAssertionErrorIdentifier,
-];
+// stand-ins for the random identifiers in the TypeScript test cases, so that
+// the same test cases always transpile to the same code, which can be cached
+const IDENTIFIER_PLACEHOLDERS = {
+  outputArr: "__evo_outputArr__",
+  testDetailsObj: "__evo_testDetailsObj__",
+  testcaseCounter: "__evo_testcaseCounter__",
+  assert: "__evo_assert__",
+  assertionError: "__evo_assertionError__",
+  prettyPrintError: "__evo_prettyPrintError__",
+  prettyPrintAssertionError: "__evo_prettyPrintAssertionError__",
+};
 
 // turn array of strings representing assertions to a series of try-catch blocks
 //  where those assertions are evaluated and the result is pushed to an array
 // the resulting string will be inlined into the program that the vm will run
-const assertionString =
-  `let ${testcaseCounterIdentifier} = 0;` +
-  testcases
-    .map(
-      (a) =>
-        `
-        var ${testDetailsObjIdentifier}${compileFromTs ? ":any" : ""} = {
+function getAssertionString(testcases, identifiers, compileFromTs) {
+  return (
+    `let ${identifiers.testcaseCounter} = 0;` +
+    testcases
+      .map(
+        (a) =>
+          `
+        var ${identifiers.testDetailsObj}${compileFromTs ? ":any" : ""} = {
             id: \`${a.id}\`,
         }
         try {
             // run the assertion
 
-            ${a.assertion.replace(/assert/g, assertIdentifier)}
+            ${a.assertion.replace(/assert/g, identifiers.assert)}
 
-            ${testDetailsObjIdentifier}.passed = true // if no exception is thrown, the test case passed
+            ${identifiers.testDetailsObj}.passed = true // if no exception is thrown, the test case passed
         } catch(e) {
-            ${testDetailsObjIdentifier}.passed = false
-            if(e instanceof ${assertionErrorIdentifier}) {
-                ${testDetailsObjIdentifier}.error = ${prettyPrintAssertionErrorIdentifier}(e) // test case failed but code threw no errors
+            ${identifiers.testDetailsObj}.passed = false
+            if(e instanceof ${identifiers.assertionError}) {
+                ${identifiers.testDetailsObj}.error = ${identifiers.prettyPrintAssertionError}(e) // test case failed but code threw no errors
             } else {
-                ${testDetailsObjIdentifier}.error = ${prettyPrintErrorIdentifier}(e) // code threw an error during test case execution
+                ${identifiers.testDetailsObj}.error = ${identifiers.prettyPrintError}(e) // code threw an error during test case execution
             }
         }
-        ${outputArrIdentifier}[${testcaseCounterIdentifier}++] = ${testDetailsObjIdentifier} // push test case results
+        ${identifiers.outputArr}[${identifiers.testcaseCounter}++] = ${identifiers.testDetailsObj} // push test case results
     `
-    )
-    .join("");
-
-const userCode = process.argv[2];
+      )
+      .join("")
+  );
+}
 
-let machineProgram = `const ${outputArrIdentifier}${
-  compileFromTs ? ":any" : ""
-} = [];
+function getMachineProgram(userCode, assertionString, outputArrIdentifier) {
+  return `const ${outputArrIdentifier} = [];
 ${userCode}
 // USER CODE ENDS HERE
 if(Object.isFrozen(${outputArrIdentifier})) {
@@ -89,24 +70,154 @@ if(Object.isFrozen(${outputArrIdentifier})) {
 ${assertionString}
 // output outcome object to console
 ${outputArrIdentifier}`;
+}
+
+// placeholders the test cases use without declaring them
+const ENVIRONMENT_PLACEHOLDERS = [
+  IDENTIFIER_PLACEHOLDERS.outputArr,
+  IDENTIFIER_PLACEHOLDERS.assert,
+  IDENTIFIER_PLACEHOLDERS.assertionError,
+  IDENTIFIER_PLACEHOLDERS.prettyPrintError,
+  IDENTIFIER_PLACEHOLDERS.prettyPrintAssertionError,
+];
+
+/**
+ * Compiles the user code and the test cases separately: the user code is
+ * type-checked on its own, while the test cases are transpiled with
+ * placeholders in place of the random identifiers, so that both compilations
+ * can be cached and reused across submissions and test runs. The test cases
+ * are then type-checked against the declarations emitted for the user code,
+ * which is much cheaper than checking them together with the user code
+ */
+function compileTsProgram(userCode, testcases, identifiers) {
+  const userCompilation = compileStandalone(userCode);
+  if (userCompilation.compilationErrors.length > 0) {
+    return userCompilation;
+  }
+  const assertionString = getAssertionString(
+    testcases,
+    IDENTIFIER_PLACEHOLDERS,
+    true
+  );
+  const testcasesCompilation = transpileOnly(assertionString);
+  if (testcasesCompilation.compilationErrors.length > 0) {
+    return testcasesCompilation;
+  }
+  const typeErrors = typeCheck(assertionString, ENVIRONMENT_PLACEHOLDERS, [
+    // fall back to checking against the user code itself if its
+    // declarations couldn't be emitted
+    userCompilation.declarations == null
+      ? { code: userCode, isDeclaration: false }
+      : { code: userCompilation.declarations, isDeclaration: true },
+  ]);
+  if (typeErrors.length > 0) {
+    return { compilationErrors: typeErrors };
+  }
+
+  let compiledTestcases = stripUseStrict(testcasesCompilation.compiledCode);
+  for (const [name, placeholder] of Object.entries(IDENTIFIER_PLACEHOLDERS)) {
+    compiledTestcases = compiledTestcases
+      .split(placeholder)
+      .join(identifiers[name]);
+  }
+
+  return {
+    compilationErrors: "",
+    // the directive is kept on the first line so that the whole program is
+    // still in strict mode without shifting the line numbers of the user code
+    compiledCode:
+      '"use strict"; ' +
+      getMachineProgram(
+        stripUseStrict(userCompilation.compiledCode),
+        compiledTestcases,
+        identifiers.outputArr
+      ),
+  };
+}
+
+const stripUseStrict = (code) => code.replace(/^"use strict";\r?\n/, "");
+
+/**
+ * Runs the given user code against the given test cases in a new sandboxed vm
+ * and returns an object containing either the results of the test cases
+ * (`tests`), the TypeScript compilation errors (`compilation_errors`), or
+ * the error thrown before any test cases could be run (`execution_error`)
+ *
+ * userCode: string
+ * testcases: {id: number, assertion: string}[]
+ * compileFromTs: boolean
+ */
+function runProgram(userCode, testcases, compileFromTs) {
+  // rename assert and AssertionError inside generated program to make them inaccessible to user
+  const assertIdentifier = utils.getRandomIdentifier(20);
+  const assertionErrorIdentifier = utils.getRandomIdentifier(20);
+  const prettyPrintErrorIdentifier = utils.getRandomIdentifier(20);
+  const prettyPrintAssertionErrorIdentifier = utils.getRandomIdentifier(20);
+
+  // instantiation of the vm that'll run the user-submitted program
+  const safeVm = new VM({
+    timeout: SANDBOX_TIMEOUT, // set timeout to prevent endless loops from running forever
+    sandbox: {
+      [prettyPrintErrorIdentifier]: utils.prettyPrintError,
+      [prettyPrintAssertionErrorIdentifier]: utils.prettyPrintAssertionError,
+      [assertIdentifier]: assert,
+      [assertionErrorIdentifier]: AssertionError,
+    },
+  });
 
-if (compileFromTs) {
-  const compilationResult = compileTsToJs(machineProgram, vmIdentifiers);
-  if (compilationResult.compilationErrors.length > 0) {
-    console.log(
-      JSON.stringify({
+  const outputArrIdentifier = utils.getRandomIdentifier(32);
+  const testDetailsObjIdentifier = utils.getRandomIdentifier(32);
+  const testcaseCounterIdentifier = utils.getRandomIdentifier(32);
+
+  const identifiers = {
+    outputArr: outputArrIdentifier,
+    testDetailsObj: testDetailsObjIdentifier,
+    testcaseCounter: testcaseCounterIdentifier,
+    assert: assertIdentifier,
+    assertionError: assertionErrorIdentifier,
+    prettyPrintError: prettyPrintErrorIdentifier,
+    prettyPrintAssertionError: prettyPrintAssertionErrorIdentifier,
+  };
+
+  let machineProgram;
+  if (compileFromTs) {
+    const compilationResult = compileTsProgram(
+      userCode,
+      testcases,
+      identifiers
+    );
+    if (compilationResult.compilationErrors.length > 0) {
+      return {
         compilation_errors: compilationResult.compilationErrors,
-      })
+      };
+    }
+    machineProgram = compilationResult.compiledCode;
+  } else {
+    machineProgram = getMachineProgram(
+      userCode,
+      getAssertionString(testcases, identifiers, false),
+      outputArrIdentifier
     );
-    process.exit(0);
   }
-  machineProgram = compilationResult.compiledCode;
+
+  try {
+    const outcome = safeVm.run(machineProgram); // run program
+    return { tests: outcome };
+  } catch (e) {
+    // an error occurred before any test cases could be run
+    return { execution_error: utils.prettyPrintError(e) };
+  }
 }
 
-try {
-  const outcome = safeVm.run(machineProgram); // run program
-  console.log(JSON.stringify({ tests: outcome })); // output outcome so Django can collect it
-} catch (e) {
-  // an error occurred before any test cases could be run
-  console.log(JSON.stringify({ execution_error: utils.prettyPrintError(e) }));
+module.exports = {
+  runProgram,
+};
+
+if (require.main === module) {
+  // run once with the code and test cases passed as arguments
+  const userCode = process.argv[2];
+  const testcases = JSON.parse(process.argv[3]);
+  const compileFromTs = JSON.parse(process.argv[4] ?? "false");
+  // output outcome so Django can collect it
+  console.log(JSON.stringify(runProgram(userCode, testcases, compileFromTs)));
 }
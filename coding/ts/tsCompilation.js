@@ -1,25 +1,25 @@
 const ts = require("typescript");
 const tsConfig = require("./tsconfig.json");
+const crypto = require("crypto");
 const fs = require("fs");
+const path = require("path");
 const getRandomIdentifier = require("./utils").getRandomIdentifier;
 
 const ENV_DECLARATION_SEPARATOR = "/*" + getRandomIdentifier(20) + "*/";
 
-function createTsSourceFile(filename, source) {
-  fs.writeFileSync(filename, source);
-  return filename;
-}
+// transpiled code is cached by the hash of its source, in memory and, if
+// TS_TRANSPILE_CACHE_DIR is set, on disk, so that it can be shared among
+// workers and survive their recycling
+const MEMORY_CACHE_SIZE = parseInt(
+  process.env.TS_TRANSPILE_CACHE_SIZE ?? "1000"
+);
+const DISK_CACHE_DIR = process.env.TS_TRANSPILE_CACHE_DIR;
 
-function deleteTmpFiles(filename) {
-  try {
-    fs.unlinkSync(getAbsoluteTmpFilePath(filename) + ".ts");
-    fs.unlinkSync(getAbsoluteTmpFilePath(filename) + ".js");
-  } catch {}
-}
+const memoryCache = new Map();
+const cacheStats = { hits: 0, diskHits: 0, misses: 0 };
 
-function getAbsoluteTmpFilePath(filename) {
-  return getTmpFileDir() + filename;
-}
+// lib files are the same for every program: they're only parsed once
+const libSourceFiles = new Map();
 
 function getTmpFileDir() {
   return __dirname + "/tmp/";
@@ -37,31 +37,8 @@ function addEnvironmentDeclarations(source, environment) {
   return envDeclarations + "\n" + ENV_DECLARATION_SEPARATOR + "\n" + source;
 }
 
-function compile(source, options, environment) {
-  const filename = getRandomIdentifier(20);
-  const filepath = getAbsoluteTmpFilePath(filename) + ".ts";
-
-  if (!fs.existsSync(getTmpFileDir())) {
-    fs.mkdirSync(getTmpFileDir(), 0744, { recursive: true });
-  }
-
-  // add dummy declarations for the identifiers in `environment` to prevent compilation errors
-  const sourceWithEnvironmentDeclarations = addEnvironmentDeclarations(
-    source,
-    environment
-  );
-
-  createTsSourceFile(filepath, sourceWithEnvironmentDeclarations);
-
-  const defaultCompilerHost = ts.createCompilerHost({});
-  const program = ts.createProgram([filepath], options, defaultCompilerHost);
-  const emitResult = program.emit();
-
-  const allDiagnostics = ts
-    .getPreEmitDiagnostics(program)
-    .concat(emitResult.diagnostics);
-
-  const processedDiagnostics = allDiagnostics
+function formatDiagnostics(diagnostics) {
+  return diagnostics
     .map((diagnostic) => {
       if (diagnostic.file) {
         let { line, character } = ts.getLineAndCharacterOfPosition(
@@ -80,15 +57,117 @@ function compile(source, options, environment) {
       }
     })
     .join("\n\n");
+}
+
+// compiler host that reads the sources from memory instead of from temporary
+// files, and collects the output instead of writing it
+function createInMemoryCompilerHost(options, files, outputs) {
+  const host = ts.createCompilerHost({});
+  const getSourceFile = host.getSourceFile;
+  const fileExists = host.fileExists;
+  const readFile = host.readFile;
+
+  host.getSourceFile = (fileName, languageVersion, onError, shouldCreate) => {
+    if (fileName in files) {
+      return ts.createSourceFile(fileName, files[fileName], languageVersion);
+    }
+    const key = languageVersion + ":" + fileName;
+    if (!libSourceFiles.has(key)) {
+      libSourceFiles.set(
+        key,
+        getSourceFile.call(
+          host,
+          fileName,
+          languageVersion,
+          onError,
+          shouldCreate
+        )
+      );
+    }
+    return libSourceFiles.get(key);
+  };
+  host.fileExists = (fileName) =>
+    fileName in files || fileExists.call(host, fileName);
+  host.readFile = (fileName) =>
+    fileName in files ? files[fileName] : readFile.call(host, fileName);
+  host.writeFile = (fileName, text) => {
+    outputs[fileName] = text;
+  };
+  return host;
+}
+
+/**
+ * Compiles `source`, returning the compilation errors and, if there are none,
+ * the compiled code.
+ *
+ * `dependencies` is a list of {code: string, isDeclaration: boolean} containing
+ * code that `source` uses, which is type-checked along with it but not emitted.
+ * If `emitDeclarations` is true, the declarations of `source` are returned as
+ * well, or null if they can't be emitted: failing to emit them isn't an error
+ */
+function compile(
+  source,
+  options,
+  environment,
+  { dependencies = [], emitDeclarations = false } = {}
+) {
+  // the files are never written: their paths are only used to resolve type roots
+  const filepath = getTmpFileDir() + getRandomIdentifier(20) + ".ts";
+
+  // add dummy declarations for the identifiers in `environment` to prevent compilation errors
+  const files = {
+    [filepath]: addEnvironmentDeclarations(source, environment),
+  };
+  for (const { code, isDeclaration } of dependencies) {
+    const dependencyPath =
+      getTmpFileDir() +
+      getRandomIdentifier(20) +
+      (isDeclaration ? ".d.ts" : ".ts");
+    files[dependencyPath] = code;
+  }
+
+  const outputs = {};
+  const program = ts.createProgram(
+    Object.keys(files),
+    emitDeclarations ? { ...options, declaration: true } : options,
+    createInMemoryCompilerHost(options, files, outputs)
+  );
+  const emitResult = program.emit(program.getSourceFile(filepath));
+
+  let allDiagnostics = ts
+    .getPreEmitDiagnostics(program)
+    .concat(emitResult.diagnostics);
+
+  let declarationsEmitted = emitDeclarations;
+  if (emitDeclarations) {
+    const declarationErrors = new Set(
+      program.getDeclarationDiagnostics().map((d) => formatDiagnostics([d]))
+    );
+    declarationsEmitted = declarationErrors.size === 0;
+    allDiagnostics = allDiagnostics.filter(
+      (d) => !declarationErrors.has(formatDiagnostics([d]))
+    );
+  }
+
+  const processedDiagnostics = formatDiagnostics(allDiagnostics);
 
   const res = {
     compilationErrors: processedDiagnostics,
   };
 
-  if (processedDiagnostics.length === 0) {
-    res.compiledCode = String(
-      fs.readFileSync(getAbsoluteTmpFilePath(filename) + ".js")
+  if (emitDeclarations) {
+    const declarationOutput = Object.entries(outputs).find(([fileName]) =>
+      fileName.endsWith(".d.ts")
     );
+    res.declarations =
+      declarationsEmitted && declarationOutput ? declarationOutput[1] : null;
+  }
+
+  const jsOutput = Object.entries(outputs).find(([fileName]) =>
+    fileName.endsWith(".js")
+  );
+  if (processedDiagnostics.length === 0 && jsOutput) {
+    res.compiledCode = jsOutput[1];
     if (environment && environment.length > 0) {
       // strip first line containing dummy declarations from the environment
       const declarationLine = res.compiledCode.split(
@@ -100,13 +179,106 @@ function compile(source, options, environment) {
     }
   }
 
-  deleteTmpFiles(filename);
   return res;
 }
 
+// only checks the syntax, which doesn't depend on any other code
+function transpile(source, options) {
+  const output = ts.transpileModule(source, {
+    compilerOptions: options,
+    reportDiagnostics: true,
+  });
+  const processedDiagnostics = formatDiagnostics(output.diagnostics ?? []);
+  const res = {
+    compilationErrors: processedDiagnostics,
+  };
+  if (processedDiagnostics.length === 0) {
+    res.compiledCode = output.outputText;
+  }
+  return res;
+}
+
+function rememberCompilation(key, compilation) {
+  memoryCache.set(key, compilation);
+  if (memoryCache.size > MEMORY_CACHE_SIZE) {
+    // evict the least recently used compilation
+    memoryCache.delete(memoryCache.keys().next().value);
+  }
+}
+
+function cachedCompilation(kind, source, compileSource) {
+  const key = crypto
+    .createHash("sha256")
+    .update(
+      JSON.stringify([kind, ts.version, tsConfig.compilerOptions, source])
+    )
+    .digest("hex");
+
+  if (memoryCache.has(key)) {
+    const compilation = memoryCache.get(key);
+    // move to the end of the eviction order
+    memoryCache.delete(key);
+    memoryCache.set(key, compilation);
+    cacheStats.hits++;
+    return compilation;
+  }
+
+  const diskCachePath =
+    DISK_CACHE_DIR && path.join(DISK_CACHE_DIR, key + ".json");
+  if (diskCachePath) {
+    try {
+      const compilation = JSON.parse(fs.readFileSync(diskCachePath));
+      rememberCompilation(key, compilation);
+      cacheStats.diskHits++;
+      return compilation;
+    } catch {}
+  }
+
+  cacheStats.misses++;
+  const compilation = compileSource(source);
+  rememberCompilation(key, compilation);
+  if (diskCachePath) {
+    try {
+      fs.mkdirSync(DISK_CACHE_DIR, { recursive: true });
+      // write to a temporary file first so that readers never see partial files
+      const tmpPath = diskCachePath + "." + getRandomIdentifier(8);
+      fs.writeFileSync(tmpPath, JSON.stringify(compilation));
+      fs.renameSync(tmpPath, diskCachePath);
+    } catch {}
+  }
+  return compilation;
+}
+
 const tsToJs = (source, environment) =>
   compile(source, tsConfig.compilerOptions, environment);
 
+// type-checks and compiles code that doesn't depend on any other code, caching
+// the result, which includes its declarations so that code using it can be
+// type-checked against them
+const compileStandalone = (source) =>
+  cachedCompilation("standalone", source, (s) =>
+    compile(s, tsConfig.compilerOptions, [], { emitDeclarations: true })
+  );
+
+// returns the errors found type-checking `source` together with the code it
+// depends on (see `compile`), without emitting it
+const typeCheck = (source, environment, dependencies) =>
+  compile(source, { ...tsConfig.compilerOptions, noEmit: true }, environment, {
+    dependencies,
+  }).compilationErrors;
+
+// transpiles code without type-checking it, caching the result
+const transpileOnly = (source) =>
+  cachedCompilation("transpile", source, (s) =>
+    transpile(s, tsConfig.compilerOptions)
+  );
+
+const getCacheStats = () => ({ ...cacheStats, size: memoryCache.size });
+
 module.exports = {
   tsToJs,
+  compileStandalone,
+  transpileOnly,
+  typeCheck,
+  getCacheStats,
 };
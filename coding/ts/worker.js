@@ -0,0 +1,57 @@
+/**
+ * Long-lived process that runs JS/TS programs for Django (see coding/node_pool.py)
+ *
+ * Reads jobs from stdin, one JSON object per line:
+ * {id: number, code: string, testcases: {id: number, assertion: string}[], use_ts: boolean}
+ *
+ * and writes, for each job, one line to stdout containing a JSON object:
+ * {id: number, result?: object, error?: string, memory: number}
+ *
+ * where `result` is what runJs.js would output for the job, `error` describes
+ * what went wrong if the job couldn't be run, and `memory` is the resident set
+ * size of the process in bytes, which is used to decide when to recycle it.
+ * A line containing {ready: true} is written once the worker has started.
+ *
+ * Code run in the sandbox can leave promise callbacks behind, which its timeout
+ * doesn't bound. Once the callbacks queued by a job have run, {idle: id} is
+ * written: a worker that doesn't get there in time is discarded by Django.
+ *
+ * Loading vm2 and the TypeScript compiler only happens once per worker, and
+ * transpiled TypeScript is cached by the worker (see tsCompilation.js): the
+ * number of cached compilations is set by TS_TRANSPILE_CACHE_SIZE, and setting
+ * TS_TRANSPILE_CACHE_DIR also caches them on disk, shared by all the workers
+ */
+const readline = require("readline");
+const { runProgram } = require("./runJs");
+
+// stdout is reserved for the responses
+const writeLine = (obj) => process.stdout.write(JSON.stringify(obj) + "\n");
+console.log = console.error;
+
+const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+
+rl.on("line", (line) => {
+  let job;
+  try {
+    job = JSON.parse(line);
+  } catch (e) {
+    writeLine({ id: null, error: "Malformed job", memory: process.memoryUsage().rss });
+    return;
+  }
+
+  const response = { id: job.id };
+  try {
+    response.result = runProgram(job.code, job.testcases, job.use_ts ?? false);
+  } catch (e) {
+    response.error = String(e);
+  }
+  response.memory = process.memoryUsage().rss;
+  writeLine(response);
+  // runs after the microtask queue has been drained
+  setImmediate(() => writeLine({ idle: job.id }));
+});
+
+// Django closed the pipe: no more jobs
+rl.on("close", () => process.exit(0));
+
+writeLine({ ready: true });
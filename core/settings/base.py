@@ -288,9 +288,85 @@ MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
 MEDIA_URL = os.environ.get("MEDIA_URL", "/media/")
 
 
+# e.g. redis://127.0.0.1:6379/1 to share the cache among processes
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_BROKER_URL = os.environ.get("RABBITMQ_URL", "amqp://localhost:5672")
 
+CELERY_BEAT_SCHEDULE = {
+    # persist the automatic state transitions of events (e.g. opening
+    # and closing of exams) shortly after they're due
+    "apply_event_state_transitions": {
+        "task": "courses.tasks.apply_event_state_transitions_task",
+        "schedule": float(os.environ.get("EVENT_STATE_TRANSITIONS_INTERVAL", 30)),
+    },
+}
+
+# buffer the submissions to exam slots in the cache and persist them in
+# batches instead of writing each autosave to the database (see
+# courses.logic.submission_buffer), flushing them every few seconds
+SUBMISSION_WRITE_BEHIND = os.environ.get("SUBMISSION_WRITE_BEHIND", "False") == "True"
+SUBMISSION_WRITE_BEHIND_FLUSH_INTERVAL = float(
+    os.environ.get("SUBMISSION_WRITE_BEHIND_FLUSH_INTERVAL", 5)
+)
+if SUBMISSION_WRITE_BEHIND:
+    CELERY_BEAT_SCHEDULE["flush_buffered_submissions"] = {
+        "task": "courses.tasks.flush_buffered_submissions_task",
+        "schedule": SUBMISSION_WRITE_BEHIND_FLUSH_INTERVAL,
+    }
+
+# how many minutes before the beginning of an exam its participations are
+# pre-generated, and how many participations each background task generates
+PARTICIPATION_PREGENERATION_LEAD_MINUTES = int(
+    os.environ.get("PARTICIPATION_PREGENERATION_LEAD_MINUTES", 10)
+)
+PARTICIPATION_PREGENERATION_BATCH_SIZE = int(
+    os.environ.get("PARTICIPATION_PREGENERATION_BATCH_SIZE", 50)
+)
+
+# Jobe sandbox used to run programming exercises (see coding.jobe): each
+# process keeps up to JOBE_MAX_CONCURRENCY connections open and in flight,
+# and retries runs rejected because Jobe is overloaded up to JOBE_MAX_RETRIES
+# times, waiting a random time up to JOBE_RETRY_BACKOFF_SECONDS * 2^attempt
+JOBE_RUNS_URL = os.environ.get(
+    "JOBE_POST_RUN_URL", "http://192.168.1.14:4001/jobe/index.php/restapi/runs"
+)
+JOBE_FILES_URL = os.environ.get(
+    "JOBE_FILES_URL", "http://192.168.1.14:4001/jobe/index.php/restapi/files/"
+)
+JOBE_TIMEOUT_SECONDS = float(os.environ.get("JOBE_TIMEOUT_SECONDS", 30))
+JOBE_MAX_CONCURRENCY = int(os.environ.get("JOBE_MAX_CONCURRENCY", 8))
+JOBE_MAX_RETRIES = int(os.environ.get("JOBE_MAX_RETRIES", 5))
+JOBE_RETRY_BACKOFF_SECONDS = float(os.environ.get("JOBE_RETRY_BACKOFF_SECONDS", 0.5))
+# cap on the requests in flight to jobe across all processes, which requires
+# the cache to be shared among them (0 means no cap besides the per-process one)
+JOBE_GLOBAL_MAX_CONCURRENCY = int(os.environ.get("JOBE_GLOBAL_MAX_CONCURRENCY", 0))
+# how many test cases and submissions each process runs at the same time
+CODE_EXECUTION_MAX_THREADS = int(os.environ.get("CODE_EXECUTION_MAX_THREADS", 8))
+# long-lived node processes that run the code of JS/TS exercises (see
+# coding.node_pool): each process starts up to NODE_WORKER_POOL_SIZE of them,
+# and replaces them after NODE_WORKER_MAX_JOBS jobs or when their memory grows
+# past NODE_WORKER_MAX_MEMORY_MB
+NODE_WORKER_PATH = os.environ.get(
+    "NODE_WORKER_PATH", os.path.join(BASE_DIR, "coding", "ts", "worker.js")
+)
+NODE_WORKER_POOL_SIZE = int(os.environ.get("NODE_WORKER_POOL_SIZE", 2))
+NODE_WORKER_MAX_JOBS = int(os.environ.get("NODE_WORKER_MAX_JOBS", 200))
+NODE_WORKER_MAX_MEMORY_MB = int(os.environ.get("NODE_WORKER_MAX_MEMORY_MB", 512))
+NODE_WORKER_JOB_TIMEOUT_SECONDS = float(
+    os.environ.get("NODE_WORKER_JOB_TIMEOUT_SECONDS", 10)
+)
+# how long the results of running code against the test cases of an exercise
+# are cached for (see coding.execution_cache)
+CODE_EXECUTION_CACHE_TIMEOUT_SECONDS = int(
+    os.environ.get("CODE_EXECUTION_CACHE_TIMEOUT_SECONDS", 60 * 60 * 24)
+)
+# compile C submissions once and run them against all the test cases in a
+# single jobe run (see coding.c.runC) instead of a run per test case
+JOBE_C_COMPILE_ONCE = os.environ.get("JOBE_C_COMPILE_ONCE", "False") == "True"
+
 
 # Email settings
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
@@ -27,8 +27,11 @@ class TrackFieldsMixin(models.Model):
     @classmethod
     def from_db(cls, db, field_names, values):
         instance = super().from_db(db, field_names, values)
+        # accessing deferred fields would fetch them (e.g. Collector uses `only`)
+        deferred_fields = instance.get_deferred_fields()
         for fieldname in cls.TRACKED_FIELDS:
-            setattr(instance, f"_old_{fieldname}", getattr(instance, fieldname))
+            if fieldname not in deferred_fields:
+                setattr(instance, f"_old_{fieldname}", getattr(instance, fieldname))
 
         return instance
 
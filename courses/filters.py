@@ -65,7 +65,7 @@ class EventFilter(FilterSet):
 
     def state_filter(self, queryset, name, value):
         if value:
-            queryset = queryset.filter(_event_state=value)
+            queryset = queryset.in_state(value)
         return queryset
 
 
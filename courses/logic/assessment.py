@@ -1,5 +1,13 @@
 from decimal import Decimal
 
+# computed slot scores are returned with the same precision they're persisted
+# with, so that they don't depend on whether they were read or computed
+SCORE_QUANTUM = Decimal("1e-10")
+
+# likewise for the max scores of exercises, which are persisted with two
+# decimal places
+MAX_SCORE_QUANTUM = Decimal("0.01")
+
 
 def get_assessor_class(event):
     from courses.models import Event
@@ -0,0 +1,473 @@
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.db.models import Count, Max, Q, Sum
+
+from courses.logic.assessment import SCORE_QUANTUM
+from courses.logic.transaction_state import forget_once_per_transaction
+from courses.models import (
+    Event,
+    EventParticipation,
+    EventParticipationSlot,
+    EventTemplateRule,
+    Exercise,
+    ExerciseChoice,
+    ExerciseTestCase,
+)
+
+MANUAL_TYPES = (Exercise.OPEN_ANSWER, Exercise.ATTACHMENT)
+MULTIPLE_CHOICE_TYPES = (
+    Exercise.MULTIPLE_CHOICE_SINGLE_POSSIBLE,
+    Exercise.MULTIPLE_CHOICE_MULTIPLE_POSSIBLE,
+)
+# PYTHON exercises are assessed as composite exercises by SubmissionAssessor
+AUTOMATIC_PROGRAMMING_TYPES = (Exercise.JS, Exercise.C)
+# types whose max score is the weighted sum of that of their sub-exercises
+COMPOSITE_MAX_SCORE_TYPES = (Exercise.COMPLETION, Exercise.AGGREGATED)
+
+
+def to_hundredths(value) -> int:
+    """
+    Correctness values, weights, and scores have two decimal places: they're
+    handled as integer amounts of hundredths so that the arithmetic is exact
+    """
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+def get_depths(parent_indices: np.ndarray) -> np.ndarray:
+    """
+    Given an array mapping each node of a forest to the index of its parent
+    (or -1 for roots), returns the depth of each node
+    """
+    depths = np.zeros(len(parent_indices), dtype=np.int64)
+    ancestors = parent_indices.copy()
+    while True:
+        has_ancestor = ancestors >= 0
+        if not has_ancestor.any():
+            return depths
+        depths[has_ancestor] += 1
+        ancestors[has_ancestor] = parent_indices[ancestors[has_ancestor]]
+
+
+class EventBatchAssessor:
+    """
+    Assesses all the slots of all the participations to an event at once.
+
+    This is equivalent to running the assessor returned by `get_assessor_class`
+    on each slot (see courses.logic.assessment), but it loads all the data
+    needed with a fixed number of queries and computes the correctness and max
+    score of all the slots with vectorized operations, instead of running
+    several queries per slot.
+
+    If `participation_ids` is given, only those participations are assessed,
+    so that large events can be assessed in chunks.
+
+    After calling `assess`, `slot_scores` and `participation_scores` map the
+    id's of slots and participations to their score, accounting for manually
+    assigned scores, and `participation_assessment_progress` maps the id's of
+    participations to their assessment progress
+    """
+
+    def __init__(self, event: Event, participation_ids: Optional[List[int]] = None):
+        self.event = event
+        self.participation_ids = participation_ids
+        self.slot_scores: Dict[int, Optional[Decimal]] = {}
+        self.participation_scores: Dict[int, Decimal] = {}
+        self.participation_assessment_progress: Dict[int, int] = {}
+        # automatic scores, regardless of manually assigned ones
+        self.computed_slot_scores: Dict[int, Optional[Decimal]] = {}
+
+    def assess(self):
+        self._load_slots()
+        self._load_exercises()
+        max_scores, max_score_is_none = self._get_exercise_max_scores()
+        correctness, correctness_is_none = self._get_slot_correctness()
+        self._compute_scores(
+            max_scores, max_score_is_none, correctness, correctness_is_none
+        )
+
+    def persist_stale_scores(self):
+        """
+        Persists the computed scores of the slots and participations whose
+        persisted scores are out of date (see EventParticipationSlot.score)
+        """
+        stale_slots = [
+            EventParticipationSlot(
+                pk=pk,
+                _computed_score=self.computed_slot_scores[pk],
+                _computed_score_version=version,
+            )
+            for pk, version, computed_version in zip(
+                self.slot_ids.tolist(),
+                self.slot_score_versions,
+                self.slot_computed_score_versions,
+            )
+            if version != computed_version
+        ]
+        EventParticipationSlot.objects.bulk_update(
+            stale_slots,
+            ["_computed_score", "_computed_score_version"],
+            batch_size=500,
+        )
+
+        stale_participations = [
+            EventParticipation(
+                pk=pk,
+                _computed_score=self.participation_scores[pk],
+                _computed_assessment_progress=(
+                    self.participation_assessment_progress[pk]
+                ),
+                _computed_score_version=version,
+            )
+            for pk, version, computed_version in self.participation_versions
+            if version != computed_version
+        ]
+        EventParticipation.objects.bulk_update(
+            stale_participations,
+            [
+                "_computed_score",
+                "_computed_assessment_progress",
+                "_computed_score_version",
+            ],
+            batch_size=500,
+        )
+        forget_once_per_transaction(
+            *(
+                EventParticipation.get_score_invalidation_key(p.pk)
+                for p in stale_participations
+            )
+        )
+
+    def _get_participations(self):
+        participations = EventParticipation.objects.claimed().filter(
+            event_id=self.event.pk
+        )
+        if self.participation_ids is not None:
+            participations = participations.filter(pk__in=self.participation_ids)
+        return participations
+
+    def _get_slots(self):
+        return EventParticipationSlot.objects.filter(
+            participation__in=self._get_participations()
+        )
+
+    def _load_slots(self):
+        slot_rows = list(
+            self._get_slots()
+            .order_by()
+            .values_list(
+                "pk",
+                "parent_id",
+                "participation_id",
+                "exercise_id",
+                "populating_rule_id",
+                "_score",
+                "_score_version",
+                "_computed_score_version",
+            )
+        )
+        (
+            slot_ids,
+            parent_ids,
+            participation_ids,
+            exercise_ids,
+            rule_ids,
+            self.manual_scores,
+            self.slot_score_versions,
+            self.slot_computed_score_versions,
+        ) = [list(column) for column in zip(*slot_rows)] or [[]] * 8
+
+        self.slot_ids = np.array(slot_ids, dtype=np.int64)
+        self.slot_index = {pk: i for i, pk in enumerate(slot_ids)}
+        self.slot_parents = np.array(
+            [self.slot_index.get(pk, -1) if pk else -1 for pk in parent_ids],
+            dtype=np.int64,
+        )
+        self.slot_participation_ids = participation_ids
+        self.slot_exercise_ids = exercise_ids
+
+        rule_weights = dict(
+            EventTemplateRule.objects.filter(pk__in=set(rule_ids))
+            .order_by()
+            .values_list("pk", "weight")
+        )
+        # slots without a populating rule have weight 1 for backwards compatibility
+        self.slot_weights = np.array(
+            [
+                to_hundredths(rule_weights.get(rule_id) or 0)
+                if rule_id is not None
+                else 100
+                for rule_id in rule_ids
+            ],
+            dtype=np.int64,
+        )
+
+        self.participation_versions = list(
+            self._get_participations()
+            .order_by()
+            .values_list("pk", "_score_version", "_computed_score_version")
+        )
+
+    def _load_exercises(self):
+        """
+        Loads the exercises assigned to the slots and all of their descendants,
+        including sub-exercises that were added after the slots were created
+        """
+        rows: List[dict] = []
+        fields = ("pk", "parent_id", "exercise_type", "child_weight", "all_or_nothing")
+        to_fetch = Exercise.objects.filter(pk__in=set(self.slot_exercise_ids))
+        fetched = set()
+        while True:
+            level = [
+                r for r in to_fetch.order_by().values(*fields) if r["pk"] not in fetched
+            ]
+            if len(level) == 0:
+                break
+            rows.extend(level)
+            fetched.update(r["pk"] for r in level)
+            to_fetch = Exercise.objects.filter(parent_id__in=[r["pk"] for r in level])
+
+        self.exercise_index = {r["pk"]: i for i, r in enumerate(rows)}
+        self.exercise_types = np.array(
+            [r["exercise_type"] for r in rows], dtype=np.int64
+        )
+        self.exercise_parents = np.array(
+            [self.exercise_index.get(r["parent_id"], -1) for r in rows],
+            dtype=np.int64,
+        )
+        self.exercise_child_weights = np.array(
+            [r["child_weight"] or 0 for r in rows], dtype=np.int64
+        )
+        self.exercise_all_or_nothing = np.array(
+            [r["all_or_nothing"] for r in rows], dtype=bool
+        )
+
+        # sub-exercises of cloze exercises are only assessable if their
+        # placeholder appears in the text of the parent exercise
+        cloze_texts = dict(
+            Exercise.objects.filter(
+                pk__in=[
+                    r["pk"] for r in rows if r["exercise_type"] == Exercise.COMPLETION
+                ]
+            )
+            .order_by()
+            .values_list("pk", "text")
+        )
+        self.exercise_assessable = np.array(
+            [
+                r["parent_id"] not in cloze_texts
+                or f"[[{r['pk']}]]" in cloze_texts[r["parent_id"]]
+                for r in rows
+            ],
+            dtype=bool,
+        )
+
+        self.slot_exercises = np.array(
+            [self.exercise_index[pk] for pk in self.slot_exercise_ids], dtype=np.int64
+        )
+
+    def _get_exercise_max_scores(self):
+        """
+        Returns an array with the max score of each exercise, in hundredths,
+        and an array telling which exercises have no max score
+        """
+        count = len(self.exercise_types)
+        max_scores = np.zeros(count, dtype=np.int64)
+        is_none = np.isin(self.exercise_types, MANUAL_TYPES)
+
+        exercise_ids = list(self.exercise_index.keys())
+        for row in (
+            ExerciseChoice.objects.filter(exercise_id__in=exercise_ids)
+            .order_by()
+            .values("exercise_id")
+            .annotate(
+                max_correctness=Max("correctness"),
+                positive_correctness=Sum("correctness", filter=Q(correctness__gt=0)),
+            )
+        ):
+            i = self.exercise_index[row["exercise_id"]]
+            if self.exercise_types[i] == Exercise.MULTIPLE_CHOICE_SINGLE_POSSIBLE:
+                max_scores[i] = to_hundredths(row["max_correctness"])
+            elif self.exercise_types[i] == Exercise.MULTIPLE_CHOICE_MULTIPLE_POSSIBLE:
+                max_scores[i] = to_hundredths(row["positive_correctness"] or 0)
+
+        # single selection exercises without choices have no max score
+        has_choices = np.zeros(count, dtype=bool)
+        has_choices[
+            [
+                self.exercise_index[pk]
+                for pk in ExerciseChoice.objects.filter(exercise_id__in=exercise_ids)
+                .order_by()
+                .values_list("exercise_id", flat=True)
+                .distinct()
+            ]
+        ] = True
+        is_none |= (
+            self.exercise_types == Exercise.MULTIPLE_CHOICE_SINGLE_POSSIBLE
+        ) & ~has_choices
+
+        for exercise_id, testcase_count in (
+            ExerciseTestCase.objects.filter(exercise_id__in=exercise_ids)
+            .order_by()
+            .values("exercise_id")
+            .annotate(count=Count("pk"))
+            .values_list("exercise_id", "count")
+        ):
+            i = self.exercise_index[exercise_id]
+            if self.exercise_types[i] in Exercise.PROGRAMMING_TYPES:
+                max_scores[i] = testcase_count * 100
+
+        # the max score of composite exercises is the sum of the max scores
+        # of their assessable sub-exercises weighted by their child_weight;
+        # deeper exercises are processed first
+        depths = get_depths(self.exercise_parents)
+        for depth in range(depths.max(initial=0), 0, -1):
+            children = np.nonzero((depths == depth) & self.exercise_assessable)[0]
+            parents = self.exercise_parents[children]
+            into_composite = np.isin(
+                self.exercise_types[parents], COMPOSITE_MAX_SCORE_TYPES
+            )
+            children, parents = children[into_composite], parents[into_composite]
+            np.add.at(
+                max_scores,
+                parents,
+                np.where(is_none[children], 0, max_scores[children])
+                * self.exercise_child_weights[children],
+            )
+
+        return max_scores, is_none
+
+    def _get_slot_correctness(self):
+        """
+        Returns an array with the correctness of the submission of each slot,
+        in hundredths, and an array telling which slots can't be assessed
+        automatically
+        """
+        from courses.logic.assessment import FullyAutomaticAssessor, get_assessor_class
+
+        count = len(self.slot_ids)
+        slot_types = self.exercise_types[self.slot_exercises]
+        correctness = np.zeros(count, dtype=np.int64)
+        is_none = np.zeros(count, dtype=bool)
+
+        if not issubclass(get_assessor_class(self.event), FullyAutomaticAssessor):
+            is_none |= np.isin(slot_types, MANUAL_TYPES)
+
+        through = EventParticipationSlot.selected_choices.through
+        selected = list(
+            through.objects.filter(eventparticipationslot__in=self._get_slots())
+            .order_by()
+            .values_list("eventparticipationslot_id", "exercisechoice__correctness")
+        )
+        if len(selected) > 0:
+            selected_slots, selected_correctness = zip(*selected)
+            np.add.at(
+                correctness,
+                [self.slot_index[pk] for pk in selected_slots],
+                [to_hundredths(c) for c in selected_correctness],
+            )
+        correctness[~np.isin(slot_types, MULTIPLE_CHOICE_TYPES)] = 0
+
+        for pk, answer_text, execution_results in (
+            self._get_slots()
+            .filter(exercise__exercise_type__in=AUTOMATIC_PROGRAMMING_TYPES)
+            .order_by()
+            .values_list("pk", "answer_text", "execution_results")
+        ):
+            i = self.slot_index[pk]
+            if execution_results is None:
+                is_none[i] = answer_text is not None and len(answer_text.strip()) > 0
+                continue
+            try:
+                correctness[i] = 100 * len(
+                    [t for t in execution_results["tests"] if t["passed"]]
+                )
+            except KeyError:
+                # no test cases in execution results (e.g. compilation error in code)
+                pass
+
+        # the correctness of composite exercises is the sum of the correctness
+        # of their assessable sub-slots weighted by the child_weight of the
+        # corresponding exercises; deeper slots are processed first
+        is_composite = ~np.isin(
+            slot_types,
+            MANUAL_TYPES + MULTIPLE_CHOICE_TYPES + AUTOMATIC_PROGRAMMING_TYPES,
+        )
+        depths = get_depths(self.slot_parents)
+        for depth in range(depths.max(initial=0), 0, -1):
+            children = np.nonzero(
+                (depths == depth) & self.exercise_assessable[self.slot_exercises]
+            )[0]
+            parents = self.slot_parents[children]
+            into_composite = is_composite[parents]
+            children, parents = children[into_composite], parents[into_composite]
+            np.add.at(
+                correctness,
+                parents,
+                correctness[children]
+                * self.exercise_child_weights[self.slot_exercises[children]],
+            )
+            np.logical_or.at(is_none, parents, is_none[children])
+
+        return correctness, is_none
+
+    def _compute_scores(
+        self, max_scores, max_score_is_none, correctness, correctness_is_none
+    ):
+        slot_max_scores = max_scores[self.slot_exercises]
+        zero = (
+            max_score_is_none[self.slot_exercises]
+            | (slot_max_scores == 0)
+            # all or nothing exercise with partially incorrect answer
+            | (
+                self.exercise_all_or_nothing[self.slot_exercises]
+                & (correctness < slot_max_scores)
+            )
+        )
+        # score = correctness / max_score * weight, all of them in hundredths
+        numerators = np.where(zero, 0, correctness * self.slot_weights)
+        denominators = np.where(zero, 1, slot_max_scores * 100)
+
+        for i, (pk, numerator, denominator, is_none) in enumerate(
+            zip(
+                self.slot_ids.tolist(),
+                numerators.tolist(),
+                denominators.tolist(),
+                correctness_is_none.tolist(),
+            )
+        ):
+            computed_score = (
+                None
+                if is_none
+                else (Decimal(numerator) / Decimal(denominator)).quantize(SCORE_QUANTUM)
+            )
+            self.computed_slot_scores[pk] = computed_score
+            manual_score = self.manual_scores[i]
+            self.slot_scores[pk] = (
+                manual_score if manual_score is not None else computed_score
+            )
+
+        participation_scores: Dict[int, Decimal] = {
+            pk: Decimal(0) for pk, _, _ in self.participation_versions
+        }
+        progress: Dict[int, int] = {
+            pk: EventParticipation.NOT_ASSESSED
+            for pk, _, _ in self.participation_versions
+        }
+        for i in np.nonzero(self.slot_parents < 0)[0].tolist():
+            participation_id = self.slot_participation_ids[i]
+            if participation_id not in participation_scores:
+                continue
+            score = self.slot_scores[self.slot_ids[i].item()]
+            if score is not None:
+                participation_scores[participation_id] += score
+                if progress[participation_id] == EventParticipation.NOT_ASSESSED:
+                    progress[participation_id] = EventParticipation.FULLY_ASSESSED
+            else:
+                progress[participation_id] = EventParticipation.PARTIALLY_ASSESSED
+
+        self.participation_scores = {
+            pk: round(score, 2) for pk, score in participation_scores.items()
+        }
+        self.participation_assessment_progress = progress
@@ -0,0 +1,71 @@
+from typing import FrozenSet, Optional
+
+from django.core.cache import cache
+from django.db.models import F
+
+ENROLLED_USER_IDS_CACHE_TIMEOUT_SECONDS = 60 * 60 * 24
+
+
+def get_enrolled_user_ids_cache_key(course) -> str:
+    return (
+        f"enrolled_user_ids_{course.pk}_{course.created.timestamp()}"
+        f"_{course.enrollments_version}"
+    )
+
+
+def get_enrolled_user_ids(course) -> FrozenSet[int]:
+    """
+    Returns the set of the id's of the users enrolled in the given course, for
+    checking the enrollment of many users at once.
+
+    The set is cached and versioned by the course's `enrollments_version`,
+    which is incremented whenever users are enrolled in or unenrolled from
+    the course, so that membership can be tested without loading the users
+    """
+    from courses.models import UserCourseEnrollment
+
+    key = get_enrolled_user_ids_cache_key(course)
+    user_ids: Optional[FrozenSet[int]] = cache.get(key)
+    if user_ids is None:
+        user_ids = frozenset(
+            UserCourseEnrollment.objects.filter(course_id=course.pk).values_list(
+                "user_id", flat=True
+            )
+        )
+        cache.set(key, user_ids, ENROLLED_USER_IDS_CACHE_TIMEOUT_SECONDS)
+    return user_ids
+
+
+def is_user_enrolled(user, course) -> bool:
+    """
+    Returns True if and only if `user` is enrolled in `course`.
+
+    The cached set of the enrolled users is used if it's there, otherwise a
+    single EXISTS query is run, rather than loading the whole set to check
+    one user
+    """
+    from courses.models import UserCourseEnrollment
+
+    if user.is_anonymous:
+        return False
+    user_ids: Optional[FrozenSet[int]] = cache.get(
+        get_enrolled_user_ids_cache_key(course)
+    )
+    if user_ids is not None:
+        return user.pk in user_ids
+    return UserCourseEnrollment.objects.filter(
+        course_id=course.pk, user_id=user.pk
+    ).exists()
+
+
+def invalidate_enrolled_user_ids(course_id):
+    """
+    Marks the cached set of the users enrolled in the given course as out of date
+    """
+    from courses.models import Course
+
+    if course_id is None:
+        return
+    Course.objects.filter(pk=course_id).update(
+        enrollments_version=F("enrollments_version") + 1
+    )
@@ -1,6 +1,12 @@
 from random import shuffle
-from typing import List, Tuple
-from courses.models import EventTemplate, EventTemplateRule, Exercise
+from typing import List, Set, Tuple
+from courses.logic.exercise_index import get_exercise_index
+from courses.models import (
+    EventTemplate,
+    EventTemplateRule,
+    Exercise,
+    PracticeSeenExercise,
+)
 from django.db.models import Q
 import random
 
@@ -38,6 +44,37 @@ class ExercisePicker:
         )
         return [e for e in exercises if e.pk in picked_ids]
 
+    @staticmethod
+    def get_random_exercises_by_id(
+        initial_qs, ids: Set[int], amount: int
+    ) -> List[Exercise]:
+        """
+        Picks `amount` random id's from those in the given set that are also
+        in `initial_qs` and returns the corresponding exercises, in random order
+        """
+        # sort the id's so that sampling only depends on the random state
+        candidate_ids = sorted(ids)
+        picked_ids: List[int] = []
+        exercises = {}
+        # only the picked id's are checked against `initial_qs`: those that
+        # turn out to be excluded by it are replaced by sampling again, so that
+        # the rule isn't given fewer exercises than it asks for
+        while len(picked_ids) < amount and len(candidate_ids) > 0:
+            # avoid trying to pick a larger sample than the list of id's
+            sample = random.sample(
+                candidate_ids, min(amount - len(picked_ids), len(candidate_ids))
+            )
+            sampled_ids = set(sample)
+            candidate_ids = [pk for pk in candidate_ids if pk not in sampled_ids]
+            exercises.update(
+                (e.pk, e)
+                for e in initial_qs.filter(
+                    pk__in=sample
+                ).with_prefetched_related_objects()
+            )
+            picked_ids += [pk for pk in sample if pk in exercises]
+        return [exercises[pk] for pk in picked_ids]
+
     def get_exercises_from(
         self, template: EventTemplate, public_only=False, exclude_seen_in_practice=False
     ):
@@ -65,8 +102,15 @@ class ExercisePicker:
         if public_only:
             exercises = exercises.public()
 
-        if False and exclude_seen_in_practice:  # ! temporarily disable feature
-            exercises = exercises.not_seen_in_practice_by(template.event.creator)
+        # the id's are excluded both from the exercises prefetched for id-based
+        # rules and from the candidates taken from the course's index
+        seen_ids: Set[int] = set()
+        if exclude_seen_in_practice:
+            seen_ids = set(
+                PracticeSeenExercise.objects.filter(
+                    user=template.event.creator, course=course
+                ).values_list("exercise_id", flat=True)
+            )
 
         picked_exercises: List[Tuple[Exercise, EventTemplateRule]] = []
         rules: List[EventTemplateRule] = [
@@ -92,7 +136,7 @@ class ExercisePicker:
                         e
                         for e in prefetched_exercises
                         # restrict to exercises referred by the rule
-                        if e.pk in rule_ids
+                        if e.pk in rule_ids and e.pk not in seen_ids
                         # avoid duplicates
                         and e.pk
                         not in [picked_e.pk for (picked_e, _) in picked_exercises]
@@ -100,15 +144,15 @@ class ExercisePicker:
                     rule.amount,
                 )
             else:
-                rule_qs = exercises.satisfying(rule)
-                rule_picked_exercises = (
-                    rule_qs.exclude(
-                        pk__in=[
-                            e.pk for e, _ in picked_exercises
-                        ]  # don't pick same exercise again
-                    )
-                    .get_random(amount=rule.amount)
-                    .with_prefetched_related_objects()
+                # resolve the rule's criteria using the course's exercise index
+                candidate_ids = get_exercise_index(course).get_exercise_ids_satisfying(
+                    rule, public_only=public_only
+                )
+                # don't pick same exercise again
+                candidate_ids -= {e.pk for e, _ in picked_exercises}
+                candidate_ids -= seen_ids
+                rule_picked_exercises = self.get_random_exercises_by_id(
+                    exercises, candidate_ids, rule.amount
                 )
 
             for picked_exercise in rule_picked_exercises:
@@ -0,0 +1,181 @@
+from typing import Dict, List
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from courses.logic.batch_assessment import EventBatchAssessor
+from courses.models import Event, EventParticipation, EventParticipationSlot
+
+
+EVENT_STATISTICS_CACHE_TIMEOUT_SECONDS = 60 * 60 * 24
+HISTOGRAM_BINS = 10
+# share of the participations, sorted by score, that make up the upper and
+# lower groups used to compute the discrimination index of exercises
+DISCRIMINATION_GROUP_RATIO = 0.27
+
+
+def get_event_statistics_cache_key(event: Event) -> str:
+    """
+    Returns a cache key that changes whenever the assessment of any of the
+    participations to the event changes, as any such change bumps the
+    participation's `_score_version` (see EventParticipationSlot.invalidate_score)
+    """
+    aggregates = (
+        EventParticipation.objects.claimed()
+        .filter(event_id=event.pk)
+        .aggregate(
+            count=Count("pk"),
+            last_pk=Max("pk"),
+            score_versions=Sum("_score_version"),
+        )
+    )
+    return (
+        f"event_statistics_{event.pk}_{aggregates['count']}"
+        f"_{aggregates['last_pk']}_{aggregates['score_versions']}"
+    )
+
+
+def get_event_statistics(event: Event) -> dict:
+    key = get_event_statistics_cache_key(event)
+    statistics = cache.get(key)
+    if statistics is None:
+        statistics = compute_event_statistics(event)
+        cache.set(key, statistics, EVENT_STATISTICS_CACHE_TIMEOUT_SECONDS)
+    return statistics
+
+
+def get_histogram(values: np.ndarray, low=None, high=None) -> dict:
+    if len(values) == 0:
+        return {"bins": [], "counts": []}
+    low = min(values.min(), low if low is not None else values.min())
+    high = max(values.max(), high if high is not None else values.max())
+    counts, bins = np.histogram(values, bins=HISTOGRAM_BINS, range=(low, high))
+    return {"bins": bins.round(4).tolist(), "counts": counts.tolist()}
+
+
+def get_mean(values: np.ndarray):
+    return round(float(values.mean()), 4) if len(values) > 0 else None
+
+
+def compute_event_statistics(event: Event) -> dict:
+    """
+    Computes item analysis statistics for the exercises of an event: for
+    each exercise assigned in the base slots of the participations, its
+    difficulty (the mean score obtained, relative to the slot's weight),
+    its discrimination index (the difference between the difficulty in the
+    upper and lower scoring groups of participations), a histogram of its
+    relative scores, and how often each of its choices was selected.
+
+    The scores of all slots are computed with EventBatchAssessor, and the
+    selection frequencies of choices with a single aggregate query
+    """
+    assessor = EventBatchAssessor(event)
+    assessor.assess()
+    assessor.persist_stale_scores()
+
+    # participation totals
+    participation_ids = np.array(list(assessor.participation_scores.keys()))
+    totals = np.array(
+        [float(s) for s in assessor.participation_scores.values()], dtype=np.float64
+    )
+    participation_ranks = np.empty(len(totals), dtype=np.int64)
+    participation_ranks[np.argsort(totals, kind="stable")] = np.arange(len(totals))
+    rank_by_participation = dict(zip(participation_ids.tolist(), participation_ranks))
+    group_size = int(np.ceil(len(totals) * DISCRIMINATION_GROUP_RATIO))
+
+    # scores of all the slots, also relative to their weight
+    is_base_slot = assessor.slot_parents < 0
+    scores = np.array(
+        [float(s) if s is not None else np.nan for s in assessor.slot_scores.values()],
+        dtype=np.float64,
+    )
+    weights = assessor.slot_weights / 100
+    exercise_ids = np.array(assessor.slot_exercise_ids, dtype=np.int64)
+    ranks = np.array(
+        [rank_by_participation.get(pk, -1) for pk in assessor.slot_participation_ids],
+        dtype=np.int64,
+    )
+    relative_scores = np.divide(
+        scores, weights, out=np.full(len(scores), np.nan), where=weights != 0
+    )
+
+    # how many times each choice has been selected, and how many slots
+    # (including sub-slots) each exercise has been assigned to
+    choice_counts: Dict[int, List[dict]] = {}
+    slot_exercises, slot_counts = np.unique(exercise_ids, return_counts=True)
+    slot_count_by_exercise = dict(zip(slot_exercises.tolist(), slot_counts.tolist()))
+    participations = EventParticipation.objects.claimed().filter(event_id=event.pk)
+    for row in (
+        EventParticipationSlot.selected_choices.through.objects.filter(
+            eventparticipationslot__participation__in=participations
+        )
+        .order_by()
+        .values("exercisechoice_id", "exercisechoice__exercise_id")
+        .annotate(count=Count("pk"))
+    ):
+        exercise_id = row["exercisechoice__exercise_id"]
+        choice_counts.setdefault(exercise_id, []).append(
+            {
+                "choice": row["exercisechoice_id"],
+                "count": row["count"],
+                "frequency": round(
+                    row["count"] / slot_count_by_exercise.get(exercise_id, 1), 4
+                ),
+            }
+        )
+
+    exercises = []
+    for exercise_id in np.unique(exercise_ids[is_base_slot]).tolist():
+        in_exercise = is_base_slot & (exercise_ids == exercise_id)
+        assessed = in_exercise & ~np.isnan(relative_scores)
+        upper = assessed & (ranks >= len(totals) - group_size)
+        lower = assessed & (ranks >= 0) & (ranks < group_size)
+        difficulty = get_mean(relative_scores[assessed])
+        upper_difficulty = get_mean(relative_scores[upper])
+        lower_difficulty = get_mean(relative_scores[lower])
+        exercises.append(
+            {
+                "exercise": exercise_id,
+                "slot_count": int(in_exercise.sum()),
+                "assessed_count": int(assessed.sum()),
+                "mean_score": get_mean(scores[in_exercise & ~np.isnan(scores)]),
+                "difficulty": difficulty,
+                "discrimination": (
+                    round(upper_difficulty - lower_difficulty, 4)
+                    if upper_difficulty is not None and lower_difficulty is not None
+                    else None
+                ),
+                "score_histogram": get_histogram(
+                    relative_scores[assessed], low=0, high=1
+                ),
+                "choices": choice_counts.get(exercise_id, []),
+                # choices of sub-exercises, e.g. for cloze exercises
+                "sub_exercises": [
+                    {
+                        "exercise": sub_exercise_id,
+                        "choices": choice_counts[sub_exercise_id],
+                    }
+                    for sub_exercise_id in np.unique(
+                        exercise_ids[
+                            ~is_base_slot
+                            & np.isin(
+                                assessor.slot_parents,
+                                np.nonzero(in_exercise)[0],
+                            )
+                        ]
+                    ).tolist()
+                    if sub_exercise_id in choice_counts
+                ],
+            }
+        )
+
+    return {
+        "participation_count": len(totals),
+        "mean_score": get_mean(totals),
+        "median_score": (
+            round(float(np.median(totals)), 4) if len(totals) > 0 else None
+        ),
+        "score_histogram": get_histogram(totals, low=0, high=float(event.max_score)),
+        "exercises": exercises,
+    }
@@ -0,0 +1,137 @@
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+from django.core.cache import cache
+from django.db.models import F
+
+from courses.models import Course, EventTemplateRule, Exercise
+
+
+EXERCISE_INDEX_CACHE_TIMEOUT_SECONDS = 60 * 60 * 24
+
+
+class ExerciseIndex:
+    """
+    An in-memory index of the base exercises of a course, used to resolve
+    the criteria of EventTemplateRules without querying the db.
+
+    For each tag of the course, the index holds the set of the id's of the
+    exercises that have the tag among their public tags and among their
+    private tags; it also holds the set of exercises for each state. Rule
+    clauses are then resolved via set unions and intersections.
+    """
+
+    def __init__(
+        self,
+        states: Dict[int, FrozenSet[int]],
+        public_tags: Dict[int, FrozenSet[int]],
+        private_tags: Dict[int, FrozenSet[int]],
+    ):
+        self.states = states
+        self.public_tags = public_tags
+        self.private_tags = private_tags
+
+    @classmethod
+    def build(cls, course_id) -> "ExerciseIndex":
+        exercises = Exercise.objects.base_exercises().filter(course_id=course_id)
+
+        states: Dict[int, Set[int]] = {}
+        for pk, state in exercises.values_list("pk", "state"):
+            states.setdefault(state, set()).add(pk)
+
+        def get_tag_sets(through_model) -> Dict[int, FrozenSet[int]]:
+            tag_sets: Dict[int, Set[int]] = {}
+            for exercise_id, tag_id in through_model.objects.filter(
+                exercise__course_id=course_id, exercise__parent__isnull=True
+            ).values_list("exercise_id", "tag_id"):
+                tag_sets.setdefault(tag_id, set()).add(exercise_id)
+            return {tag_id: frozenset(ids) for tag_id, ids in tag_sets.items()}
+
+        return cls(
+            states={state: frozenset(ids) for state, ids in states.items()},
+            public_tags=get_tag_sets(Exercise.public_tags.through),
+            private_tags=get_tag_sets(Exercise.private_tags.through),
+        )
+
+    def get_exercise_ids(self, states: Iterable[int]) -> Set[int]:
+        ret: Set[int] = set()
+        for state in states:
+            ret |= self.states.get(state, frozenset())
+        return ret
+
+    def get_exercise_ids_with_tags(
+        self, tag_ids: Iterable[int], public_only=False
+    ) -> Set[int]:
+        """
+        Returns the id's of the exercises that have at least one of the
+        given tags among their public tags or, if `public_only` is False,
+        among their private tags
+        """
+        ret: Set[int] = set()
+        for tag_id in tag_ids:
+            ret |= self.public_tags.get(tag_id, frozenset())
+            if not public_only:
+                ret |= self.private_tags.get(tag_id, frozenset())
+        return ret
+
+    def get_exercise_ids_satisfying(
+        self, rule: EventTemplateRule, public_only=False
+    ) -> Set[int]:
+        """
+        Returns the id's of the exercises that satisfy the given tag-based
+        or fully random rule, with the same semantics as
+        `ExerciseQuerySet.satisfying`. If `public_only` is True, only public
+        exercises are returned.
+
+        The clauses of the rule and their tags should be prefetched to avoid
+        running any queries
+        """
+        if rule.rule_type is None:
+            return set()
+
+        ret = self.get_exercise_ids(
+            [Exercise.PUBLIC] if public_only else [Exercise.PRIVATE, Exercise.PUBLIC],
+        )
+
+        if rule.rule_type == EventTemplateRule.TAG_BASED:
+            for clause in rule.clauses.all():
+                clause_tag_ids = [t.pk for t in clause.tags.all()]
+                if len(clause_tag_ids) == 0:  # empty clause
+                    continue
+                ret &= self.get_exercise_ids_with_tags(
+                    clause_tag_ids, public_only=bool(rule.search_public_tags_only)
+                )
+
+        return ret
+
+
+def get_exercise_index_cache_key(course: Course) -> str:
+    return (
+        f"exercise_index_{course.pk}_{course.created.timestamp()}"
+        f"_{course.exercise_index_version}"
+    )
+
+
+def get_exercise_index(course: Course) -> ExerciseIndex:
+    """
+    Returns the exercise index for the given course, building it if the
+    cached one is missing or out of date.
+
+    The index is versioned by the course's `exercise_index_version`, so that
+    invalidations are seen by all processes even with a per-process cache
+    """
+    key = get_exercise_index_cache_key(course)
+    index: Optional[ExerciseIndex] = cache.get(key)
+    if index is None:
+        index = ExerciseIndex.build(course.pk)
+        cache.set(key, index, EXERCISE_INDEX_CACHE_TIMEOUT_SECONDS)
+    return index
+
+
+def invalidate_exercise_index(course_id):
+    """
+    Marks the exercise index of the given course as out of date
+    """
+    if course_id is None:
+        return
+    Course.objects.filter(pk=course_id).update(
+        exercise_index_version=F("exercise_index_version") + 1
+    )
@@ -0,0 +1,156 @@
+import csv
+import json
+from typing import Iterable, Iterator, NamedTuple
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+
+from courses.logic.batch_assessment import EventBatchAssessor
+from courses.models import Course, Event, EventParticipation, EventParticipationSlot
+
+REPORT_CHUNK_SIZE = 2000
+
+
+class ParticipationReportRow(NamedTuple):
+    exam: str  # hashid of the exam
+    id: int
+    user: int
+    score: str
+
+
+def refresh_stale_participation_scores(exams):
+    """
+    Runs the batch assessor on the participations to the given exams whose
+    persisted score is out of date, so that reports can be built by reading
+    the persisted scores. The participations are assessed in chunks of
+    REPORT_CHUNK_SIZE, each in a transaction of its own
+    """
+    stale_participations = (
+        EventParticipation.objects.claimed()
+        .filter(event__in=exams)
+        .filter(
+            Q(_score__isnull=True) | Q(_score=""),
+            ~Q(_computed_score_version=F("_score_version"))
+            | Q(_computed_score_version__isnull=True),
+        )
+    )
+    stale_exam_ids = (
+        stale_participations.order_by().values_list("event_id", flat=True).distinct()
+    )
+    for exam in Event.objects.filter(pk__in=stale_exam_ids):
+        last_pk = 0
+        while True:
+            chunk = list(
+                stale_participations.filter(event=exam, pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:REPORT_CHUNK_SIZE]
+            )
+            if len(chunk) == 0:
+                break
+            with transaction.atomic():
+                assessor = EventBatchAssessor(exam, participation_ids=chunk)
+                assessor.assess()
+                assessor.persist_stale_scores()
+            last_pk = chunk[-1]
+
+
+def get_participation_report_rows(course: Course) -> Iterator[ParticipationReportRow]:
+    """
+    Yields the id, the user, and the score of all the participations to the
+    exams of the given course, grouped by exam.
+
+    Stale scores are refreshed first, after which scores are read from the
+    persisted participation scores with a single query, whose results are
+    fetched in chunks and yielded one row at a time, so that the report is
+    never held in memory as a whole
+    """
+    exams = course.events.filter(event_type=Event.EXAM)
+    refresh_stale_participation_scores(exams)
+
+    for (
+        event_id,
+        pk,
+        user_id,
+        score,
+        computed_score,
+        has_assessed_slots,
+        score_version,
+        computed_score_version,
+    ) in (
+        EventParticipation.objects.claimed()
+        .filter(event__in=exams)
+        .annotate(
+            has_assessed_slots=Exists(
+                EventParticipationSlot.objects.base_slots().filter(
+                    Q(_score__isnull=False) | Q(_computed_score__isnull=False),
+                    participation=OuterRef("pk"),
+                )
+            ),
+        )
+        .order_by("event_id", "pk")
+        .values_list(
+            "event_id",
+            "pk",
+            "user_id",
+            "_score",
+            "_computed_score",
+            "has_assessed_slots",
+            "_score_version",
+            "_computed_score_version",
+        )
+        .iterator(chunk_size=REPORT_CHUNK_SIZE)
+    ):
+        # same as EventParticipation.score
+        score = score or (
+            EventParticipation.format_computed_score(computed_score, has_assessed_slots)
+            if computed_score_version == score_version
+            else None
+        )
+        if score is None:
+            # the participation was invalidated after its score was refreshed
+            score = EventParticipation.objects.select_related("event").get(pk=pk).score
+        yield ParticipationReportRow(
+            exam=event_id.hashid, id=pk, user=user_id, score=score
+        )
+
+
+class Echo:
+    """
+    A file-like object that returns what's written to it, used to stream
+    the output of a csv writer
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_participation_report_as_csv(
+    rows: Iterable[ParticipationReportRow],
+) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(ParticipationReportRow._fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_participation_report_as_ndjson(
+    rows: Iterable[ParticipationReportRow],
+) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row._asdict()) + "\n"
+
+
+def get_participation_report_as_dict(course: Course):
+    """
+    Returns the report in the original JSON format, mapping the hashid of
+    each exam to the list of its participations
+    """
+    report = {
+        exam_id.hashid: []
+        for exam_id in course.events.filter(event_type=Event.EXAM).values_list(
+            "id", flat=True
+        )
+    }
+    for row in get_participation_report_rows(course):
+        report[row.exam].append({"id": row.id, "user": row.user, "score": row.score})
+    return report
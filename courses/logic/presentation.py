@@ -21,4 +21,7 @@ EVENT_PARTICIPATION_SLOT_SHOW_SUBMISSION_FIELDS = (
 EVENT_PARTICIPATION_SLOT_SHOW_DETAIL_FIELDS = (
     "EVENT_PARTICIPATION_SLOT_SHOW_DETAIL_FIELDS"
 )
+EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE_BY_REFERENCE = (
+    "EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE_BY_REFERENCE"
+)
 EXERCISE_SOLUTION_SHOW_EXERCISE = "EXERCISE_SOLUTION_SHOW_EXERCISE"
@@ -1,4 +1,8 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db.models import F
 
 UPDATE_COURSE = "update_course"
 ACCESS_EXERCISES = "access_exercises"
@@ -23,6 +27,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+USER_PRIVILEGES_CACHE_TIMEOUT_SECONDS = 60 * 60 * 24
+
 
 def validate_permission_list(lst):
     if not isinstance(lst, list):
@@ -35,8 +41,23 @@ def validate_permission_list(lst):
             raise ValidationError(f"{item} not in teacher privileges")
 
 
+def get_user_privileges_cache_key(user_id, course) -> str:
+    return (
+        f"user_privileges_{course.pk}_{course.created.timestamp()}"
+        f"_{course.privileges_version}_{user_id}"
+    )
+
+
 def get_user_privileges(user, course):
-    from courses.models import Course, UserCoursePrivilege
+    """
+    Returns the privileges `user` has over `course`, which can either be a
+    Course object or the id of a course.
+
+    Privileges are cached and versioned by the course's `privileges_version`,
+    which is incremented whenever the roles or the per-user privileges of
+    the course, or its creator, change (see courses.receivers)
+    """
+    from courses.models import Course
 
     if user.is_anonymous:
         return []
@@ -47,7 +68,18 @@ def get_user_privileges(user, course):
         except (ValueError, Course.DoesNotExist):
             return []
 
-    if user == course.creator:
+    key = get_user_privileges_cache_key(user.pk, course)
+    privileges = cache.get(key)
+    if privileges is None:
+        privileges = compute_user_privileges(user, course)
+        cache.set(key, privileges, USER_PRIVILEGES_CACHE_TIMEOUT_SECONDS)
+    return privileges
+
+
+def compute_user_privileges(user, course):
+    from courses.models import UserCoursePrivilege
+
+    if user.pk == course.creator_id:
         return TEACHER_PRIVILEGES
 
     # if data has been prefetched, use the optimized data
@@ -94,6 +126,114 @@ def get_user_privileges(user, course):
     ]
 
 
+def get_bulk_user_privileges(
+    pairs: Iterable[Tuple[int, Any]]
+) -> Dict[Tuple[int, int], List[str]]:
+    """
+    Takes an iterable of (user id, Course) pairs and returns a dict mapping
+    each (user id, course id) pair to the privileges of the user over the
+    course, same as `get_user_privileges`.
+
+    Privileges are read from the cache where possible, and the remaining
+    ones are resolved with one query for the roles and one query for the
+    per-user privileges of all the pairs
+    """
+    from courses.models import UserCoursePrivilege
+    from users.models import User
+
+    keys = {
+        get_user_privileges_cache_key(user_id, course): (user_id, course)
+        for user_id, course in pairs
+    }
+    cached = cache.get_many(list(keys.keys()))
+    ret = {
+        (user_id, course.pk): cached[key]
+        for key, (user_id, course) in keys.items()
+        if key in cached
+    }
+
+    missing = [pair for key, pair in keys.items() if key not in cached]
+    if len(missing) == 0:
+        return ret
+
+    user_ids = {user_id for user_id, _ in missing}
+    course_ids = {course.pk for _, course in missing}
+
+    allow_privileges: Dict[Tuple[int, int], List[str]] = {}
+    deny_privileges: Dict[Tuple[int, int], List[str]] = {}
+    for user_id, course_id, role_privileges in (
+        User.roles.through.objects.filter(
+            user_id__in=user_ids, courserole__course_id__in=course_ids
+        )
+        .order_by("courserole__name")
+        .values_list("user_id", "courserole__course_id", "courserole__allow_privileges")
+    ):
+        allow_privileges.setdefault((user_id, course_id), []).extend(role_privileges)
+    for user_id, course_id, allow, deny in UserCoursePrivilege.objects.filter(
+        user_id__in=user_ids, course_id__in=course_ids
+    ).values_list("user_id", "course_id", "allow_privileges", "deny_privileges"):
+        allow_privileges.setdefault((user_id, course_id), []).extend(allow)
+        deny_privileges[(user_id, course_id)] = deny
+
+    to_cache = {}
+    for user_id, course in missing:
+        pair = (user_id, course.pk)
+        if user_id == course.creator_id:
+            privileges = TEACHER_PRIVILEGES
+        else:
+            privileges = [
+                privilege
+                for privilege in allow_privileges.get(pair, [])
+                if privilege not in deny_privileges.get(pair, [])
+            ]
+        ret[pair] = privileges
+        to_cache[get_user_privileges_cache_key(user_id, course)] = privileges
+    cache.set_many(to_cache, USER_PRIVILEGES_CACHE_TIMEOUT_SECONDS)
+
+    return ret
+
+
+def get_privileges_by_user(users, course) -> Dict[int, List[str]]:
+    """
+    Returns a dict mapping the pk of each of the given users to their
+    privileges over `course`
+    """
+    return {
+        user_id: privileges
+        for (user_id, _), privileges in get_bulk_user_privileges(
+            [(user.pk, course) for user in users]
+        ).items()
+    }
+
+
+def get_privileges_by_course(user, courses) -> Dict[int, List[str]]:
+    """
+    Returns a dict mapping the pk of each of the given courses to the
+    privileges `user` has over it
+    """
+    if user.is_anonymous:
+        return {course.pk: [] for course in courses}
+    return {
+        course_id: privileges
+        for (_, course_id), privileges in get_bulk_user_privileges(
+            [(user.pk, course) for course in courses]
+        ).items()
+    }
+
+
+def invalidate_user_privileges(course_id):
+    """
+    Marks the cached privileges of all users over the given course as out of date
+    """
+    from courses.models import Course
+
+    if course_id is None:
+        return
+    Course.objects.filter(pk=course_id).update(
+        privileges_version=F("privileges_version") + 1
+    )
+
+
 def check_privilege(user, course, privilege):
     """
     Returns True if and only `user` has `privilege` for `course`
@@ -0,0 +1,52 @@
+from typing import Any, Callable, Dict, Hashable, Type, TypeVar
+
+from django.db import models
+
+T = TypeVar("T")
+M = TypeVar("M", bound=models.Model)
+
+REQUEST_CACHE_ATTR = "_resolved_objects"
+
+
+def get_request_cache(request) -> Dict[Hashable, Any]:
+    """
+    Returns a dict that lives as long as the given request, used as an identity
+    map for the objects resolved while handling it (e.g. by access policies and
+    by `get_object`), so that each of them is only fetched once per request.
+
+    Unlike a process-wide cache, nothing outlives the request it belongs to
+    """
+    cache = getattr(request, REQUEST_CACHE_ATTR, None)
+    if cache is None:
+        cache = {}
+        setattr(request, REQUEST_CACHE_ATTR, cache)
+    return cache
+
+
+def clear_request_cache(request) -> None:
+    """
+    Discards the objects resolved so far for the given request, e.g. after
+    changes to them have been persisted that they wouldn't reflect
+    """
+    get_request_cache(request).clear()
+
+
+def get_or_resolve(request, key: Hashable, resolve: Callable[[], T]) -> T:
+    """
+    Returns the object cached under `key` for the given request, calling
+    `resolve` to get it the first time it's requested. Exceptions raised
+    by `resolve` aren't cached
+    """
+    cache = get_request_cache(request)
+    if key not in cache:
+        cache[key] = resolve()
+    return cache[key]
+
+
+def get_request_scoped_object(request, model: Type[M], pk) -> M:
+    """
+    Returns the instance of `model` with the given pk, only querying for it
+    the first time it's requested while handling the given request. Like
+    `get`, raises `model.DoesNotExist` if there is no such instance
+    """
+    return get_or_resolve(request, (model, str(pk)), lambda: model.objects.get(pk=pk))
@@ -0,0 +1,176 @@
+"""
+Write-behind buffer for the submissions to participation slots.
+
+When settings.SUBMISSION_WRITE_BEHIND is enabled, the changes to the answer
+text and the selected choices of slots made with `patch_submission` are stored
+in the cache, coalesced per slot, instead of being written to the database.
+Buffered submissions are persisted with bulk queries periodically (see
+courses.tasks.flush_buffered_submissions_task), when a participation is turned
+in, when an event is closed, and before any other request accesses the
+participation, so that users always read their own writes.
+
+The cache must be shared among the processes serving requests and the
+Celery workers (e.g. Redis, see CACHE_URL) for the periodic flush to work
+"""
+
+from contextlib import contextmanager
+from time import sleep
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+BUFFERED_SUBMISSION_FIELDS = ("answer_text", "selected_choices")
+
+# ids of the participations that have buffered submissions
+DIRTY_PARTICIPATIONS_KEY = "buffered_submissions_participations"
+
+LOCK_TIMEOUT_SECONDS = 10
+LOCK_ATTEMPTS = 100
+LOCK_RETRY_DELAY_SECONDS = 0.01
+
+
+def is_write_behind_enabled() -> bool:
+    return getattr(settings, "SUBMISSION_WRITE_BEHIND", False)
+
+
+def get_buffer_key(participation_id) -> str:
+    return f"buffered_submissions_{participation_id}"
+
+
+@contextmanager
+def cache_lock(key: str):
+    """
+    Holds a lock on the given key, relying on `add` being atomic in the cache
+    backend. The lock expires after LOCK_TIMEOUT_SECONDS in case its holder
+    dies without releasing it
+    """
+    lock_key = f"lock_{key}"
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock_key, True, LOCK_TIMEOUT_SECONDS):
+            break
+        sleep(LOCK_RETRY_DELAY_SECONDS)
+    else:
+        raise TimeoutError(f"Couldn't acquire lock on {key}")
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+def mark_dirty(participation_ids: Iterable) -> None:
+    """
+    Adds the given participations to the ones with buffered submissions
+    """
+    with cache_lock(DIRTY_PARTICIPATIONS_KEY):
+        dirty = cache.get(DIRTY_PARTICIPATIONS_KEY) or set()
+        cache.set(DIRTY_PARTICIPATIONS_KEY, dirty | set(participation_ids))
+
+
+def buffer_submission(slot, validated_data: dict) -> Optional[dict]:
+    """
+    Stores the given changes to the submission of `slot` in the buffer of its
+    participation, merging them with the changes already buffered for the slot.
+
+    Returns the buffered submission of the slot, with the selected choices as a
+    list of id's, or None if `validated_data` contains fields that can't be
+    buffered, in which case nothing is buffered
+    """
+    if not set(validated_data).issubset(BUFFERED_SUBMISSION_FIELDS):
+        return None
+
+    changes = {}
+    if "answer_text" in validated_data:
+        changes["answer_text"] = validated_data["answer_text"]
+    if "selected_choices" in validated_data:
+        changes["selected_choices"] = [c.pk for c in validated_data["selected_choices"]]
+
+    key = get_buffer_key(slot.participation_id)
+    with cache_lock(key):
+        submissions = cache.get(key) or {}
+        if len(submissions) == 0:
+            # this is checked while holding the participation's lock: if a
+            # flush removes the participation from the dirty ones before it
+            # persists the buffer, it will also persist these changes
+            mark_dirty([slot.participation_id])
+        submission = {**submissions.get(slot.pk, {}), **changes}
+        submissions[slot.pk] = submission
+        cache.set(key, submissions, None)
+
+    return submission
+
+
+def flush_buffered_submissions(participation_ids: Iterable) -> int:
+    """
+    Persists the buffered submissions to the given participations and
+    empties their buffers. Returns the number of slots updated
+    """
+    from courses.logic.submissions import (
+        get_slots_for_submissions,
+        persist_submissions,
+    )
+
+    keys = [get_buffer_key(pk) for pk in participation_ids]
+    flushed = 0
+    # most participations usually have nothing buffered: only lock those that do
+    for key in cache.get_many(keys):
+        with cache_lock(key):
+            submissions = cache.get(key)
+            if submissions:
+                with transaction.atomic():
+                    slots = get_slots_for_submissions(submissions.keys())
+                    persist_submissions(slots, discard_deleted_choices(submissions))
+                flushed += len(submissions)
+            cache.delete(key)
+    return flushed
+
+
+def flush_all_buffered_submissions() -> int:
+    """
+    Persists all the buffered submissions
+    """
+    with cache_lock(DIRTY_PARTICIPATIONS_KEY):
+        participation_ids = cache.get(DIRTY_PARTICIPATIONS_KEY) or set()
+        cache.delete(DIRTY_PARTICIPATIONS_KEY)
+    try:
+        return flush_buffered_submissions(participation_ids)
+    except Exception:
+        # the buffers that couldn't be persisted are still there: keep their
+        # participations among the dirty ones so that the next flush retries
+        # them. Those that have been flushed are just skipped by it
+        mark_dirty(participation_ids)
+        raise
+
+
+def discard_deleted_choices(submissions: Dict[int, dict]) -> Dict[int, dict]:
+    """
+    Removes from the given submissions the selected choices that have been
+    deleted since the submissions were buffered
+    """
+    from courses.models import ExerciseChoice
+
+    existing_choice_ids = set(
+        ExerciseChoice.objects.filter(
+            pk__in=[
+                choice_id
+                for submission in submissions.values()
+                for choice_id in submission.get("selected_choices", [])
+            ]
+        ).values_list("pk", flat=True)
+    )
+    return {
+        slot_id: (
+            {
+                **submission,
+                "selected_choices": [
+                    pk
+                    for pk in submission["selected_choices"]
+                    if pk in existing_choice_ids
+                ],
+            }
+            if "selected_choices" in submission
+            else submission
+        )
+        for slot_id, submission in submissions.items()
+    }
@@ -0,0 +1,160 @@
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from courses.models import (
+    EventParticipation,
+    EventParticipationSlot,
+    ExerciseChoice,
+)
+
+
+def get_slots_for_submissions(slot_ids: Iterable, **filters) -> List:
+    """
+    Returns the slots with the given id's, with the related objects needed
+    to persist their submissions, locking them until the end of the
+    transaction this is called in
+    """
+    return list(
+        EventParticipationSlot.objects.filter(pk__in=list(slot_ids), **filters)
+        .select_related("exercise", "parent")
+        .select_for_update(of=("self",))
+        .order_by()
+    )
+
+
+def persist_submissions(slots: Iterable, submissions: Dict[int, dict]):
+    """
+    Writes the given submissions, which map the id of each of `slots` to the
+    new values of its submission fields, to the database with bulk queries,
+    then does what EventParticipationSlot.save would do for each of the slots:
+    marks their scores as out of date and records when they were first answered.
+    The slots must have been fetched with get_slots_for_submissions in the
+    transaction this is called in
+    """
+    through = EventParticipationSlot.selected_choices.through
+    slots = [slot for slot in slots if slot.pk in submissions]
+
+    updated_slots = []
+    updated_fields = set()
+    choices_slot_ids = []
+    selected_choices = []
+    for slot in slots:
+        for field, value in submissions[slot.pk].items():
+            if field == "selected_choices":
+                choices_slot_ids.append(slot.pk)
+                selected_choices.extend(
+                    through(eventparticipationslot_id=slot.pk, exercisechoice_id=pk)
+                    for pk in value
+                )
+            else:
+                setattr(slot, field, value)
+                updated_fields.add(field)
+        if set(submissions[slot.pk]) - {"selected_choices"}:
+            updated_slots.append(slot)
+    if len(updated_slots) > 0:
+        EventParticipationSlot.objects.bulk_update(updated_slots, updated_fields)
+    if len(choices_slot_ids) > 0:
+        through.objects.filter(eventparticipationslot_id__in=choices_slot_ids).delete()
+        through.objects.bulk_create(selected_choices)
+
+    # same as EventParticipationSlot.invalidate_score
+    invalidated_slot_ids = set()
+    for slot in slots:
+        ancestor = slot
+        while ancestor is not None:
+            invalidated_slot_ids.add(ancestor.pk)
+            ancestor = ancestor.parent
+    EventParticipationSlot.objects.filter(pk__in=invalidated_slot_ids).update(
+        _score_version=F("_score_version") + 1
+    )
+    EventParticipation.objects.filter(
+        pk__in={slot.participation_id for slot in slots}
+    ).update(_score_version=F("_score_version") + 1)
+
+    # same as EventParticipationSlot.invalidate_score with `answered`
+    newly_answered_slot_ids = set()
+    for slot in slots:
+        if slot.answered_at is None and slot.has_answer:
+            newly_answered_slot_ids.add(slot.pk)
+            if slot.parent_id is not None:
+                newly_answered_slot_ids.add(slot.parent_id)
+    if len(newly_answered_slot_ids) > 0:
+        EventParticipationSlot.objects.filter(
+            pk__in=newly_answered_slot_ids, answered_at__isnull=True
+        ).update(answered_at=timezone.localtime(timezone.now()))
+
+
+def apply_submission_batch(
+    participation: EventParticipation, updates: List[dict]
+) -> Dict[str, int]:
+    """
+    Applies the given updates to the submissions of the slots of `participation`
+    with bulk queries in a single transaction. Each update contains the id of a
+    slot, the new values of its answer text and/or selected choices, and
+    optionally a sequence number assigned by the client.
+
+    Updates are applied in order of sequence number, and those whose sequence
+    number isn't greater than the last one applied to their slot are stale and
+    are dropped, as are those to slots that aren't currently in scope. Raises
+    ValidationError if any of the slots doesn't belong to the participation
+    or any of the choices doesn't belong to the exercise of its slot.
+
+    Returns how many updates have been applied, and how many have been dropped
+    """
+    with transaction.atomic():
+        slots = {
+            slot.pk: slot
+            for slot in get_slots_for_submissions(
+                {update["slot"] for update in updates},
+                participation_id=participation.pk,
+            )
+        }
+        choice_exercise_ids = dict(
+            ExerciseChoice.objects.filter(
+                exercise_id__in={slot.exercise_id for slot in slots.values()}
+            ).values_list("pk", "exercise_id")
+        )
+        for update in updates:
+            slot = slots.get(update["slot"])
+            if slot is None:
+                raise ValidationError(
+                    f"{update['slot']} is not a slot of participation {participation.pk}"
+                )
+            for choice_id in update.get("selected_choices", []):
+                if choice_exercise_ids.get(choice_id) != slot.exercise_id:
+                    raise ValidationError(
+                        f"{choice_id} is not a valid choice for slot {slot.pk}"
+                    )
+
+        submissions = {}
+        result = {"applied": 0, "stale": 0, "out_of_scope": 0}
+        # updates without a sequence number are applied in the order they're given
+        for update in sorted(updates, key=lambda update: update.get("seq", 0)):
+            slot = slots[update["slot"]]
+            seq = update.get("seq")
+            if not participation.is_base_slot_number_current(slot.base_slot_number):
+                result["out_of_scope"] += 1
+                continue
+            if (
+                seq is not None
+                and slot.submission_sequence is not None
+                and seq <= slot.submission_sequence
+            ):
+                result["stale"] += 1
+                continue
+
+            submission = submissions.setdefault(slot.pk, {})
+            for field in ("answer_text", "selected_choices"):
+                if field in update:
+                    submission[field] = update[field]
+            if seq is not None:
+                slot.submission_sequence = seq
+                submission["submission_sequence"] = seq
+            result["applied"] += 1
+
+        persist_submissions(slots.values(), submissions)
+    return result
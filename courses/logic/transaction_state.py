@@ -0,0 +1,68 @@
+from typing import Dict, Hashable, Optional, Tuple
+
+from django.db import transaction
+
+
+class TransactionState(Dict[Hashable, Tuple[str, ...]]):
+    """
+    Keys recorded while a transaction is open, each mapped to the savepoints
+    that were open when it was recorded.
+
+    It's registered as a (no-op) on-commit callback of the transaction, so
+    that Django discards it along with the transaction once it's committed
+    or rolled back
+    """
+
+    def __call__(self):
+        pass
+
+
+def get_transaction_state(using=None) -> Optional[TransactionState]:
+    """
+    Returns the state of the transaction currently open on the given database,
+    or None when not in a transaction. With ATOMIC_REQUESTS, each request is
+    handled in a transaction of its own
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+    for _, callback in connection.run_on_commit:
+        if isinstance(callback, TransactionState):
+            return callback
+    state = TransactionState()
+    transaction.on_commit(state, using)
+    return state
+
+
+def once_per_transaction(key: Hashable, using=None) -> bool:
+    """
+    Returns True if the caller should do the work identified by `key`, i.e.
+    the first time it's called with `key` in the current transaction, and
+    False afterwards, until `key` is forgotten.
+
+    Outside of transactions, and after the savepoint in which the work was
+    done has been rolled back or released, it always returns True
+    """
+    state = get_transaction_state(using)
+    if state is None:
+        return True
+    savepoint_ids = transaction.get_connection(using).savepoint_ids
+    if key in state and all(sid in savepoint_ids for sid in state[key]):
+        return False
+    state[key] = tuple(savepoint_ids)
+    return True
+
+
+def forget_once_per_transaction(*keys: Hashable, using=None) -> None:
+    """
+    Makes the work identified by `keys` be done again the next time it's
+    requested in the current transaction, e.g. once what it invalidated
+    has been recomputed
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return
+    for _, callback in connection.run_on_commit:
+        if isinstance(callback, TransactionState):
+            for key in keys:
+                callback.pop(key, None)
@@ -0,0 +1,188 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from courses.logic.assessment import get_assessor_class
+from courses.logic.batch_assessment import EventBatchAssessor
+from courses.models import (
+    Course,
+    Event,
+    EventParticipation,
+    EventParticipationSlot,
+    EventTemplateRule,
+    Exercise,
+    ExerciseChoice,
+    ExerciseTestCase,
+)
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares assessing all the participations to a synthetic exam with "
+        "EventBatchAssessor against assessing each slot individually. "
+        "All the data is created inside of a transaction which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--participations", type=int, default=500)
+        parser.add_argument("--slots", type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run_benchmark(options["participations"], options["slots"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_benchmark(self, participation_count, slot_count):
+        course = Course.objects.create(name="__benchmark_batch_assessment_course")
+        exercises = []
+        for i in range(slot_count):
+            # mostly multiple choice exercises, with some cloze and JS ones
+            if i % 10 == 8:
+                exercise = self.create_cloze_exercise(course, i)
+            elif i % 10 == 9:
+                exercise = self.create_js_exercise(course, i)
+            else:
+                exercise = self.create_multiple_choice_exercise(course, i)
+            exercises.append(exercise)
+
+        event = Event.objects.create(
+            course=course, event_type=Event.EXAM, name="benchmark"
+        )
+        for exercise in exercises:
+            rule = EventTemplateRule.objects.create(
+                template=event.template,
+                rule_type=EventTemplateRule.ID_BASED,
+                weight=random.choice([1, 2, 2.5, 3]),
+            )
+            rule.exercises.set([exercise])
+
+        for i in range(participation_count):
+            EventParticipation.objects.create(
+                user=User.objects.create(username=f"__benchmark_user_{i}"),
+                event_id=event.pk,
+            )
+        self.answer_slots(event)
+
+        def assess_each_slot():
+            event_assessor_class = get_assessor_class(event)
+            participations = (
+                EventParticipation.objects.filter(event_id=event.pk)
+                .with_prefetched_base_slots()
+                .select_related("event")
+            )
+            for participation in participations:
+                for slot in participation.base_slots:
+                    event_assessor_class(slot).assess()
+
+        def assess_in_batch():
+            EventBatchAssessor(event).assess()
+
+        self.stdout.write(
+            f"{participation_count} participations, {slot_count} slots each"
+        )
+        self.stdout.write("approach\ttime (ms)\tqueries")
+        for name, fn in (
+            ("per-slot assess()", assess_each_slot),
+            ("EventBatchAssessor", assess_in_batch),
+        ):
+            queries = []
+
+            def count_query(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count_query):
+                start = perf_counter()
+                fn()
+                elapsed = (perf_counter() - start) * 1000
+            self.stdout.write(f"{name}\t{elapsed:.2f}\t{len(queries)}")
+
+    def create_multiple_choice_exercise(self, course, i, parent=None):
+        exercise = Exercise.objects.create(
+            course=course,
+            parent=parent,
+            text=f"exercise {i}",
+            exercise_type=random.choice(
+                [
+                    Exercise.MULTIPLE_CHOICE_SINGLE_POSSIBLE,
+                    Exercise.MULTIPLE_CHOICE_MULTIPLE_POSSIBLE,
+                ]
+            ),
+            state=Exercise.PRIVATE,
+            all_or_nothing=random.random() < 0.2,
+        )
+        ExerciseChoice.objects.bulk_create(
+            [
+                ExerciseChoice(
+                    exercise=exercise, text=str(j), correctness=correctness, _ordering=j
+                )
+                for j, correctness in enumerate([1, 0.5, 0, -0.25])
+            ]
+        )
+        return exercise
+
+    def create_cloze_exercise(self, course, i):
+        exercise = Exercise.objects.create(
+            course=course,
+            text=f"cloze {i}",
+            exercise_type=Exercise.COMPLETION,
+            state=Exercise.PRIVATE,
+        )
+        for j in range(3):
+            sub_exercise = self.create_multiple_choice_exercise(
+                course, f"{i}.{j}", parent=exercise
+            )
+            exercise.text += f" [[{sub_exercise.pk}]]"
+        exercise.save()
+        return exercise
+
+    def create_js_exercise(self, course, i):
+        exercise = Exercise.objects.create(
+            course=course,
+            text=f"js {i}",
+            exercise_type=Exercise.JS,
+            state=Exercise.PRIVATE,
+        )
+        for j in range(4):
+            ExerciseTestCase.objects.create(exercise=exercise, code=str(j))
+        return exercise
+
+    def answer_slots(self, event):
+        slots = EventParticipationSlot.objects.filter(
+            participation__event_id=event.pk
+        ).select_related("exercise")
+        choices = {}
+        for choice in ExerciseChoice.objects.filter(exercise__course=event.course):
+            choices.setdefault(choice.exercise_id, []).append(choice)
+
+        through = EventParticipationSlot.selected_choices.through
+        selected = []
+        programming_slots = []
+        for slot in slots:
+            if slot.exercise.exercise_type == Exercise.JS:
+                slot.answer_text = "code"
+                slot.execution_results = {
+                    "tests": [{"passed": random.random() < 0.5} for _ in range(4)]
+                }
+                programming_slots.append(slot)
+            elif slot.exercise_id in choices:
+                selected.append(
+                    through(
+                        eventparticipationslot_id=slot.pk,
+                        exercisechoice_id=random.choice(choices[slot.exercise_id]).pk,
+                    )
+                )
+        through.objects.bulk_create(selected)
+        EventParticipationSlot.objects.bulk_update(
+            programming_slots, ["answer_text", "execution_results"]
+        )
@@ -0,0 +1,114 @@
+import time
+
+from coding.fake_jobe import FakeJobeServer
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from courses.models import (
+    Course,
+    Event,
+    EventParticipation,
+    EventTemplateRule,
+    Exercise,
+    ExerciseTestCase,
+)
+from courses.tasks import bulk_run_participation_slot_code_task
+from users.models import User
+
+C_PROGRAM = """
+#include <stdio.h>
+
+int main() {
+    int a, b;
+    scanf("%d %d", &a, &b);
+    printf("%d\\n", a + b);
+    return 0;
+}
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures how long bulk_run_participation_slot_code_task, which runs "
+        "the code of the submissions to an exam when it's closed, takes to run "
+        "the C submissions of an exam on a local fake Jobe server, with the "
+        "submissions and test cases run one at a time and concurrently. All the "
+        "data is created inside of a transaction which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=50)
+        parser.add_argument("--testcases", type=int, default=5)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.02,
+            help="Seconds added by the fake Jobe server to each run",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run_benchmark(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_benchmark(self, options):
+        teacher = User.objects.create(username="__benchmark_teacher", is_teacher=True)
+        course = Course.objects.create(name="__benchmark_course", creator=teacher)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        for i in range(options["testcases"]):
+            ExerciseTestCase.objects.create(
+                exercise=exercise, stdin=f"{i} 1", expected_stdout=str(i + 1)
+            )
+        event = Event.objects.create(
+            course=course, name="exam", event_type=Event.EXAM, state=Event.OPEN
+        )
+        rule = EventTemplateRule.objects.create(
+            template=event.template, rule_type=EventTemplateRule.ID_BASED
+        )
+        rule.exercises.set([exercise])
+
+        slot_ids = []
+        for i in range(options["submissions"]):
+            student = User.objects.create(
+                username=f"__benchmark_student_{i}",
+                email=f"__benchmark_student_{i}@a.com",
+            )
+            participation = EventParticipation.objects.create(
+                user=student, event_id=event.pk
+            )
+            slot = participation.slots.get()
+            slot.answer_text = C_PROGRAM
+            slot.save()
+            slot_ids.append(slot.pk)
+
+        for label, threads in (
+            ("sequential", 1),
+            (f"{options['threads']} threads", options["threads"]),
+        ):
+            with FakeJobeServer(latency=options["latency"]) as jobe, override_settings(
+                JOBE_RUNS_URL=jobe.runs_url,
+                JOBE_FILES_URL=jobe.files_url,
+                JOBE_MAX_CONCURRENCY=threads,
+                CODE_EXECUTION_MAX_THREADS=threads,
+            ):
+                start = time.perf_counter()
+                bulk_run_participation_slot_code_task.apply(args=(slot_ids,))
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                f"{label}: {len(slot_ids)} submissions run in {elapsed:.2f}s "
+                f"({len(slot_ids) / elapsed:.1f} submissions/s), "
+                f"{jobe.stats['runs']} runs, "
+                f"at most {jobe.stats['max_running']} at the same time"
+            )
@@ -0,0 +1,92 @@
+import statistics
+import time
+
+from coding.fake_jobe import FakeJobeServer
+from coding.helpers import get_code_execution_results
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from courses.models import Course, Exercise, ExerciseTestCase
+from users.models import User
+
+C_PROGRAM = """
+#include <stdio.h>
+
+int main() {
+    int a, b;
+    scanf("%d %d", &a, &b);
+    printf("%d\\n", a + b);
+    return 0;
+}
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency of running a C submission against the test cases "
+        "of an exercise on a local fake Jobe server, which compiles programs "
+        "with gcc, with a run per test case and compiling the submission once "
+        "(JOBE_C_COMPILE_ONCE). All the data is created inside of a transaction "
+        "which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--testcases", type=int, default=10)
+        parser.add_argument("--submissions", type=int, default=10)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.005,
+            help="Seconds added by the fake Jobe server to each run",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run_benchmark(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_benchmark(self, options):
+        teacher = User.objects.create(username="__benchmark_teacher", is_teacher=True)
+        course = Course.objects.create(name="__benchmark_course", creator=teacher)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        for i in range(options["testcases"]):
+            ExerciseTestCase.objects.create(
+                exercise=exercise, stdin=f"{i} 1", expected_stdout=str(i + 1)
+            )
+
+        for label, compile_once in (
+            ("run per test case", False),
+            ("compile once", True),
+        ):
+            with FakeJobeServer(latency=options["latency"]) as jobe, override_settings(
+                JOBE_RUNS_URL=jobe.runs_url,
+                JOBE_FILES_URL=jobe.files_url,
+                JOBE_C_COMPILE_ONCE=compile_once,
+            ):
+                latencies = []
+                for _ in range(options["submissions"]):
+                    start = time.perf_counter()
+                    results = get_code_execution_results(
+                        exercise=exercise, code=C_PROGRAM
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    assert all(t["passed"] for t in results["tests"])
+
+            submissions = options["submissions"]
+            self.stdout.write(
+                f"{label}: {statistics.median(latencies) * 1000:.0f}ms median, "
+                f"{max(latencies) * 1000:.0f}ms max per submission, "
+                f"{jobe.stats['runs'] / submissions:.0f} runs and "
+                f"{jobe.stats['compilations'] / submissions:.0f} compilations "
+                "per submission"
+            )
@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from courses.models import (
+    Course,
+    Event,
+    EventParticipation,
+    EventTemplateRule,
+    Exercise,
+    UserCourseEnrollment,
+)
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts the queries (and the writes to the events table) run when listing "
+        "the events of a course and when retrieving a participation, with events "
+        "in states that are subject to automatic transitions. All the data is "
+        "created inside of a transaction which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run_benchmark(options["events"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def report(self, label, context):
+        event_writes = [
+            q
+            for q in context.captured_queries
+            if q["sql"].startswith("UPDATE") and '"courses_event"' in q["sql"]
+        ]
+        self.stdout.write(
+            f"{label}: {len(context.captured_queries)} queries, "
+            f"{len(event_writes)} writes to events"
+        )
+
+    def run_benchmark(self, event_count):
+        now = timezone.localtime(timezone.now())
+        teacher = User.objects.create(username="__benchmark_teacher", is_teacher=True)
+        student = User.objects.create(
+            username="__benchmark_student", email="__benchmark_student@a.com"
+        )
+        course = Course.objects.create(name="__benchmark_course", creator=teacher)
+        UserCourseEnrollment.objects.create(user=student, course=course)
+        exercise = Exercise.objects.create(
+            course=course,
+            exercise_type=Exercise.OPEN_ANSWER,
+            state=Exercise.PRIVATE,
+            text="exercise",
+        )
+
+        events = []
+        for i in range(event_count):
+            # events due to be opened, events due to be closed, and restricted events
+            kind = i % 3
+            event = Event.objects.create(
+                course=course,
+                name=f"event {i}",
+                event_type=Event.EXAM,
+                begin_timestamp=now - timezone.timedelta(hours=1),
+                end_timestamp=now + timezone.timedelta(hours=1 if kind == 0 else -1),
+                close_automatically=kind == 1,
+            )
+            rule = EventTemplateRule.objects.create(
+                template=event.template, rule_type=EventTemplateRule.ID_BASED
+            )
+            rule.exercises.set([exercise])
+            if kind == 2:
+                event.users_allowed_past_closure.add(teacher)
+            # bypass save() so that no transitions are applied while setting up
+            Event.objects.filter(pk=event.pk).update(
+                _event_state=[Event.PLANNED, Event.OPEN, Event.RESTRICTED][kind]
+            )
+            events.append(event)
+
+        # a participation to an event due to be opened
+        participation = EventParticipation.objects.create(
+            user=student, event_id=events[0].pk
+        )
+
+        client = APIClient()
+        client.force_authenticate(user=teacher)
+        with CaptureQueriesContext(connection) as context:
+            client.get(f"/courses/{course.pk}/events/")
+        self.report(f"list {event_count} events", context)
+
+        client.force_authenticate(user=student)
+        with CaptureQueriesContext(connection) as context:
+            client.get(
+                f"/courses/{course.pk}/events/{events[0].pk}"
+                f"/participations/{participation.pk}/"
+            )
+        self.report("retrieve participation", context)
@@ -0,0 +1,140 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.logic.event_instances import ExercisePicker
+from courses.models import (
+    Course,
+    Event,
+    EventParticipation,
+    EventTemplateRule,
+    EventTemplateRuleClause,
+    Exercise,
+    Tag,
+)
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency of generating participations to an exam with "
+        "tag-based and fully random rules against the size of the exercise bank. "
+        "All the data is created inside of a transaction which is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000]
+        )
+        parser.add_argument("--tags", type=int, default=50)
+        parser.add_argument("--participations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            "exercises\tpicking with index (ms)\tpicking with ORDER BY RANDOM() (ms)"
+            "\tparticipation creation (ms)"
+        )
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    timings = self.run_benchmark(
+                        size, options["tags"], options["participations"]
+                    )
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write("\t".join([str(size)] + [f"{t:.2f}" for t in timings]))
+
+    def run_benchmark(self, size, tag_count, participation_count):
+        course = Course.objects.create(name=f"__benchmark_course_{size}")
+        Tag.objects.bulk_create(
+            [Tag(course=course, name=f"tag_{i}") for i in range(tag_count)]
+        )
+        tags = list(Tag.objects.filter(course=course))
+        Exercise.objects.bulk_create(
+            [
+                Exercise(
+                    course=course,
+                    text=f"exercise {i}",
+                    exercise_type=Exercise.OPEN_ANSWER,
+                    state=random.choice([Exercise.PRIVATE, Exercise.PUBLIC]),
+                    _ordering=i,
+                )
+                for i in range(size)
+            ]
+        )
+        through = Exercise.public_tags.through
+        through.objects.bulk_create(
+            [
+                through(exercise_id=exercise_id, tag_id=tag.pk)
+                for exercise_id in Exercise.objects.filter(course=course).values_list(
+                    "pk", flat=True
+                )
+                for tag in random.sample(tags, 3)
+            ]
+        )
+
+        event = Event.objects.create(
+            course=course, event_type=Event.EXAM, name="benchmark"
+        )
+        for i in range(5):
+            rule = EventTemplateRule.objects.create(
+                template=event.template,
+                rule_type=EventTemplateRule.TAG_BASED,
+                amount=2,
+            )
+            for _ in range(2):
+                clause = EventTemplateRuleClause.objects.create(rule=rule)
+                clause.tags.set(random.sample(tags, tag_count // 5))
+        EventTemplateRule.objects.create(
+            template=event.template,
+            rule_type=EventTemplateRule.FULLY_RANDOM,
+            amount=5,
+        )
+
+        users = [
+            User.objects.create(username=f"__benchmark_user_{size}_{i}")
+            for i in range(participation_count)
+        ]
+
+        def measure(fn):
+            start = perf_counter()
+            for i in range(participation_count):
+                fn(i)
+            return (perf_counter() - start) * 1000 / participation_count
+
+        # build the index before measuring
+        ExercisePicker().get_exercises_from(event.template)
+        index_ms = measure(
+            lambda _: ExercisePicker().get_exercises_from(event.template)
+        )
+
+        # the previous approach: one ORDER BY RANDOM() query per rule
+        exercises = Exercise.objects.base_exercises().filter(course=course)
+        rules = list(event.template.rules.all())
+
+        def pick_with_random_ordering(_):
+            picked = []
+            for rule in rules:
+                picked.extend(
+                    exercises.satisfying(rule)
+                    .exclude(pk__in=[e.pk for e in picked])
+                    .get_random(amount=rule.amount)
+                    .with_prefetched_related_objects()
+                )
+
+        random_ms = measure(pick_with_random_ordering)
+
+        creation_ms = measure(
+            lambda i: EventParticipation.objects.create(
+                user=users[i], event_id=event.pk
+            )
+        )
+
+        return index_ms, random_ms, creation_ms
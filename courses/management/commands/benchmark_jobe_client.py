@@ -0,0 +1,81 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from coding.fake_jobe import FakeJobeServer
+from coding.jobe import JobeClient
+from django.core.management.base import BaseCommand
+
+C_PROGRAM = """
+#include <stdio.h>
+
+int main() {
+    int a, b;
+    scanf("%d %d", &a, &b);
+    printf("%d\\n", a + b);
+    return 0;
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the throughput of runs sent to a local fake Jobe server, which "
+        "compiles and runs a C program with gcc, sending a request with a new "
+        "connection for each run as the code used to do, and with a pooled "
+        "JobeClient, from a number of concurrent threads. The server rejects "
+        "the runs beyond --max-running with the overload outcome."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--max-running", type=int, default=8)
+        parser.add_argument("--latency", type=float, default=0.01)
+
+    def handle(self, *args, **options):
+        run_spec = {"language_id": "c", "sourcecode": C_PROGRAM, "input": "1 2"}
+
+        for label, get_run in (
+            ("unpooled", self.get_unpooled_run),
+            ("pooled client", self.get_pooled_run),
+        ):
+            with FakeJobeServer(
+                latency=options["latency"], max_running=options["max_running"]
+            ) as jobe:
+                run = get_run(jobe, options)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                    outcomes = list(
+                        executor.map(lambda _: run(run_spec), range(options["runs"]))
+                    )
+                elapsed = time.perf_counter() - start
+
+            completed = outcomes.count(15)
+            self.stdout.write(
+                f"{label}: {completed}/{options['runs']} runs completed in "
+                f"{elapsed:.2f}s ({completed / elapsed:.1f} runs/s), "
+                f"{jobe.stats['connections']} connections, "
+                f"{jobe.stats['overloaded']} runs rejected by jobe"
+            )
+
+    def get_unpooled_run(self, jobe, options):
+        def run(run_spec):
+            response = requests.post(
+                jobe.runs_url,
+                data=json.dumps({"run_spec": run_spec}),
+                headers={"content-type": "application/json"},
+            )
+            return response.json()["outcome"]
+
+        return run
+
+    def get_pooled_run(self, jobe, options):
+        client = JobeClient(
+            runs_url=jobe.runs_url,
+            files_url=jobe.files_url,
+            max_concurrency=options["max_running"],
+            retry_backoff=0.01,
+        )
+        return lambda run_spec: client.run(run_spec)["outcome"]
@@ -0,0 +1,148 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from courses.models import (
+    Course,
+    Event,
+    EventParticipation,
+    EventTemplateRule,
+    Exercise,
+    ExerciseChoice,
+    UserCourseEnrollment,
+)
+from users.models import User
+
+
+# the (queries, writes) measured with this same benchmark on e092b68, before
+# scores were persisted and before slots were saved with fewer writes, to
+# compare the current numbers against
+BASELINE = {
+    "open answer, first autosave": (37, 2),
+    "open answer, next autosave": (36, 1),
+    "multiple choice, first autosave": (41, 3),
+    "multiple choice, next autosave": (40, 3),
+    "cloze sub-exercise, first autosave": (52, 4),
+    "cloze sub-exercise, next autosave": (45, 3),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts the queries (and the writes among them) run by the autosaves of "
+        "the submissions to the slots of an exam, for an open answer exercise, a "
+        "multiple choice exercise, and a sub-exercise of a cloze exercise, both "
+        "the first time a slot is answered and afterwards. All the data is "
+        "created inside of a transaction which is rolled back. The counts are "
+        "reported next to those of the baseline."
+    )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run_benchmark()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def report(self, label, context):
+        writes = [
+            q
+            for q in context.captured_queries
+            if q["sql"].startswith(("UPDATE", "INSERT", "DELETE"))
+        ]
+        baseline_queries, baseline_writes = BASELINE[label]
+        self.stdout.write(
+            f"{label}: {len(context.captured_queries)} queries, {len(writes)} writes "
+            f"(baseline: {baseline_queries} queries, {baseline_writes} writes)"
+        )
+
+    def run_benchmark(self):
+        teacher = User.objects.create(username="__benchmark_teacher", is_teacher=True)
+        student = User.objects.create(
+            username="__benchmark_student", email="__benchmark_student@a.com"
+        )
+        course = Course.objects.create(name="__benchmark_course", creator=teacher)
+        UserCourseEnrollment.objects.create(user=student, course=course)
+
+        open_answer = Exercise.objects.create(
+            course=course,
+            exercise_type=Exercise.OPEN_ANSWER,
+            state=Exercise.PRIVATE,
+            text="open answer",
+        )
+        multiple_choice = self.create_multiple_choice_exercise(course)
+        cloze = Exercise.objects.create(
+            course=course,
+            exercise_type=Exercise.COMPLETION,
+            state=Exercise.PRIVATE,
+            text="cloze",
+        )
+        sub_exercise = self.create_multiple_choice_exercise(course, parent=cloze)
+        cloze.text += f" [[{sub_exercise.pk}]]"
+        cloze.save()
+
+        event = Event.objects.create(
+            course=course, name="exam", event_type=Event.EXAM, state=Event.OPEN
+        )
+        for exercise in (open_answer, multiple_choice, cloze):
+            rule = EventTemplateRule.objects.create(
+                template=event.template, rule_type=EventTemplateRule.ID_BASED
+            )
+            rule.exercises.set([exercise])
+        participation = EventParticipation.objects.create(
+            user=student, event_id=event.pk
+        )
+        slots = {slot.exercise_id: slot for slot in participation.slots.all()}
+
+        client = APIClient()
+        client.force_authenticate(user=student)
+        url = (
+            f"/courses/{course.pk}/events/{event.pk}"
+            f"/participations/{participation.pk}/slots/"
+        )
+        for label, exercise, get_data in (
+            ("open answer", open_answer, lambda i: {"answer_text": f"answer {i}"}),
+            (
+                "multiple choice",
+                multiple_choice,
+                lambda i: {"selected_choices": [multiple_choice.choices.all()[i].pk]},
+            ),
+            (
+                "cloze sub-exercise",
+                sub_exercise,
+                lambda i: {"selected_choices": [sub_exercise.choices.all()[i].pk]},
+            ),
+        ):
+            slot_url = f"{url}{slots[exercise.pk].pk}/patch_submission/"
+            for i, attempt in enumerate(("first autosave", "next autosave")):
+                data = get_data(i)
+                # include the saves scheduled to run on commit
+                with CaptureQueriesContext(connection) as context:
+                    with TestCase.captureOnCommitCallbacks(execute=True):
+                        client.patch(slot_url, data)
+                self.report(f"{label}, {attempt}", context)
+
+    def create_multiple_choice_exercise(self, course, parent=None):
+        exercise = Exercise.objects.create(
+            course=course,
+            parent=parent,
+            exercise_type=Exercise.MULTIPLE_CHOICE_SINGLE_POSSIBLE,
+            state=Exercise.PRIVATE,
+            text="multiple choice",
+        )
+        ExerciseChoice.objects.bulk_create(
+            [
+                ExerciseChoice(
+                    exercise=exercise, text=str(j), correctness=correctness, _ordering=j
+                )
+                for j, correctness in enumerate([1, 0])
+            ]
+        )
+        return exercise
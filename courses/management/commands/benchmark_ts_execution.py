@@ -0,0 +1,60 @@
+import os
+import statistics
+import time
+
+from coding.node_pool import NodeWorkerPool
+from django.core.management.base import BaseCommand
+
+TS_PROGRAM = """
+function add{n}(a: number, b: number): number {{
+    return a + b;
+}}
+const add = add{n};
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency of running TypeScript submissions against the test "
+        "cases of an exercise on a pool of node workers, with the transpilation "
+        "cache of the workers disabled and enabled. Each submission is different, "
+        "and each one is then submitted again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--testcases", type=int, default=10)
+        parser.add_argument("--submissions", type=int, default=20)
+
+    def handle(self, *args, **options):
+        testcases = [
+            {"id": i, "assertion": f"assert.strictEqual(add({i}, 1), {i + 1})"}
+            for i in range(options["testcases"])
+        ]
+        submissions = [TS_PROGRAM.format(n=n) for n in range(options["submissions"])]
+
+        for label, cache_size in (("cache disabled", "0"), ("cache enabled", None)):
+            env = os.environ.copy()
+            if cache_size is not None:
+                os.environ["TS_TRANSPILE_CACHE_SIZE"] = cache_size
+                os.environ.pop("TS_TRANSPILE_CACHE_DIR", None)
+            # a single worker, so that all submissions find the same cache
+            pool = NodeWorkerPool(size=1, max_jobs=10**6, job_timeout=60)
+            try:
+                # start the worker and load the compiler
+                pool.run("const add = (a: number, b: number) => a + b;", [], True)
+                for kind in ("new submissions", "resubmissions"):
+                    latencies = []
+                    for code in submissions:
+                        start = time.perf_counter()
+                        result = pool.run(code, testcases, True)
+                        latencies.append(time.perf_counter() - start)
+                        assert all(t["passed"] for t in result["tests"]), result
+                    self.stdout.write(
+                        f"{label}, {kind}: "
+                        f"{statistics.median(latencies) * 1000:.0f}ms median, "
+                        f"{max(latencies) * 1000:.0f}ms max per submission"
+                    )
+            finally:
+                pool.stop()
+                os.environ.clear()
+                os.environ.update(env)
@@ -0,0 +1,29 @@
+from coding.execution_cache import (
+    get_execution_cache_stats,
+    reset_execution_cache_stats,
+)
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows how many times the results of running code against the test cases "
+        "of an exercise were found in the cache, and how many times the code had "
+        "to be run. The counters are shared by the processes that share the cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        stats = get_execution_cache_stats()
+        hit_rate = (
+            f"{stats['hit_rate'] * 100:.1f}%" if stats["hit_rate"] is not None else "-"
+        )
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {hit_rate}"
+        )
+        if options["reset"]:
+            reset_execution_cache_stats()
@@ -1,11 +1,12 @@
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q
 from content.models import Content
 
 from courses.querysets import (
     CourseQuerySet,
     EventParticipationQuerySet,
+    EventQuerySet,
     ExerciseQuerySet,
     ExerciseSolutionQuerySet,
     SlotModelQuerySet,
@@ -155,11 +156,14 @@ class EventParticipationManager(models.Manager):
     def get_queryset(self):
         return EventParticipationQuerySet(self.model, using=self._db)
 
+    def claimed(self):
+        return self.get_queryset().claimed()
+
     def create(self, *args, **kwargs):
         """
         Creates an event participation and its related slots
         """
-        from .models import EventParticipationSlot, Event
+        from .models import EventParticipationSlot, Event, PracticeSeenExercise
 
         from courses.logic.event_instances import ExercisePicker
 
@@ -173,34 +177,113 @@ class EventParticipationManager(models.Manager):
         event_template = event.template
 
         # use event template to get a list of exercises for this participation
-        # exercises_with_rules = get_exercises_from(
-        #     event_template,
-        #     public_only=(event.event_type == Event.SELF_SERVICE_PRACTICE),
-        #     exclude_seen_in_practice=(event.event_type == Event.SELF_SERVICE_PRACTICE),
-        # )
+        is_practice = event.event_type == Event.SELF_SERVICE_PRACTICE
         exercises_with_rules = ExercisePicker().get_exercises_from(
             event_template,
-            public_only=(event.event_type == Event.SELF_SERVICE_PRACTICE),
+            public_only=is_practice,
+            exclude_seen_in_practice=is_practice,
         )
 
-        slot_number = 0
-        for exercise, populating_rule in exercises_with_rules:
-            now = timezone.localtime(timezone.now())
-            # mark first slot as seen
-            seen_at_kwarg = {"seen_at": now} if slot_number == 0 else {}
+        now = timezone.localtime(timezone.now())
+        EventParticipationSlot.objects.bulk_create_slot_tree(
+            participation,
+            exercises_with_rules,
+            event=event,
+            # mark first slot as seen - pre-generated participations have
+            # their first slot marked as seen when they're claimed
+            first_slot_seen_at=now if participation.claimed else None,
+        )
 
-            EventParticipationSlot.objects.create(
-                participation=participation,
-                exercise=exercise,
-                populating_rule=populating_rule,
-                slot_number=slot_number,
-                **seen_at_kwarg,
+        if is_practice:
+            # keep track of the exercises the user has seen in practice
+            PracticeSeenExercise.objects.bulk_create(
+                [
+                    PracticeSeenExercise(
+                        user_id=participation.user_id,
+                        course_id=event.course_id,
+                        exercise=exercise,
+                    )
+                    for exercise, _ in exercises_with_rules
+                ],
+                ignore_conflicts=True,
             )
-            slot_number += 1
 
         return participation
 
 
+class PregeneratedEventParticipationManager(EventParticipationManager):
+    """
+    Manager for the participations to exams that are built in the background
+    shortly before the exam begins, so that when students start the exam
+    their participation only needs to be claimed instead of being created
+    """
+
+    def get_queryset(self):
+        return EventParticipationQuerySet(self.model, using=self._db).filter(
+            claimed=False
+        )
+
+    def create(self, *args, **kwargs):
+        kwargs["claimed"] = False
+        return super().create(*args, **kwargs)
+
+    def get_users_to_pregenerate_for(self, event):
+        """
+        Returns the users enrolled in the course of the given event that are
+        allowed to participate in it according to its access rule and don't
+        have a participation to it yet
+        """
+        from .models import Event
+
+        users = event.course.enrolled_users.exclude(participations__event=event)
+        if event.access_rule == Event.ALLOW_ACCESS:
+            return users.exclude(email__in=event.access_rule_exceptions)
+        return users.filter(email__in=event.access_rule_exceptions)
+
+    def pregenerate(self, event, user_ids):
+        """
+        Creates an unclaimed participation to the given event for each of the
+        given users, skipping users that already have a participation
+        """
+        created = []
+        for user_id in user_ids:
+            try:
+                with transaction.atomic():
+                    created.append(self.create(user_id=user_id, event_id=event.pk))
+            except IntegrityError:
+                # the user already has a participation to this event
+                continue
+        return created
+
+    def claim(self, event_id, user):
+        """
+        Marks the participation pre-generated for the given user and event as
+        claimed, setting its begin timestamp and marking its first slot as
+        seen. Returns None if no participation had been pre-generated
+        """
+        with transaction.atomic():
+            participation = (
+                self.select_for_update().filter(event_id=event_id, user=user).first()
+            )
+            if participation is None:
+                return None
+
+            now = timezone.localtime(timezone.now())
+            participation.claimed = True
+            participation.begin_timestamp = now
+            participation.save(update_fields=["claimed", "begin_timestamp"])
+            participation.slots.base_slots().filter(slot_number=0).update(seen_at=now)
+
+        return participation
+
+    def discard(self, event_id):
+        """
+        Deletes the unclaimed participations to the given event, e.g. because
+        the event's template or schedule changed after they were generated
+        """
+        self.filter(event_id=event_id).delete()
+
+
 class EventParticipationSlotManager(models.Manager):
     def get_queryset(self):
         return SlotModelQuerySet(self.model, using=self._db)
@@ -226,8 +309,181 @@ class EventParticipationSlotManager(models.Manager):
 
         return slot
 
+    def bulk_create_slot_tree(
+        self, participation, exercises_with_rules, event=None, first_slot_seen_at=None
+    ):
+        """
+        Creates the base slots of a participation for the given list of
+        (exercise, populating_rule) pairs, together with the sub-slots for
+        the sub-exercises of those exercises, recursively.
+
+        The whole tree is built in memory and validated once against the
+        already-loaded exercises and rules, then written with one bulk insert
+        per level of depth of the tree, instead of one INSERT (plus the
+        validation queries of `clean`) per slot
+        """
+        from .models import EventParticipationSlot, Exercise
+
+        event = event or participation.event
+        exercises_with_rules = list(exercises_with_rules)
+
+        # same checks as EventParticipationSlot.clean, run on in-memory objects
+        for exercise, populating_rule in exercises_with_rules:
+            if exercise.course_id != event.course_id:
+                raise ValidationError(
+                    str(exercise) + " is not a valid exercise for " + str(participation)
+                )
+            if (
+                populating_rule is not None
+                and populating_rule.template_id != event.template_id
+            ):
+                raise ValidationError(
+                    str(populating_rule)
+                    + " is not a valid rule for "
+                    + str(participation)
+                )
+
+        level = [
+            EventParticipationSlot(
+                participation=participation,
+                exercise=exercise,
+                populating_rule=populating_rule,
+                slot_number=slot_number,
+                base_slot_number=slot_number,
+                seen_at=first_slot_seen_at if slot_number == 0 else None,
+            )
+            for slot_number, (exercise, populating_rule) in enumerate(
+                exercises_with_rules
+            )
+        ]
+        base_slots = level
+
+        while len(level) > 0:
+            self._bulk_create_slot_level(participation, level)
+
+            # fetch the sub-exercises of all the exercises in this level at once
+            sub_exercises = {}
+            for sub_exercise in Exercise.objects.filter(
+                parent_id__in={s.exercise_id for s in level}
+            ):
+                sub_exercises.setdefault(sub_exercise.parent_id, []).append(
+                    sub_exercise
+                )
+
+            level = [
+                EventParticipationSlot(
+                    participation=participation,
+                    exercise=sub_exercise,
+                    parent=slot,
+                    slot_number=sub_slot_number,
+                    base_slot_number=slot.base_slot_number,
+                )
+                for slot in level
+                for sub_slot_number, sub_exercise in enumerate(
+                    sub_exercises.get(slot.exercise_id, [])
+                )
+            ]
+
+        participation.base_slot_count = len(base_slots)
+        participation.save(update_fields=["base_slot_count"])
+
+        return base_slots
+
+    def _bulk_create_slot_level(self, participation, slots):
+        """
+        Inserts a list of sibling-level slots and makes sure their pk's are
+        populated, which isn't done by `bulk_create` on backends that
+        can't return the inserted rows (e.g. sqlite)
+        """
+        self.bulk_create(slots)
+
+        if all(s.pk is not None for s in slots):
+            return
+
+        parent_ids = {s.parent_id for s in slots}
+        if None in parent_ids:
+            inserted = self.filter(participation=participation, parent__isnull=True)
+        else:
+            inserted = self.filter(
+                participation=participation, parent_id__in=parent_ids
+            )
+
+        pks = {
+            (parent_id, slot_number): pk
+            for pk, parent_id, slot_number in inserted.values_list(
+                "pk", "parent_id", "slot_number"
+            )
+        }
+        for slot in slots:
+            slot.pk = pks[(slot.parent_id, slot.slot_number)]
+
 
 class EventManager(models.Manager):
+    def get_queryset(self):
+        return EventQuerySet(self.model, using=self._db)
+
+    def in_state(self, state):
+        return self.get_queryset().in_state(state)
+
+    def apply_due_state_transitions(self):
+        """
+        Persists the state transitions of events that are due: PLANNED events
+        whose begin timestamp has passed are opened, OPEN events whose end
+        timestamp has passed are closed, and RESTRICTED events with no users
+        allowed past closure (or with all participants allowed) are closed
+        (opened). Events are saved one by one so that lifecycle hooks fire
+        """
+        from .models import Event
+
+        now = timezone.localtime(timezone.now())
+        transitioned = []
+
+        due_events = self.get_queryset().filter(
+            Q(
+                _event_state=Event.PLANNED,
+                open_automatically=True,
+                begin_timestamp__lte=now,
+            )
+            | Q(
+                _event_state=Event.OPEN,
+                close_automatically=True,
+                end_timestamp__lte=now,
+            )
+        )
+        for event in due_events:
+            # first open the event, then close it if it's also past its end,
+            # so that the hooks of both transitions run
+            if event._event_state == Event.PLANNED:
+                event._event_state = Event.OPEN
+                event.save()
+            if event.get_effective_state(now) == Event.CLOSED:
+                event._event_state = Event.CLOSED
+                event.save()
+            transitioned.append(event)
+
+        restricted_events = (
+            self.get_queryset()
+            .filter(_event_state=Event.RESTRICTED)
+            .annotate(
+                allowed_users_count=Count("users_allowed_past_closure", distinct=True),
+                participations_count=Count(
+                    "participations",
+                    filter=Q(participations__claimed=True),
+                    distinct=True,
+                ),
+            )
+        )
+        for event in restricted_events:
+            new_state = event.get_restricted_state_transition(
+                event.allowed_users_count, event.participations_count
+            )
+            if new_state is not None:
+                event._event_state = new_state
+                event.save()
+                transitioned.append(event)
+
+        return transitioned
+
     def create(self, *args, **kwargs):
         from .models import EventTemplate
 
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0090_event_show_assessment_rule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipation',
+            name='claimed',
+            field=models.BooleanField(default=True),
+        ),
+    ]
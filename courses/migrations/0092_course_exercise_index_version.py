@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0091_eventparticipation_claimed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='exercise_index_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.20 on 2026-10-18 04:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0092_course_exercise_index_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PracticeSeenExercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seen_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_seen_exercises', to='courses.course')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_seen_by', to='courses.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='practice_seen_exercises', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='practiceseenexercise',
+            index=models.Index(fields=['user_id', 'course_id'], name='courses_pra_user_id_08eb74_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='practiceseenexercise',
+            constraint=models.UniqueConstraint(fields=('user_id', 'exercise_id'), name='practice_seen_exercise_unique_user'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:02
+
+from django.db import migrations
+
+
+SELF_SERVICE_PRACTICE = 0
+BATCH_SIZE = 1000
+
+
+def backfill_practice_seen_exercises(apps, schema_editor):
+    EventParticipationSlot = apps.get_model("courses", "EventParticipationSlot")
+    PracticeSeenExercise = apps.get_model("courses", "PracticeSeenExercise")
+
+    seen = (
+        EventParticipationSlot.objects.filter(
+            parent__isnull=True,
+            participation__event__event_type=SELF_SERVICE_PRACTICE,
+        )
+        .values_list(
+            "participation__user_id",
+            "participation__event__course_id",
+            "exercise_id",
+        )
+        .order_by()
+        .distinct()
+    )
+
+    batch = []
+    for user_id, course_id, exercise_id in seen.iterator():
+        batch.append(
+            PracticeSeenExercise(
+                user_id=user_id, course_id=course_id, exercise_id=exercise_id
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            PracticeSeenExercise.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PracticeSeenExercise.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("courses", "0093_practiceseenexercise"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_practice_seen_exercises, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.20 on 2026-10-18 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0094_backfill_practiceseenexercise'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipation',
+            name='_computed_assessment_progress',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventparticipation',
+            name='_computed_score',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventparticipation',
+            name='_computed_score_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventparticipation',
+            name='_score_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='eventparticipationslot',
+            name='_computed_score',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventparticipationslot',
+            name='_computed_score_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventparticipationslot',
+            name='_score_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.20 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0095_persisted_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercise',
+            name='_computed_max_score_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exercise',
+            name='_max_score',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='exercise',
+            name='_max_score_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
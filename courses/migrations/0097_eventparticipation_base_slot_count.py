@@ -0,0 +1,36 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill_base_slot_count(apps, schema_editor):
+    EventParticipation = apps.get_model("courses", "EventParticipation")
+    EventParticipationSlot = apps.get_model("courses", "EventParticipationSlot")
+
+    base_slot_count = (
+        EventParticipationSlot.objects.filter(
+            participation_id=OuterRef("pk"), parent__isnull=True
+        )
+        .order_by()
+        .values("participation_id")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    EventParticipation.objects.update(base_slot_count=Subquery(base_slot_count))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0096_exercise_max_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipation',
+            name='base_slot_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_base_slot_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:09
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_base_slot_number(apps, schema_editor):
+    EventParticipationSlot = apps.get_model("courses", "EventParticipationSlot")
+
+    EventParticipationSlot.objects.filter(parent__isnull=True).update(
+        base_slot_number=F("slot_number")
+    )
+    # propagate the base slot number down the slot trees one level at a time
+    parent_base_slot_number = EventParticipationSlot.objects.filter(
+        pk=OuterRef("parent_id")
+    ).values("base_slot_number")[:1]
+    while (
+        EventParticipationSlot.objects.filter(
+            base_slot_number__isnull=True, parent__base_slot_number__isnull=False
+        ).update(base_slot_number=Subquery(parent_base_slot_number))
+        > 0
+    ):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0097_eventparticipation_base_slot_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipationslot',
+            name='base_slot_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_base_slot_number, migrations.RunPython.noop),
+    ]
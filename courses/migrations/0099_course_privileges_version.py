@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0098_eventparticipationslot_base_slot_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='privileges_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0099_course_privileges_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollments_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0100_course_enrollments_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipationslot',
+            name='submission_sequence',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
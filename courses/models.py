@@ -5,7 +5,7 @@ from core.models import HashIdModel
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import F, Max, Q
-from django.db.models.functions import MD5, Cast
+from django.db.models.functions import MD5, Cast, Coalesce
 from django.utils import timezone
 from courses.logic.exercises import get_cloze_sub_exercises_appearing_in_exercise_text
 from demo_mode.logic import is_demo_mode
@@ -44,18 +44,33 @@ logger = logging.getLogger(__name__)
 
 
 from courses.logic import privileges
-from courses.logic.assessment import get_assessor_class
+from courses.logic.assessment import (
+    MAX_SCORE_QUANTUM,
+    SCORE_QUANTUM,
+    get_assessor_class,
+)
+from courses.logic.enrollments import invalidate_enrolled_user_ids
+from courses.logic.transaction_state import (
+    forget_once_per_transaction,
+    once_per_transaction,
+)
+from courses.logic.submission_buffer import (
+    flush_buffered_submissions,
+    is_write_behind_enabled,
+)
 
 from .abstract_models import (
     LockableModel,
     OrderableModel,
     TimestampableModel,
+    TrackFieldsMixin,
 )
 from .managers import (
     CourseManager,
     EventManager,
     EventParticipationManager,
     EventParticipationSlotManager,
+    PregeneratedEventParticipationManager,
     EventTemplateManager,
     EventTemplateRuleManager,
     ExerciseManager,
@@ -65,6 +80,8 @@ from .managers import (
 
 from django.conf import settings
 
+from django_celery_beat.models import PeriodicTask, ClockedSchedule
+
 
 def get_attachment_path(slot, filename):
     event = slot.participation.event
@@ -80,7 +97,7 @@ def get_testcase_attachment_path(testcase_attachment, filename):
     return f"{course.pk}/testcase_attachments/{exercise.pk}/{testcase.pk}/{now.strftime('%Y_%m_%d_%H_%M_%S_%f')}/{filename}"
 
 
-class Course(TimestampableModel):
+class Course(TimestampableModel, TrackFieldsMixin):
     """
     Courses are at the top level of the model hierarchy. Everything happens
     in the context of a course. A course is created by a teacher and managed
@@ -110,9 +127,27 @@ class Course(TimestampableModel):
         through="UserCourseEnrollment",
     )
     _features = models.JSONField(default=dict, blank=True)
+    # incremented whenever the cached index of the course's exercises
+    # becomes out of date (see courses.logic.exercise_index)
+    exercise_index_version = models.PositiveIntegerField(default=0)
+    # incremented whenever the cached privileges of the users over the
+    # course become out of date (see courses.logic.privileges)
+    privileges_version = models.PositiveIntegerField(default=0)
+    # incremented whenever the cached set of the users enrolled in the
+    # course becomes out of date (see courses.logic.enrollments)
+    enrollments_version = models.PositiveIntegerField(default=0)
+
+    # only written to by the functions that invalidate the caches above
+    VERSION_FIELDS = (
+        "exercise_index_version",
+        "privileges_version",
+        "enrollments_version",
+    )
 
     objects = CourseManager()
 
+    TRACKED_FIELDS = ["creator_id"]
+
     if is_demo_mode():
         demo_manager = DemoCoursesQuerySet.as_manager()
 
@@ -122,6 +157,20 @@ class Course(TimestampableModel):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if (
+            self.pk is not None
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+        ):
+            # prevent overwriting a concurrent invalidation of the caches
+            kwargs["update_fields"] = [
+                f.name
+                for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.VERSION_FIELDS
+            ]
+        return super().save(*args, **kwargs)
+
     @staticmethod
     def get_default_course_features():
         return {
@@ -182,11 +231,18 @@ class Course(TimestampableModel):
                 for uid in user_ids
             ]
 
+        # bulk creations don't send the signals that invalidate the cached
+        # enrolled users (see courses.receivers)
+        invalidate_enrolled_user_ids(self.pk)
+        self.enrollments_version += 1
+
         return enrollments
 
     def unenroll_users(self, user_ids):
         # TODO bulk removals don't trigger lifecycle hooks, find a workaround
         self.enrolled_users.remove(*User.objects.filter(pk__in=user_ids))
+        invalidate_enrolled_user_ids(self.pk)
+        self.enrollments_version += 1
 
 
 class UserCourseEnrollment(LifecycleModelMixin, TimestampableModel):
@@ -448,9 +504,38 @@ class Exercise(TimestampableModel, OrderableModel, LockableModel):
     # if True, an answer that gets a score less than the max score for the exercise gets 0 instead
     all_or_nothing = models.BooleanField(default=False)
 
+    # persisted result of `compute_max_score`, which is up to date as long
+    # as `_computed_max_score_version` equals `_max_score_version`
+    _max_score = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+    )
+    _max_score_version = models.PositiveIntegerField(default=0)
+    _computed_max_score_version = models.PositiveIntegerField(null=True, blank=True)
+
+    # only written to by `get_max_score` and `invalidate_max_scores`
+    MAX_SCORE_FIELDS = (
+        "_max_score",
+        "_max_score_version",
+        "_computed_max_score_version",
+    )
+
     objects = ExerciseManager()
 
     ORDER_WITH_RESPECT_TO_FIELD = "parent"
+    TRACKED_FIELDS = [
+        "_ordering",
+        "state",
+        "parent_id",
+        "course_id",
+        # fields that affect the score of slots (see EventParticipationSlot.score)
+        "text",
+        "exercise_type",
+        "child_weight",
+        "all_or_nothing",
+    ]
 
     class Meta:
         ordering = [
@@ -475,6 +560,17 @@ class Exercise(TimestampableModel, OrderableModel, LockableModel):
 
     def save(self, *args, **kwargs) -> None:
         self.clean()
+        if (
+            self.pk is not None
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+        ):
+            # prevent overwriting a concurrent invalidation of the max score
+            kwargs["update_fields"] = [
+                f.name
+                for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.MAX_SCORE_FIELDS
+            ]
         return super().save(*args, **kwargs)
 
     def clean(self):
@@ -495,7 +591,26 @@ class Exercise(TimestampableModel, OrderableModel, LockableModel):
             else self.sub_exercises.all()
         )
 
+    @property
+    def is_max_score_up_to_date(self):
+        return self._computed_max_score_version == self._max_score_version
+
     def get_max_score(self):
+        if self.is_max_score_up_to_date:
+            return self._max_score
+
+        max_score = self.compute_max_score()
+        if max_score is not None:
+            max_score = Decimal(max_score).quantize(MAX_SCORE_QUANTUM)
+        Exercise.objects.filter(
+            pk=self.pk, _max_score_version=self._max_score_version
+        ).update(
+            _max_score=max_score,
+            _computed_max_score_version=self._max_score_version,
+        )
+        return max_score
+
+    def compute_max_score(self):
         if self.exercise_type in [Exercise.OPEN_ANSWER, Exercise.ATTACHMENT]:
             return None
         if self.exercise_type in [Exercise.AGGREGATED, Exercise.COMPLETION]:
@@ -709,6 +824,7 @@ class ExerciseChoice(OrderableModel):
     )
 
     ORDER_WITH_RESPECT_TO_FIELD = "exercise"
+    TRACKED_FIELDS = ["_ordering", "correctness"]
 
     class Meta:
         ordering = ["exercise_id", "_ordering"]
@@ -1002,43 +1118,60 @@ class Event(
 
     @property
     def state(self):
-        now = timezone.localtime(timezone.now())
+        """
+        The current state of the event. Reading it never queries or writes to the
+        db: automatic transitions that are due based on the event's timestamps are
+        applied to the returned value, and persisted by a periodic task (see
+        EventManager.apply_due_state_transitions)
+        """
+        return self.get_effective_state(timezone.localtime(timezone.now()))
+
+    def get_effective_state(self, now):
+        state = self._event_state
 
         if (
-            self._event_state == Event.PLANNED
+            state == Event.PLANNED
             and self.open_automatically
             and self.begin_timestamp is not None
             and now >= self.begin_timestamp
         ):
-            self._event_state = Event.OPEN
-            self.save()
+            state = Event.OPEN
 
         if (
-            self._event_state == Event.OPEN
+            state == Event.OPEN
             and self.close_automatically
             and self.end_timestamp is not None
             and now >= self.end_timestamp
         ):
-            self._event_state = Event.CLOSED
-            self.save()
+            state = Event.CLOSED
 
-        # TODO this doesn't seem to work, fix (might have to do with transactions)
-        if (
-            self._event_state == Event.RESTRICTED
-            and not self.users_allowed_past_closure.exists()
-        ):
-            self._event_state = Event.CLOSED
-            self.save()
+        return state
 
-        if (
-            self._event_state == Event.RESTRICTED
-            and self.users_allowed_past_closure.count() == self.participations.count()
-        ):
-            self._event_state = Event.OPEN
+    def get_restricted_state_transition(
+        self, allowed_users_count, participations_count
+    ):
+        """
+        Returns the state a RESTRICTED event should move to given the number of users
+        allowed past its closure and the number of its participations, or None if
+        it should stay RESTRICTED
+        """
+        if self._event_state != Event.RESTRICTED:
+            return None
+        if allowed_users_count == 0:
+            return Event.CLOSED
+        if allowed_users_count == participations_count:
+            return Event.OPEN
+        return None
+
+    def apply_restricted_state_transition(self):
+        new_state = self.get_restricted_state_transition(
+            self.users_allowed_past_closure.count(),
+            self.participations.claimed().count(),
+        )
+        if new_state is not None:
+            self._event_state = new_state
             self.save()
 
-        return self._event_state
-
     @state.setter
     def state(self, value):
         self._event_state = value
@@ -1055,7 +1188,75 @@ class Event(
                 exam=self,
             )
 
-    @hook(AFTER_UPDATE, when="state", changes_to=CLOSED)
+    @property
+    def participation_pregeneration_timestamp(self):
+        """
+        Returns the time at which the participations to this event should be
+        pre-generated, or None if they shouldn't
+        """
+        if (
+            self.event_type != Event.EXAM
+            or self._event_state != Event.PLANNED
+            or not self.open_automatically
+            or self.begin_timestamp is None
+        ):
+            return None
+        return self.begin_timestamp - timedelta(
+            minutes=settings.PARTICIPATION_PREGENERATION_LEAD_MINUTES
+        )
+
+    @property
+    def participation_pregeneration_task_name(self):
+        return f"courses.tasks.pregenerate_exam_participations_task_{self.pk}"
+
+    @hook(AFTER_CREATE, when="_event_state", is_now=PLANNED)
+    @hook(AFTER_UPDATE, when="_event_state", changes_to=PLANNED)
+    @hook(AFTER_UPDATE, when="begin_timestamp", has_changed=True)
+    @hook(AFTER_UPDATE, when="open_automatically", has_changed=True)
+    def on_schedule(self):
+        """
+        Schedules the pre-generation of the participations to an exam shortly
+        before it begins, so that students starting it at the same time only
+        need to claim their participation
+        """
+        # participations generated for a previous schedule are discarded
+        EventParticipation.pregenerated.discard(self.pk)
+
+        pregeneration_timestamp = self.participation_pregeneration_timestamp
+        if pregeneration_timestamp is None:
+            PeriodicTask.objects.filter(
+                name=self.participation_pregeneration_task_name
+            ).delete()
+            return
+
+        from courses.tasks import pregenerate_exam_participations_task
+
+        now = timezone.localtime(timezone.now())
+        schedule, _ = ClockedSchedule.objects.get_or_create(
+            clocked_time=max(pregeneration_timestamp, now),
+        )
+        # each event has at most one task, which is rescheduled along with it
+        PeriodicTask.objects.update_or_create(
+            name=self.participation_pregeneration_task_name,
+            defaults={
+                "clocked": schedule,
+                "one_off": True,
+                # one-off tasks are disabled once they've run
+                "enabled": True,
+                "task": pregenerate_exam_participations_task.name,
+                "args": json.dumps([str(self.pk)]),
+            },
+        )
+
+    @hook(AFTER_UPDATE, when="_event_state", changes_to=DRAFT)
+    @hook(AFTER_UPDATE, when="randomize_rule_order", has_changed=True)
+    def on_unschedule(self):
+        EventParticipation.pregenerated.discard(self.pk)
+        PeriodicTask.objects.filter(
+            name=self.participation_pregeneration_task_name
+        ).delete()
+
+    @hook(AFTER_UPDATE, when="_event_state", changes_to=CLOSED)
     def on_close(self):
         """
         For exams that contain programming exercises, when the Event is closed
@@ -1064,6 +1265,12 @@ class Event(
         done in order to be forgiving with students that wrote an answer but forgot
         to run it, and to prevent teachers from having to manually grade it
         """
+        # pre-generated participations that nobody claimed are no longer needed
+        EventParticipation.pregenerated.discard(self.pk)
+
+        if is_write_behind_enabled():
+            flush_buffered_submissions(self.participations.values_list("pk", flat=True))
+
         slots_to_run = EventParticipationSlot.objects.annotate(
             # explicit cast to text needed for postgres
             code_md5_as_text=Cast("execution_results__code_md5", models.TextField())
@@ -1083,8 +1290,14 @@ class Event(
 
             # mark slots as running
             slots_to_run.update(execution_results={"state": "running"})
+            EventParticipationSlot.objects.filter(pk__in=pks).invalidate_scores()
             bulk_run_participation_slot_code_task.delay(pks)
 
+        from courses.tasks import assess_event_participations_task
+
+        # compute and persist the final scores of the participations
+        transaction.on_commit(lambda: assess_event_participations_task.delay(self.pk))
+
     def save(self, *args, **kwargs):
         self.full_clean()
         return super().save(*args, **kwargs)
@@ -1209,6 +1422,7 @@ class EventTemplateRule(OrderableModel):
     objects = EventTemplateRuleManager()
 
     ORDER_WITH_RESPECT_TO_FIELD = "template"
+    TRACKED_FIELDS = ["_ordering", "weight"]
 
     class Meta:
         ordering = ["template_id", "_ordering"]
@@ -1306,7 +1520,14 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
         default=IN_PROGRESS,
     )
     current_slot_cursor = models.PositiveIntegerField(default=0)
+    # number of base slots, stored when the slots are created so that moving
+    # the cursor doesn't require loading them; null for participations whose
+    # slots were created individually
+    base_slot_count = models.PositiveIntegerField(null=True, blank=True)
     bookmarked = models.BooleanField(default=False)
+    # False for participations pre-generated before the beginning of an exam
+    # that haven't been started by their user yet
+    claimed = models.BooleanField(default=True)
 
     # assessment fields
     _assessment_state = models.PositiveIntegerField(
@@ -1315,7 +1536,23 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
     )
     _score = models.TextField(blank=True, null=True)
 
+    # persisted result of the automatic assessment of the slots, which is
+    # up to date as long as `_computed_score_version` equals `_score_version`
+    _computed_score = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+    )
+    _computed_assessment_progress = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+    )
+    _score_version = models.PositiveIntegerField(default=0)
+    _computed_score_version = models.PositiveIntegerField(null=True, blank=True)
+
     objects = EventParticipationManager()
+    pregenerated = PregeneratedEventParticipationManager()
 
     class Meta:
         ordering = ["event_id", "-begin_timestamp", "pk"]
@@ -1358,18 +1595,56 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
 
     @property
     def last_slot_number(self):
+        if self.base_slot_count is not None:
+            return self.base_slot_count - 1
         return len(self.base_slots) - 1
 
     @property
-    def assessment_progress(self):
-        slot_states = [s.assessment_state for s in self.base_slots]
-        state = self.NOT_ASSESSED
-        for slot_state in slot_states:
-            if slot_state == EventParticipationSlot.ASSESSED:
-                state = self.FULLY_ASSESSED
+    def is_computed_score_up_to_date(self):
+        return self._computed_score_version == self._score_version
+
+    def compute_score_and_assessment_progress(self):
+        """
+        Computes the score and the assessment progress of the participation
+        from its slots, and persists them unless the participation has been
+        invalidated in the meantime
+        """
+        base_slots = self.base_slots
+        slot_scores = [s.score for s in base_slots]
+
+        score = round(Decimal(sum([s if s is not None else 0 for s in slot_scores])), 2)
+        assessment_progress = self.NOT_ASSESSED
+        for slot_score in slot_scores:
+            if slot_score is not None:
+                assessment_progress = self.FULLY_ASSESSED
             else:
-                return self.PARTIALLY_ASSESSED
-        return state
+                assessment_progress = self.PARTIALLY_ASSESSED
+                break
+
+        if EventParticipation.objects.filter(
+            pk=self.pk, _score_version=self._score_version
+        ).update(
+            _computed_score=score,
+            _computed_assessment_progress=assessment_progress,
+            _computed_score_version=self._score_version,
+        ):
+            forget_once_per_transaction(self.get_score_invalidation_key(self.pk))
+        return score, assessment_progress
+
+    @staticmethod
+    def get_score_invalidation_key(pk):
+        """
+        Identifies the invalidation of the computed score of the participation
+        with the given pk, which only needs doing once until the score has
+        been computed again (see EventParticipationSlot.invalidate_scores_from)
+        """
+        return ("invalidate_participation_score", pk)
+
+    @property
+    def assessment_progress(self):
+        if self.is_computed_score_up_to_date:
+            return self._computed_assessment_progress
+        return self.compute_score_and_assessment_progress()[1]
 
     @property
     def assessment_visibility(self):
@@ -1395,16 +1670,29 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
     @property
     def score(self):
         if self._score is None or len(self._score) == 0:
-            return str(
-                round(
-                    sum(
-                        [s.score if s.score is not None else 0 for s in self.base_slots]
-                    ),
-                    2,
+            if self.is_computed_score_up_to_date:
+                score = self._computed_score
+            else:
+                score = self.compute_score_and_assessment_progress()[0]
+            return self.format_computed_score(
+                score,
+                has_assessed_slots=(
+                    score != 0 or any(s.score is not None for s in self.base_slots)
                 ),
             )
         return self._score
 
+    @staticmethod
+    def format_computed_score(score, has_assessed_slots):
+        """
+        Formats a computed participation score with two decimal places, or as
+        "0" if none of the slots of the participation have been assessed, as
+        scores have always been formatted
+        """
+        if not has_assessed_slots:
+            return "0"
+        return str(round(Decimal(score), 2))
+
     @score.setter
     def score(self, value):
         self._score = value
@@ -1433,8 +1721,8 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
         return (self.begin_timestamp + timedelta(seconds=time_limit)).timestamp() * 1000
 
     @property
-    def current_slots(self):
-        if (
+    def is_showing_all_slots(self):
+        return (
             # event shows all exercises at once
             self.event.exercises_shown_at_a_time is None
             # user has turned in
@@ -1443,9 +1731,28 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
             or self.event.state == Event.CLOSED
             or (  # event is closed for this specific user
                 self.event.state == Event.RESTRICTED
-                and self.user not in self.event.users_allowed_past_closure.all()
+                and not self.event.users_allowed_past_closure.filter(
+                    pk=self.user_id
+                ).exists()
             )
-        ):
+        )
+
+    def is_base_slot_number_current(self, slot_number):
+        """
+        Returns True if the base slot with the given slot number is among the
+        current slots, without loading the slots
+        """
+        if self.is_showing_all_slots:
+            return True
+        return (
+            self.current_slot_cursor
+            <= slot_number
+            < self.current_slot_cursor + self.event.exercises_shown_at_a_time
+        )
+
+    @property
+    def current_slots(self):
+        if self.is_showing_all_slots:
             # in the above cases, show all slots
             return self.base_slots
 
@@ -1476,7 +1783,8 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
             self.end_timestamp = timezone.localtime(timezone.now())
         super().save(*args, **kwargs)
 
-    @hook(AFTER_CREATE)
+    @hook(AFTER_CREATE, when="claimed", is_now=True)
+    @hook(AFTER_UPDATE, when="claimed", changes_to=True)
     def on_create(self):
         if self.event.event_type == Event.EXAM:
             IntegrationRegistry().dispatch(
@@ -1497,6 +1805,9 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
 
     @hook(AFTER_UPDATE, when="state", changes_to=TURNED_IN)
     def on_turn_in(self):
+        if is_write_behind_enabled():
+            flush_buffered_submissions([self.pk])
+
         if self.event.event_type == Event.EXAM:
             IntegrationRegistry().dispatch(
                 "exam_participation_turned_in",
@@ -1542,7 +1853,16 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
                     }
                 )
 
-    def move_current_slot_cursor_forward(self):
+    def move_current_slot_cursor_forward(self, from_cursor=None):
+        """
+        Moves the cursor to the next window of slots. If `from_cursor` is given
+        and the cursor isn't there anymore, the move is considered to have
+        already been made, e.g. by a repeated request, and the cursor is left
+        where it is
+        """
+        if from_cursor is not None and from_cursor != self.current_slot_cursor:
+            return self.current_slot_cursor
+
         if self.is_cursor_last_position:
             raise ValidationError(
                 f"Cursor is past the max position: {self.current_slot_cursor}"
@@ -1552,36 +1872,55 @@ class EventParticipation(LifecycleModelMixin, models.Model, IntegrationModelMixi
             raise ValidationError("Event shows all exercises at once")
 
         # ? add min between this exercises_shown_at_a_time and max_slot_number?
-        self.current_slot_cursor += self.event.exercises_shown_at_a_time
-        self.save(update_fields=["current_slot_cursor"])
+        self._move_current_slot_cursor(
+            self.current_slot_cursor + self.event.exercises_shown_at_a_time
+        )
 
         # TODO use django lifecycle package
         # mark new current slot as seen
-        current_slot = [
-            s for s in self.base_slots if s.slot_number == self.current_slot_cursor
-        ][0]
-        if current_slot.seen_at is None:
-            now = timezone.localtime(timezone.now())
-            current_slot.seen_at = now
-            current_slot.save(update_fields=["seen_at"])
+        self.slots.base_slots().filter(
+            slot_number=self.current_slot_cursor, seen_at__isnull=True
+        ).update(seen_at=timezone.localtime(timezone.now()))
 
         return self.current_slot_cursor
 
-    def move_current_slot_cursor_back(self):
+    def move_current_slot_cursor_back(self, from_cursor=None):
+        """
+        Moves the cursor to the previous window of slots; see
+        `move_current_slot_cursor_forward` for `from_cursor`
+        """
+        if from_cursor is not None and from_cursor != self.current_slot_cursor:
+            return self.current_slot_cursor
+
         if self.current_slot_cursor == 0:
             raise ValidationError("Cursor is in position 0")
 
         if self.event.exercises_shown_at_a_time is None:
             raise ValidationError("Event shows all exercises at once")
 
-        self.current_slot_cursor = max(
-            self.current_slot_cursor - self.event.exercises_shown_at_a_time, 0
+        self._move_current_slot_cursor(
+            max(self.current_slot_cursor - self.event.exercises_shown_at_a_time, 0)
         )
-        self.save(update_fields=["current_slot_cursor"])
         return self.current_slot_cursor
 
+    def _move_current_slot_cursor(self, new_cursor):
+        """
+        Atomically moves the cursor from its current position to `new_cursor`
+        without loading the slots of the participation. The update only
+        succeeds if the cursor hasn't been moved by a concurrent request since
+        this participation was loaded, so that repeated requests don't skip
+        past a slot: if it has, the cursor is left where that request moved it
+        """
+        updated = EventParticipation.objects.filter(
+            pk=self.pk, current_slot_cursor=self.current_slot_cursor
+        ).update(current_slot_cursor=new_cursor)
+        if updated == 0:
+            self.refresh_from_db(fields=["current_slot_cursor"])
+        else:
+            self.current_slot_cursor = new_cursor
+
 
-class EventParticipationSlot(models.Model):
+class EventParticipationSlot(TrackFieldsMixin):
     """
     An EventParticipationSlot represents an exercise assigned to a participant to an
     event, the answer given by that student, and the assessment of a teacher.
@@ -1626,8 +1965,16 @@ class EventParticipationSlot(models.Model):
 
     # bookkeeping fields
     slot_number = models.PositiveIntegerField()
+    # slot number of the base slot this slot descends from (its own slot
+    # number for base slots), used to tell whether the slot is in scope
+    # without walking up its ancestors
+    base_slot_number = models.PositiveIntegerField(null=True, blank=True)
     seen_at = models.DateTimeField(null=True, blank=True)
     answered_at = models.DateTimeField(null=True, blank=True)
+    # sequence number of the last batch update applied to the submission,
+    # used to drop the updates replayed by clients out of order (see
+    # courses.logic.submissions.apply_submission_batch)
+    submission_sequence = models.PositiveBigIntegerField(null=True, blank=True)
 
     # submission fields
     selected_choices = models.ManyToManyField(
@@ -1651,6 +1998,29 @@ class EventParticipationSlot(models.Model):
         blank=True,
     )
 
+    # persisted result of the automatic assessment of the slot, which is up
+    # to date as long as `_computed_score_version` equals `_score_version`
+    _computed_score = models.DecimalField(
+        max_digits=20,
+        decimal_places=10,
+        null=True,
+        blank=True,
+    )
+    _score_version = models.PositiveIntegerField(default=0)
+    _computed_score_version = models.PositiveIntegerField(null=True, blank=True)
+
+    # fields whose changes require re-assessing the slot
+    SCORE_AFFECTING_FIELDS = {"answer_text", "execution_results", "_score"}
+    # fields that can contain the answer to the slot, besides the selected choices
+    ANSWER_FIELDS = {"answer_text", "attachment"}
+    # relations validated by `clean`, which only runs when they change
+    TRACKED_FIELDS = [
+        "participation_id",
+        "exercise_id",
+        "parent_id",
+        "populating_rule_id",
+    ]
+
     objects = EventParticipationSlotManager()
 
     class Meta:
@@ -1684,16 +2054,34 @@ class EventParticipationSlot(models.Model):
         ]:
             return self.selected_choices.exists()
 
+        if e_type in [
+            Exercise.OPEN_ANSWER,
+            Exercise.JS,
+            Exercise.C,
+            Exercise.PYTHON,
+            Exercise.ATTACHMENT,
+        ]:
+            return self.has_answer_in_fields()
+
+        if e_type in [Exercise.COMPLETION, Exercise.AGGREGATED]:
+            return any(s.has_answer for s in self.sub_slots.all())
+
+        assert False, "Type " + str(self.exercise.exercise_type) + " not implemented"
+
+    def has_answer_in_fields(self):
+        """
+        Returns True iff the slot has been given an answer that's stored in
+        its own fields, i.e. the answer text or the attachment. This can be
+        checked without querying, unlike the selected choices and sub-slots
+        """
+        e_type = self.exercise.exercise_type
         if e_type in [Exercise.OPEN_ANSWER, Exercise.JS, Exercise.C, Exercise.PYTHON]:
             return self.answer_text is not None and len(self.answer_text) > 0
 
         if e_type == Exercise.ATTACHMENT:
             return bool(self.attachment)
 
-        if e_type in [Exercise.COMPLETION, Exercise.AGGREGATED]:
-            return any(s.has_answer for s in self.sub_slots.all())
-
-        assert False, "Type " + str(self.exercise.exercise_type) + " not implemented"
+        return False
 
     @staticmethod
     def sanitize_json(json_data):
@@ -1701,12 +2089,100 @@ class EventParticipationSlot(models.Model):
         json_data = json_data.replace("\\u0000", " ")
         return json.loads(json_data)
 
+    @property
+    def is_computed_score_up_to_date(self):
+        return self._computed_score_version == self._score_version
+
     @property
     def score(self):
         if self._score is None:
-            return get_assessor_class(self.participation.event)(self).assess()
+            if self.is_computed_score_up_to_date:
+                return self._computed_score
+            return self.compute_score()
         return self._score
 
+    def compute_score(self):
+        """
+        Runs the automatic assessment of the slot and persists its result,
+        unless the slot has been invalidated in the meantime
+        """
+        score = get_assessor_class(self.participation.event)(self).assess()
+        if score is not None:
+            score = Decimal(score).quantize(SCORE_QUANTUM)
+        EventParticipationSlot.objects.filter(
+            pk=self.pk, _score_version=self._score_version
+        ).update(
+            _computed_score=score,
+            _computed_score_version=self._score_version,
+        )
+        return score
+
+    def invalidate_score(self, answered=False):
+        """
+        Marks the computed score of this slot, of its ancestors, and of its
+        participation as out of date. If `answered`, also records that the
+        slot and its ancestors have been answered now, unless they already
+        had been, in the same UPDATE
+        """
+        self.invalidate_scores_from(self, answered)
+
+    def invalidate_scores_from(self, slot, answered=False):
+        """
+        Marks the computed scores of `slot`, which is either this slot or one
+        of its ancestors, and of the slots above it as out of date with a
+        single UPDATE, as well as that of the participation.
+
+        The score of the participation is only invalidated once per transaction
+        until it's computed again, as invalidating it again before then would
+        make no difference
+        """
+        slots = []
+        while slot is not None:
+            slots.append(slot)
+            slot = slot.parent
+
+        if len(slots) > 0:
+            fields = {"_score_version": F("_score_version") + 1}
+            now = timezone.localtime(timezone.now())
+            if answered:
+                fields["answered_at"] = Coalesce(
+                    "answered_at", Value(now, output_field=models.DateTimeField())
+                )
+            EventParticipationSlot.objects.filter(pk__in=[s.pk for s in slots]).update(
+                **fields
+            )
+            for s in slots:
+                s._score_version += 1
+                if answered and s.answered_at is None:
+                    s.answered_at = now
+
+        if once_per_transaction(
+            EventParticipation.get_score_invalidation_key(self.participation_id)
+        ):
+            EventParticipation.objects.filter(pk=self.participation_id).update(
+                _score_version=F("_score_version") + 1
+            )
+            if EventParticipationSlot.participation.is_cached(self):
+                self.participation._score_version += 1
+
+    def set_selected_choices(self, choices):
+        """
+        Replaces the selected choices of the slot like `selected_choices.set`,
+        but invalidates its score once for the whole change, rather than once
+        for the removed choices and once more for the added ones (see
+        courses.receivers)
+        """
+        self._selected_choices_changes = set()
+        try:
+            self.selected_choices.set(choices)
+        finally:
+            changes = self._selected_choices_changes
+            del self._selected_choices_changes
+        if len(changes) > 0:
+            self.invalidate_score(
+                answered="post_add" in changes and self.answered_at is None
+            )
+
     @score.setter
     def score(self, value):
         self._score = value
@@ -1722,32 +2198,74 @@ class EventParticipationSlot(models.Model):
     def save(self, *args, **kwargs):
         pre_save_pk = self.pk
 
-        self.clean()
-        super().save(*args, **kwargs)
+        # the relations of existing slots seldom change, and validating them
+        # requires fetching the related objects
+        if pre_save_pk is None or any(
+            getattr(self, f"_old_{field}", None) != getattr(self, field)
+            for field in self.TRACKED_FIELDS
+        ):
+            self.clean()
+        if pre_save_pk is None and self.base_slot_number is None:
+            self.base_slot_number = self.get_base_slot_number()
+
+        # record when the slot is first answered in the same write. Answers
+        # given by selecting choices are recorded when the choices are added
+        # (see courses.receivers), and those to exercises with sub-exercises
+        # when the sub-slots are answered
+        update_fields = kwargs.get("update_fields")
+        answered = (
+            pre_save_pk is not None
+            and self.answered_at is None
+            and (
+                update_fields is None or self.ANSWER_FIELDS.intersection(update_fields)
+            )
+            and self.has_answer_in_fields()
+        )
+        if answered:
+            self.answered_at = timezone.localtime(timezone.now())
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = [
+                    *update_fields,
+                    "answered_at",
+                ]
 
-        # run on transaction commit because, for multiple choice exercises,
-        # it'll check whether a selected choice exists (i.e. a record in the
-        # m2m table exists), but the record won't be visible yet because
-        # this method is executed while still inside a transaction
-        def update_answered_at_if_answer_exists():
-            if self.has_answer:
-                now = timezone.localtime(timezone.now())
-                self.answered_at = now
-                self.save(update_fields=["answered_at"])
-                # update answered time of parent too
-                if self.parent is not None and self.parent.answered_at is None:
-                    self.parent.answered_at = now
-                    self.parent.save(update_fields=["answered_at"])
-
-        if self.answered_at is None and pre_save_pk is not None:
-            transaction.on_commit(update_answered_at_if_answer_exists)
+        # the computed score of an existing slot is invalidated in the
+        # same write
+        invalidate = update_fields is None or bool(
+            self.SCORE_AFFECTING_FIELDS.intersection(update_fields)
+        )
+        if invalidate and pre_save_pk is not None:
+            score_version = self._score_version
+            self._score_version = F("_score_version") + 1
+            if update_fields is not None:
+                kwargs["update_fields"] = [*update_fields, "_score_version"]
+            try:
+                super().save(*args, **kwargs)
+            finally:
+                self._score_version = score_version
+            self._score_version += 1
+        else:
+            super().save(*args, **kwargs)
+
+        # the scores of the ancestors depend on that of the slot, and they've
+        # been answered once any of their sub-slots has
+        if invalidate:
+            self.invalidate_scores_from(self.parent, answered)
+        elif answered and self.parent_id is not None:
+            EventParticipationSlot.objects.filter(
+                pk=self.parent_id, answered_at__isnull=True
+            ).update(answered_at=self.answered_at)
+            if (
+                EventParticipationSlot.parent.is_cached(self)
+                and self.parent.answered_at is None
+            ):
+                self.parent.answered_at = self.answered_at
 
     def clean(self):
         event = self.participation.event
-        course = event.course
 
         # prevent assigning exercises from another course
-        if self.exercise.course_id != course.pk:
+        if self.exercise.course_id != event.course_id:
             raise ValidationError(
                 str(self.exercise) + " is not a valid exercise for slot " + str(self.pk)
             )
@@ -1755,7 +2273,7 @@ class EventParticipationSlot(models.Model):
         # prevent assigning rules from another event
         if (
             self.populating_rule is not None
-            and self.populating_rule.template.event != event
+            and self.populating_rule.template.event_id != event.pk
         ):
             raise ValidationError(
                 str(self.populating_rule)
@@ -1765,8 +2283,8 @@ class EventParticipationSlot(models.Model):
 
         # prevent assigning a parent whose exercise isn't a parent of the slot's exercise or that's a slot for a different participation
         if self.parent is not None and (
-            self.parent.exercise != self.exercise.parent
-            or self.parent.participation != self.participation
+            self.parent.exercise_id != self.exercise.parent_id
+            or self.parent.participation_id != self.participation_id
         ):
             raise ValidationError(
                 str(self.parent) + " is not a valid parent for slot " + str(self.pk)
@@ -1780,19 +2298,61 @@ class EventParticipationSlot(models.Model):
             exercise_id__in=[e.pk for e in self.exercise.get_assessable_sub_exercises()]
         )
 
+    def get_base_slot_number(self):
+        if self.base_slot_number is not None:
+            return self.base_slot_number
+        if self.parent is None:
+            return self.slot_number
+        return self.parent.get_base_slot_number()
+
     def is_in_scope(self):
         """
         Returns True if the slot is accessible by the user in the corresponding
         EventParticipation, i.e. it contains one of the exercises currently being
-        shown to the user; False otherwise
+        shown to the user or it descends from one of those; False otherwise
         """
-        return (
-            self in self.participation.current_slots
-            or self.parent is not None
-            and self.parent.is_in_scope()
+        return self.participation.is_base_slot_number_current(
+            self.get_base_slot_number()
         )
 
 
+class PracticeSeenExercise(models.Model):
+    """
+    Records that an exercise has been assigned to a user in a participation
+    to a SELF_SERVICE_PRACTICE Event of a course. Used to exclude exercises
+    already seen by a user when creating new practice participations
+    """
+
+    user = models.ForeignKey(
+        User,
+        related_name="practice_seen_exercises",
+        on_delete=models.CASCADE,
+    )
+    course = models.ForeignKey(
+        Course,
+        related_name="practice_seen_exercises",
+        on_delete=models.CASCADE,
+    )
+    exercise = models.ForeignKey(
+        Exercise,
+        related_name="practice_seen_by",
+        on_delete=models.CASCADE,
+    )
+    seen_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_id", "exercise_id"],
+                name="practice_seen_exercise_unique_user",
+            )
+        ]
+        indexes = [models.Index(fields=["user_id", "course_id"])]
+
+    def __str__(self):
+        return f"{str(self.user)} - {str(self.exercise)}"
+
+
 class PretotypeData(TimestampableModel):
     """
     Model for storing data received by pretotyping
@@ -1,6 +1,7 @@
-from functools import lru_cache
 from rest_access_policy import AccessPolicy
+from courses.logic.enrollments import is_user_enrolled
 from courses.logic.participations import is_time_up
+from courses.logic.request_cache import get_request_scoped_object
 
 from courses.logic.privileges import check_privilege
 from users.models import User
@@ -29,7 +30,7 @@ class BaseAccessPolicy(AccessPolicy):
         )
 
         try:
-            return Course.objects.get(pk=course_pk)
+            return get_request_scoped_object(view.request, Course, course_pk)
         except (ValueError, Course.DoesNotExist):
             return None
 
@@ -45,10 +46,10 @@ class BaseAccessPolicy(AccessPolicy):
         if course is None:
             return False
 
-        is_enrolled = request.user in course.enrolled_users.all()
-        if not is_enrolled:
+        enrolled = is_user_enrolled(request.user, course)
+        if not enrolled:
             self.message = self.NOT_ENROLLED
-        return is_enrolled
+        return enrolled
 
     def is_course_creator(self, request, view, action):
         course = self.get_course(view)
@@ -218,6 +219,12 @@ class EventPolicy(RequireCourseEnrollmentPolicy):
             "effect": "allow",
             "condition_expression": "has_teacher_privileges:manage_events",
         },
+        {
+            "action": ["statistics"],
+            "principal": ["authenticated"],
+            "effect": "allow",
+            "condition_expression": "has_teacher_privileges:assess_participations",
+        },
         {
             "action": ["retrieve"],
             "principal": ["authenticated"],
@@ -360,7 +367,6 @@ class EventParticipationPolicyMixin:
     EVENT_CLOSED = "EVENT_CLOSED"
     YOU_TURNED_IN = "YOU_TURNED_IN"
 
-    @lru_cache(maxsize=None)
     def get_participation(self, view):
         from courses.views import (
             EventParticipationSlotViewSet,
@@ -471,6 +477,12 @@ class EventParticipationPolicy(
             "condition_expression": "\
                 has_teacher_privileges:assess_participations",
         },
+        {
+            "action": ["patch_submissions"],
+            "principal": ["authenticated"],
+            "effect": "allow",
+            "condition_expression": "is_own_participation and can_update_participation",
+        },
         {
             "action": ["go_forward"],
             "principal": ["authenticated"],
@@ -495,7 +507,7 @@ class EventParticipationPolicy(
         from courses.models import Event
 
         try:
-            event = Event.objects.get(pk=view.kwargs["event_pk"])
+            event = get_request_scoped_object(request, Event, view.kwargs["event_pk"])
         except Event.DoesNotExist:
             return True
         except (ValueError, KeyError):
@@ -525,9 +537,19 @@ class EventParticipationPolicy(
     def updating_to_closed_by_teacher_state(self, request, view, action):
         return request.data.get("state") == EventParticipation.CLOSED_BY_TEACHER
 
+    def is_repeated_cursor_move(self, participation, request):
+        # a move from a cursor position other than the current one has
+        # already been made, and is answered with the current window
+        cursor = request.data.get("cursor")
+        return cursor is not None and str(cursor) != str(
+            participation.current_slot_cursor
+        )
+
     def can_go_forward(self, request, view, action):
         participation = self.get_participation(view)  # view.get_object()
-        return not participation.is_cursor_last_position
+        return not participation.is_cursor_last_position or (
+            self.is_repeated_cursor_move(participation, request)
+        )
 
     def can_go_back(self, request, view, action):
         from courses.models import Event
@@ -535,7 +557,10 @@ class EventParticipationPolicy(
         participation = self.get_participation(view)  # view.get_object()
         event = participation.event
 
-        return not participation.is_cursor_first_position and event.allow_going_back
+        return event.allow_going_back and (
+            not participation.is_cursor_first_position
+            or self.is_repeated_cursor_move(participation, request)
+        )
 
 
 class EventParticipationSlotPolicy(
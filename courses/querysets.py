@@ -2,7 +2,7 @@ import random
 import string
 
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
 from django.db.models.aggregates import Max, Min, Count
 from django.db.models import Prefetch
 from django.db.models import Sum, Case, When, Value
@@ -15,9 +15,33 @@ from users.models import User
 from content.models import VoteModel
 
 from django.db.models import Exists, OuterRef
+from django.utils import timezone
 
 
 class ExerciseQuerySet(models.QuerySet):
+    def invalidate_max_scores(self):
+        """
+        Marks the persisted max scores of the exercises and of their
+        ancestors as out of date
+        """
+        from .models import Exercise
+
+        exercise_ids = set()
+        level = self
+        while True:
+            parent_ids = set()
+            for pk, parent_id in level.values_list("pk", "parent_id"):
+                exercise_ids.add(pk)
+                if parent_id is not None and parent_id not in exercise_ids:
+                    parent_ids.add(parent_id)
+            if len(parent_ids) == 0:
+                break
+            level = Exercise.objects.filter(pk__in=parent_ids)
+
+        Exercise.objects.filter(pk__in=exercise_ids).update(
+            _max_score_version=F("_max_score_version") + 1
+        )
+
     def with_solutions_bookmarked_by(self, user: User):
         from .models import ExerciseSolution
 
@@ -77,6 +101,7 @@ class ExerciseQuerySet(models.QuerySet):
         eligible_slot_exists_subquery = EventParticipationSlot.objects.filter(
             participation__event__course_id=course_id,
             participation__user=user,
+            participation__claimed=True,
             # TODO verify that slot is in scope
             exercise=OuterRef("pk"),
         )
@@ -126,18 +151,14 @@ class ExerciseQuerySet(models.QuerySet):
         """
         Excludes exercises that have been seen by user in a practice
         """
-        from .models import Event
+        from .models import PracticeSeenExercise
 
-        user_practice_participations = user.participations.filter(
-            event__event_type=Event.SELF_SERVICE_PRACTICE
-        )
-
-        seen_exercises = user_practice_participations.values_list(
-            "slots__exercise_id", flat=True
+        return self.exclude(
+            Exists(
+                PracticeSeenExercise.objects.filter(user=user, exercise=OuterRef("pk"))
+            )
         )
 
-        return self.exclude(pk__in=[e for e in seen_exercises if e is not None])
-
     def satisfying(self, rule):
         """
         Returns the exercises that satisfy an EventTemplateRule
@@ -274,7 +295,43 @@ class ExerciseSolutionQuerySet(models.QuerySet):
         )
 
 
+class EventQuerySet(models.QuerySet):
+    def in_state(self, state):
+        """
+        Filters events by their state, taking into account the automatic
+        transitions that are due but might not have been persisted yet
+        (see Event.get_effective_state)
+        """
+        from courses.models import Event
+
+        now = timezone.localtime(timezone.now())
+        due_to_open = Q(
+            _event_state=Event.PLANNED,
+            open_automatically=True,
+            begin_timestamp__lte=now,
+        )
+        due_to_close = Q(close_automatically=True, end_timestamp__lte=now)
+        open_or_due_to_open = Q(_event_state=Event.OPEN) | due_to_open
+
+        if state == Event.PLANNED:
+            return self.filter(Q(_event_state=Event.PLANNED) & ~due_to_open)
+        if state == Event.OPEN:
+            return self.filter(open_or_due_to_open & ~due_to_close)
+        if state == Event.CLOSED:
+            return self.filter(
+                Q(_event_state=Event.CLOSED) | (open_or_due_to_open & due_to_close)
+            )
+        return self.filter(_event_state=state)
+
+
 class EventParticipationQuerySet(models.QuerySet):
+    def claimed(self):
+        """
+        Excludes the participations that were pre-generated and haven't been
+        claimed by their user yet (see PregeneratedEventParticipationManager)
+        """
+        return self.filter(claimed=True)
+
     def with_prefetched_base_slots(self):
         from courses.models import EventParticipationSlot
 
@@ -306,6 +363,32 @@ class EventParticipationQuerySet(models.QuerySet):
             )
         )
 
+    def with_prefetched_base_slot_references(self):
+        """
+        Like `with_prefetched_base_slots`, but doesn't prefetch the related
+        objects of the slots' exercises, for when exercises are serialized
+        separately from the slots
+        """
+        from courses.models import EventParticipationSlot
+
+        return self.prefetch_related(
+            Prefetch(
+                "slots",
+                queryset=EventParticipationSlot.objects.base_slots()
+                .select_related("exercise", "populating_rule")
+                .prefetch_related(
+                    Prefetch(
+                        "sub_slots",
+                        queryset=EventParticipationSlot.objects.select_related(
+                            "exercise"
+                        ),
+                    ),
+                    "selected_choices",
+                ),
+                to_attr="prefetched_base_slots",
+            )
+        )
+
     def annotate_with_max_score_correctness(self):
         return self.annotate(max_choice_correctness=Max("choices__correctness"))
 
@@ -318,11 +401,63 @@ class SlotModelQuerySet(models.QuerySet):
         """
         return self.filter(parent__isnull=True)
 
+    def invalidate_scores(self):
+        """
+        Marks the computed scores of the slots, of their ancestors, and of
+        their participations as out of date
+        """
+        from courses.models import EventParticipation, EventParticipationSlot
+
+        slot_ids = set()
+        participation_ids = set()
+        level = self
+        while True:
+            parent_ids = set()
+            for pk, parent_id, participation_id in level.values_list(
+                "pk", "parent_id", "participation_id"
+            ):
+                slot_ids.add(pk)
+                participation_ids.add(participation_id)
+                if parent_id is not None and parent_id not in slot_ids:
+                    parent_ids.add(parent_id)
+            if len(parent_ids) == 0:
+                break
+            level = EventParticipationSlot.objects.filter(pk__in=parent_ids)
+
+        EventParticipationSlot.objects.filter(pk__in=slot_ids).update(
+            _score_version=F("_score_version") + 1
+        )
+        EventParticipation.objects.filter(pk__in=participation_ids).update(
+            _score_version=F("_score_version") + 1
+        )
+
 
 class CourseQuerySet(models.QuerySet):
     def public(self):
         return self.filter(hidden=False)
 
+    def with_enrollment_flags(self, user: User):
+        """
+        Annotates the courses with whether `user` is enrolled in them and
+        whether they bookmarked them, using EXISTS subqueries on the indexed
+        (user, course) pairs instead of loading the enrolled and bookmarking
+        users of each course
+        """
+        from .models import Course, UserCourseEnrollment
+
+        return self.annotate(
+            enrolled=Exists(
+                UserCourseEnrollment.objects.filter(
+                    course_id=OuterRef("pk"), user_id=user.pk
+                )
+            ),
+            bookmarked=Exists(
+                Course.bookmarked_by.through.objects.filter(
+                    course_id=OuterRef("pk"), user_id=user.pk
+                )
+            ),
+        )
+
 
 class TagQuerySet(models.QuerySet):
     def with_prefetched_public_exercises(self):
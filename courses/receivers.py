@@ -0,0 +1,248 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from courses.logic.enrollments import invalidate_enrolled_user_ids
+from courses.logic.exercise_index import invalidate_exercise_index
+from courses.logic.privileges import invalidate_user_privileges
+from courses.tasks import assess_event_participations_task
+from courses.models import (
+    Course,
+    CourseRole,
+    Event,
+    EventParticipationSlot,
+    EventTemplateRule,
+    Exercise,
+    ExerciseChoice,
+    ExerciseTestCase,
+    Tag,
+    UserCourseEnrollment,
+    UserCoursePrivilege,
+)
+from users.models import User
+
+
+"""
+Keep the exercise index of courses (see courses.logic.exercise_index)
+up to date with changes to exercises and their tags
+"""
+
+
+@receiver(post_save, sender=Exercise)
+def invalidate_exercise_index_on_exercise_save(sender, instance, created, **kwargs):
+    if not created and all(
+        hasattr(instance, f"_old_{field}")
+        and getattr(instance, f"_old_{field}") == getattr(instance, field)
+        for field in ("state", "parent_id", "course_id")
+    ):
+        return
+    invalidate_exercise_index(instance.course_id)
+    if getattr(instance, "_old_course_id", instance.course_id) != instance.course_id:
+        invalidate_exercise_index(instance._old_course_id)
+
+
+@receiver(post_delete, sender=Exercise)
+@receiver(post_delete, sender=Tag)
+def invalidate_exercise_index_on_delete(sender, instance, **kwargs):
+    invalidate_exercise_index(instance.course_id)
+
+
+@receiver(m2m_changed, sender=Exercise.public_tags.through)
+@receiver(m2m_changed, sender=Exercise.private_tags.through)
+def invalidate_exercise_index_on_tags_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        # `instance` is either an Exercise or a Tag, both belonging to the course
+        invalidate_exercise_index(instance.course_id)
+
+
+@receiver(m2m_changed, sender=Event.users_allowed_past_closure.through)
+def apply_restricted_state_transition(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Close RESTRICTED events that no longer have users allowed past closure, and
+    open those whose participants are all allowed
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # `instance` is a User and pk_set contains the affected events
+        events = Event.objects.filter(
+            pk__in=pk_set or [], _event_state=Event.RESTRICTED
+        )
+    else:
+        events = [instance]
+    for event in events:
+        event.apply_restricted_state_transition()
+
+
+"""
+Keep the persisted max scores of exercises (see Exercise.get_max_score) and
+the computed scores of participation slots (see EventParticipationSlot.score)
+in sync with the exercises and rules they were computed from. Changes to the
+slots themselves are handled in EventParticipationSlot.save
+"""
+
+
+def has_changed(instance, fields):
+    return any(
+        not hasattr(instance, f"_old_{field}")
+        or getattr(instance, f"_old_{field}") != getattr(instance, field)
+        for field in fields
+    )
+
+
+@receiver(m2m_changed, sender=EventParticipationSlot.selected_choices.through)
+def invalidate_slot_scores_on_selected_choices_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # `instance` is an ExerciseChoice and pk_set contains the affected slots
+        EventParticipationSlot.objects.filter(pk__in=pk_set or []).invalidate_scores()
+    else:
+        changes = getattr(instance, "_selected_choices_changes", None)
+        if changes is not None:
+            # the choices of the slot are being replaced, and its score is
+            # invalidated once they have been (see set_selected_choices)
+            if action == "post_clear" or pk_set:
+                changes.add(action)
+            return
+        answered = action == "post_add" and bool(pk_set)
+        instance.invalidate_score(answered=answered and instance.answered_at is None)
+
+
+def invalidate_scores_depending_on(exercise_id):
+    """
+    Marks as out of date the max score of the exercise and of its ancestors,
+    and the scores of the slots the exercise is assigned to
+    """
+    Exercise.objects.filter(pk=exercise_id).invalidate_max_scores()
+    EventParticipationSlot.objects.filter(exercise_id=exercise_id).invalidate_scores()
+
+
+@receiver(post_save, sender=Exercise)
+def invalidate_scores_on_exercise_save(sender, instance, created, **kwargs):
+    if created:
+        # a new sub-exercise changes the max score of its parent
+        if instance.parent_id is not None:
+            invalidate_scores_depending_on(instance.parent_id)
+    elif has_changed(
+        instance, ("text", "exercise_type", "child_weight", "all_or_nothing")
+    ):
+        invalidate_scores_depending_on(instance.pk)
+        instance._max_score_version += 1
+
+
+@receiver(post_delete, sender=Exercise)
+def invalidate_scores_on_exercise_delete(sender, instance, **kwargs):
+    if instance.parent_id is not None:
+        invalidate_scores_depending_on(instance.parent_id)
+
+
+@receiver(post_save, sender=ExerciseChoice)
+def invalidate_scores_on_choice_save(sender, instance, created, **kwargs):
+    if created or has_changed(instance, ("correctness",)):
+        invalidate_scores_depending_on(instance.exercise_id)
+
+
+@receiver(post_save, sender=ExerciseTestCase)
+def invalidate_scores_on_testcase_save(sender, instance, created, **kwargs):
+    # the max score of programming exercises is their number of test cases
+    if created:
+        invalidate_scores_depending_on(instance.exercise_id)
+
+
+@receiver(post_delete, sender=ExerciseChoice)
+@receiver(post_delete, sender=ExerciseTestCase)
+def invalidate_scores_on_choice_or_testcase_delete(sender, instance, **kwargs):
+    invalidate_scores_depending_on(instance.exercise_id)
+
+
+@receiver(post_save, sender=EventTemplateRule)
+def invalidate_slot_scores_on_rule_save(sender, instance, created, **kwargs):
+    if not created and has_changed(instance, ("weight",)):
+        slots = EventParticipationSlot.objects.filter(populating_rule_id=instance.pk)
+        if not slots.exists():
+            return
+        slots.invalidate_scores()
+        # regrade the participations to the event in the background
+        event_id = instance.template.event.pk
+        transaction.on_commit(lambda: assess_event_participations_task.delay(event_id))
+
+
+"""
+Keep the cached privileges of users over courses (see courses.logic.privileges)
+up to date with changes to the courses' roles, per-user privileges, and creator
+"""
+
+
+@receiver(post_save, sender=UserCoursePrivilege)
+@receiver(post_delete, sender=UserCoursePrivilege)
+@receiver(post_save, sender=CourseRole)
+@receiver(post_delete, sender=CourseRole)
+def invalidate_privileges_on_save_or_delete(sender, instance, **kwargs):
+    invalidate_user_privileges(instance.course_id)
+    if sender.course.is_cached(instance):
+        instance.course.privileges_version += 1
+
+
+@receiver(post_save, sender=Course)
+def invalidate_privileges_on_course_save(sender, instance, created, **kwargs):
+    if not created and has_changed(instance, ("creator_id",)):
+        invalidate_user_privileges(instance.pk)
+        instance.privileges_version += 1
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+def invalidate_privileges_on_roles_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action == "pre_clear" and not reverse:
+        # the courses of the cleared roles can't be known after the roles are removed
+        instance._cleared_roles_course_ids = set(
+            instance.roles.values_list("course_id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if reverse:
+        # `instance` is a CourseRole and pk_set contains the affected users
+        course_ids = {instance.course_id}
+    elif action == "post_clear":
+        course_ids = instance.__dict__.pop("_cleared_roles_course_ids", set())
+    else:
+        # `instance` is a User and pk_set contains the affected roles
+        course_ids = set(
+            CourseRole.objects.filter(pk__in=pk_set or []).values_list(
+                "course_id", flat=True
+            )
+        )
+    for course_id in course_ids:
+        invalidate_user_privileges(course_id)
+
+
+"""
+Keep the cached sets of the users enrolled in courses (see courses.logic.enrollments)
+up to date with enrollments created or deleted outside of Course.enroll_users and
+Course.unenroll_users
+"""
+
+
+@receiver(post_save, sender=UserCourseEnrollment)
+def invalidate_enrolled_user_ids_on_enrollment_save(
+    sender, instance, created, **kwargs
+):
+    if created:
+        invalidate_enrolled_user_ids(instance.course_id)
+        if sender.course.is_cached(instance):
+            instance.course.enrollments_version += 1
+
+
+@receiver(post_delete, sender=UserCourseEnrollment)
+def invalidate_enrolled_user_ids_on_enrollment_delete(sender, instance, **kwargs):
+    invalidate_enrolled_user_ids(instance.course_id)
+    if sender.course.is_cached(instance):
+        instance.course.enrollments_version += 1
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from content.models import VoteModel
+from courses.logic.enrollments import is_user_enrolled
 from courses.logic.participations import get_effective_time_limit
 from courses.logic.presentation import (
     CHOICE_SHOW_SCORE_FIELDS,
@@ -9,6 +10,7 @@ from courses.logic.presentation import (
     EVENT_PARTICIPATION_SHOW_SLOTS,
     EVENT_PARTICIPATION_SLOT_SHOW_DETAIL_FIELDS,
     EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE,
+    EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE_BY_REFERENCE,
     EVENT_PARTICIPATION_SLOT_SHOW_SUBMISSION_FIELDS,
     EVENT_SHOW_HIDDEN_FIELDS,
     EVENT_SHOW_PARTICIPATION_EXISTS,
@@ -24,7 +26,12 @@ from integrations.serializers import IntegrationModelSerializer
 from users.serializers import UserSerializer
 from hashid_field.rest import HashidSerializerCharField
 
-from courses.logic.privileges import MANAGE_EVENTS, check_privilege, get_user_privileges
+from courses.logic.privileges import (
+    MANAGE_EVENTS,
+    check_privilege,
+    get_privileges_by_course,
+    get_user_privileges,
+)
 from courses.models import (
     Course,
     CourseRole,
@@ -50,6 +57,7 @@ from courses.serializer_fields import (
     RecursiveField,
 )
 import re
+from django.db.models import Manager
 from django.db.models.query import QuerySet
 
 
@@ -68,6 +76,18 @@ class ConditionalFieldsMixin:
                     self.fields.pop(field, None)
 
 
+class CourseListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        courses = list(data.all() if isinstance(data, Manager) else data)
+        request = self.context.get("request")
+        if request is not None:
+            # resolve the privileges over all the courses at once
+            self.child.privileges_by_course = get_privileges_by_course(
+                request.user, courses
+            )
+        return super().to_representation(courses)
+
+
 class CourseSerializer(serializers.ModelSerializer, ConditionalFieldsMixin):
     privileges = serializers.SerializerMethodField()
     creator = UserSerializer(read_only=True)
@@ -77,6 +97,7 @@ class CourseSerializer(serializers.ModelSerializer, ConditionalFieldsMixin):
 
     class Meta:
         model = Course
+        list_serializer_class = CourseListSerializer
         fields = [
             "id",
             "name",
@@ -99,17 +120,24 @@ class CourseSerializer(serializers.ModelSerializer, ConditionalFieldsMixin):
         self.remove_unsatisfied_condition_fields()
 
     def get_privileges(self, obj):
-        # !!
+        privileges_by_course = getattr(self, "privileges_by_course", {})
+        if obj.pk in privileges_by_course:
+            return privileges_by_course[obj.pk]
         return get_user_privileges(self.context["request"].user, obj)
 
     def get_public_exercises_count(self, obj):
         return obj.exercises.public().count()
 
     def get_bookmarked(self, obj):
+        # see CourseQuerySet.with_enrollment_flags
+        if hasattr(obj, "bookmarked"):
+            return obj.bookmarked
         return self.context.get("request").user in obj.bookmarked_by.all()
 
     def get_enrolled(self, obj):
-        return self.context.get("request").user in obj.enrolled_users.all()
+        if hasattr(obj, "enrolled"):
+            return obj.enrolled
+        return is_user_enrolled(self.context.get("request").user, obj)
 
 
 class TagSerializer(serializers.ModelSerializer, ConditionalFieldsMixin):
@@ -135,11 +163,7 @@ class TagSerializer(serializers.ModelSerializer, ConditionalFieldsMixin):
         return len(obj.prefetched_public_in_public_exercises)
 
     def get_public_exercises_not_seen(self, obj):
-        return len(
-            obj.prefetched_public_in_public_exercises
-        )  # ! temporarily disable functionality (actual method code below)
-
-    # return len(obj.prefetched_public_in_unseen_public_exercises)
+        return len(obj.prefetched_public_in_unseen_public_exercises)
 
 
 class CourseRoleSerializer(serializers.ModelSerializer):
@@ -672,7 +696,7 @@ class EventSerializer(IntegrationModelSerializer, ConditionalFieldsMixin):
     def get_participation_exists(self, obj):
         try:
             user = self.context["request"].user
-            return obj.participations.filter(user=user).exists()
+            return obj.participations.claimed().filter(user=user).exists()
         except KeyError:
             return None
 
@@ -819,7 +843,9 @@ class EventParticipationSlotSerializer(
         self.remove_unsatisfied_condition_fields()
 
     def get_exercise(self, obj):
-        # TODO pass only pk when participations are accessed in a list and fetch exercises separately
+        if self.context.get(EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE_BY_REFERENCE, False):
+            # exercises are serialized once alongside the slots that reference them
+            return obj.exercise_id
         if hasattr(obj, "prefetched_max_choice_correctness"):
             # pass along prefetched value to the exercise to speed up computation of max_score
             obj.exercise.prefetched_max_choice_correctness = (
@@ -861,6 +887,40 @@ class EventParticipationSlotSubmissionSerializer(serializers.ModelSerializer):
             ),
         )
 
+    def update(self, instance, validated_data):
+        # only write the fields that changed: changing just the selected
+        # choices doesn't write to the slot itself
+        selected_choices = validated_data.pop("selected_choices", None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        if len(validated_data) > 0:
+            instance.save(update_fields=list(validated_data))
+        if selected_choices is not None:
+            instance.set_selected_choices(selected_choices)
+        return instance
+
+
+class EventParticipationSlotSubmissionUpdateSerializer(serializers.Serializer):
+    """
+    An update to the submission of a slot sent as part of a batch (see
+    courses.logic.submissions.apply_submission_batch)
+    """
+
+    slot = serializers.IntegerField()
+    # bounded by the largest value EventParticipationSlot.submission_sequence can store
+    seq = serializers.IntegerField(min_value=0, max_value=2**63 - 1, required=False)
+    answer_text = serializers.CharField(required=False, allow_blank=True)
+    selected_choices = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+    def validate(self, attrs):
+        if "answer_text" not in attrs and "selected_choices" not in attrs:
+            raise serializers.ValidationError(
+                "Either answer_text or selected_choices is required"
+            )
+        return attrs
+
 
 class EventParticipationSummarySerializer(serializers.ModelSerializer):
     class Meta:
@@ -956,15 +1016,15 @@ class EventParticipationSerializer(IntegrationModelSerializer, ConditionalFields
     def get_event(self, obj):
         return EventSerializer(obj.event, read_only=True, context=self.context).data
 
-    def get_slots(self, obj):
+    def get_visible_slots(self, obj):
         if self.context.get("capabilities").get("assessment_fields_read", False):
             # accessing outside of active participation - show all slots
-            slots = obj.base_slots
-        else:
-            slots = obj.current_slots
+            return obj.base_slots
+        return obj.current_slots
 
+    def get_slots(self, obj):
         ret = EventParticipationSlotSerializer(
-            slots,
+            self.get_visible_slots(obj),
             many=True,
             context=self.context,
         ).data
@@ -1,10 +1,18 @@
+from coding.concurrency import map_concurrently
 from coding.helpers import get_code_execution_results
 from core.celery import app
-from courses.models import EventParticipationSlot
+from courses.logic.batch_assessment import EventBatchAssessor
+from courses.logic.submission_buffer import flush_all_buffered_submissions
+from courses.models import Event, EventParticipation, EventParticipationSlot
 
 
 from celery.exceptions import MaxRetriesExceededError
 
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
 import logging
 
 logger = logging.getLogger(__name__)
@@ -32,18 +40,45 @@ logger = logging.getLogger(__name__)
 @app.task(bind=True, retry_backoff=True, max_retries=5)
 def bulk_run_participation_slot_code_task(self, slot_ids):
     """
-    Takes in an iterable of slot ids and runs code for all the slots
+    Takes in an iterable of slot ids and runs code for all the slots, running
+    up to settings.CODE_EXECUTION_MAX_THREADS of them at the same time
     """
-    slots = EventParticipationSlot.objects.filter(pk__in=slot_ids)
-
+    slots = list(
+        EventParticipationSlot.objects.filter(pk__in=slot_ids)
+        .select_related("exercise")
+        .prefetch_related("exercise__testcases__attachments")
+    )
+
+    # identical submissions to the same exercise are only run once
+    slots_by_code = {}
     for slot in slots:
+        slots_by_code.setdefault((slot.exercise_id, slot.answer_text), []).append(slot)
+
+    # the code is run in other threads, which don't need to query the database
+    failed_slots = []
+    for same_code_slots, results in zip(
+        slots_by_code.values(),
+        map_concurrently(
+            lambda same_code_slots: get_code_execution_results(slot=same_code_slots[0]),
+            slots_by_code.values(),
+            return_exceptions=True,
+        ),
+    ):
+        if isinstance(results, Exception):
+            logger.critical(
+                "Bulk run slot code task exception: %s", results, exc_info=results
+            )
+            failed_slots.extend(same_code_slots)
+        else:
+            for slot in same_code_slots:
+                save_execution_results(slot, results)
+
+    if len(failed_slots) > 0:
         try:
-            execute_code_and_save_results(slot)
-        except Exception as e:
-            logger.critical("Bulk run slot code task exception: %s", e, exc_info=1)
-            try:
-                self.retry(countdown=1)
-            except MaxRetriesExceededError:
+            # only retry the slots whose code couldn't be run
+            self.retry(args=([slot.pk for slot in failed_slots],), countdown=1)
+        except MaxRetriesExceededError:
+            for slot in failed_slots:
                 # TODO put this logic inside a method of model participation slot, e.g. set_execution_results_error_condition
                 slot.execution_results = {"state": "internal_error"}
                 slot.save(update_fields=["execution_results"])
@@ -74,8 +109,116 @@ def execute_code_and_save_results(slot):
     (sanitized) execution results to the slot itself
     """
     results = get_code_execution_results(slot=slot)
+    save_execution_results(slot, results)
+
+
+def save_execution_results(slot, results):
+    """
+    Saves the given (sanitized) execution results of the code
+    of a slot to the slot itself
+    """
     # strip off \u0000 char
     sanitized_results = EventParticipationSlot.sanitize_json(results)
 
     slot.execution_results = sanitized_results
     slot.save(update_fields=["execution_results"])
+
+
+@app.task(bind=True, retry_backoff=True, max_retries=5)
+def pregenerate_exam_participations_task(self, event_id):
+    """
+    Splits the users that will be able to participate in an exam into batches
+    and schedules the pre-generation of their participations
+    """
+    try:
+        event = Event.objects.get(pk=event_id)
+    except Event.DoesNotExist:
+        logger.critical(f"Couldn't find event {event_id} to pre-generate for")
+        return
+
+    now = timezone.localtime(timezone.now())
+    pregeneration_timestamp = event.participation_pregeneration_timestamp
+    if (
+        pregeneration_timestamp is None
+        # the event was rescheduled after this task was scheduled
+        or pregeneration_timestamp > now + timedelta(minutes=1)
+        or event.begin_timestamp <= now
+    ):
+        logger.info(f"Skipping participation pre-generation for {str(event)}")
+        return
+
+    user_ids = list(
+        EventParticipation.pregenerated.get_users_to_pregenerate_for(event).values_list(
+            "pk", flat=True
+        )
+    )
+    batch_size = settings.PARTICIPATION_PREGENERATION_BATCH_SIZE
+    for i in range(0, len(user_ids), batch_size):
+        pregenerate_exam_participations_batch_task.delay(
+            event_id, user_ids[i : i + batch_size]
+        )
+
+
+@app.task(bind=True, retry_backoff=True, max_retries=5)
+def pregenerate_exam_participations_batch_task(self, event_id, user_ids):
+    """
+    Creates the unclaimed participations of the given users to an exam
+    """
+    try:
+        event = Event.objects.get(pk=event_id)
+    except Event.DoesNotExist:
+        return
+
+    now = timezone.localtime(timezone.now())
+    if (
+        event.participation_pregeneration_timestamp is None
+        or event.begin_timestamp <= now
+    ):
+        return
+
+    try:
+        EventParticipation.pregenerated.pregenerate(event, user_ids)
+    except Exception as e:
+        logger.critical("PREGENERATE PARTICIPATIONS TASK EXCEPTION: %s", e, exc_info=1)
+        try:
+            self.retry(countdown=1)
+        except MaxRetriesExceededError:
+            pass
+
+
+@app.task(bind=True)
+def apply_event_state_transitions_task(self):
+    """
+    Periodically persists the automatic state transitions of events
+    that are due (see EventManager.apply_due_state_transitions)
+    """
+    transitioned = Event.objects.apply_due_state_transitions()
+    if len(transitioned) > 0:
+        logger.info(f"Applied state transitions to {len(transitioned)} events")
+
+
+@app.task(bind=True)
+def flush_buffered_submissions_task(self):
+    """
+    Periodically persists the submissions buffered while write-behind
+    is enabled (see courses.logic.submission_buffer)
+    """
+    flushed = flush_all_buffered_submissions()
+    if flushed > 0:
+        logger.info(f"Flushed buffered submissions of {flushed} slots")
+
+
+@app.task(bind=True, retry_backoff=True, max_retries=5)
+def assess_event_participations_task(self, event_id):
+    """
+    Assesses all the participations to the given event and persists the
+    scores that are out of date
+    """
+    try:
+        event = Event.objects.get(pk=event_id)
+    except Event.DoesNotExist:
+        return
+
+    assessor = EventBatchAssessor(event)
+    assessor.assess()
+    assessor.persist_stale_scores()
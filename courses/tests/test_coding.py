@@ -0,0 +1,709 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import requests
+
+from coding.fake_jobe import FakeJobeServer
+from coding.execution_cache import get_execution_cache_stats
+from coding.helpers import get_code_execution_results
+from coding.jobe import GLOBAL_SLOT_KEY_PREFIX, JobeClient, get_jobe_client
+from coding.node_pool import (
+    NodeWorkerCrashed,
+    NodeWorkerPool,
+    NodeWorkerTimeout,
+    get_node_worker_pool,
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from data import users, courses, events
+from courses.models import (
+    Course,
+    Event,
+    EventParticipation,
+    EventTemplateRule,
+    Exercise,
+    ExerciseTestCase,
+    ExerciseTestCaseAttachment,
+)
+from courses.tasks import bulk_run_participation_slot_code_task
+from users.models import User
+
+C_PROGRAM = """
+#include <stdio.h>
+
+int main() {
+    int a, b;
+    scanf("%d %d", &a, &b);
+    printf("%d\\n", a + b);
+    return 0;
+}
+"""
+
+C_PROGRAM_READING_FILE = """
+#include <stdio.h>
+
+int main() {
+    char line[100];
+    FILE *f = fopen("data.txt", "r");
+    fgets(line, 100, f);
+    printf("%s", line);
+    return 0;
+}
+"""
+
+
+class JobeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.jobe = FakeJobeServer().start()
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(
+            JOBE_RUNS_URL=self.jobe.runs_url,
+            JOBE_FILES_URL=self.jobe.files_url,
+            JOBE_RETRY_BACKOFF_SECONDS=0.001,
+            MEDIA_ROOT=self.media_root,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def tearDown(self):
+        self.jobe.stop()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def get_run_spec(self, stdin="1 2"):
+        return {"language_id": "c", "sourcecode": C_PROGRAM, "input": stdin}
+
+    def test_client_reuses_connections(self):
+        client = get_jobe_client()
+        self.assertIs(client, get_jobe_client())
+
+        for i in range(5):
+            result = client.run(self.get_run_spec(f"{i} 1"))
+            self.assertEqual(result["outcome"], 15)
+            self.assertEqual(result["stdout"], f"{i + 1}\n")
+
+        self.assertEqual(self.jobe.stats["runs"], 5)
+        self.assertEqual(self.jobe.stats["connections"], 1)
+
+    def test_client_retries_overloaded_runs(self):
+        self.jobe.overloaded_runs = 2
+        result = get_jobe_client().run(self.get_run_spec())
+        self.assertEqual(result["outcome"], 15)
+        self.assertEqual(self.jobe.stats["runs"], 3)
+
+        # after the maximum number of retries, the overload outcome is returned
+        self.jobe.overloaded_runs = 10
+        client = JobeClient(max_retries=2)
+        self.assertEqual(client.run(self.get_run_spec())["outcome"], 21)
+        self.assertEqual(self.jobe.stats["runs"], 6)
+
+    def test_client_retries_share_a_single_budget(self):
+        # overloads and connection errors alternate
+        client = JobeClient(max_retries=2)
+        responses = iter([Mock(status_code=503), requests.ConnectionError()] * 10)
+
+        def request(*args, **kwargs):
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        with patch.object(client.session, "request", side_effect=request) as mock:
+            self.assertEqual(client.run(self.get_run_spec())["outcome"], 21)
+        self.assertEqual(mock.call_count, 3)
+
+    def test_client_reports_overload_without_a_global_slot(self):
+        client = JobeClient(global_max_concurrency=1, timeout=0.05)
+        cache.add(f"{GLOBAL_SLOT_KEY_PREFIX}0", True, 10)
+        self.assertEqual(client.run(self.get_run_spec())["outcome"], 21)
+        self.assertEqual(self.jobe.stats["runs"], 0)
+
+        cache.delete(f"{GLOBAL_SLOT_KEY_PREFIX}0")
+        client = JobeClient(global_max_concurrency=1)
+        self.assertEqual(client.run(self.get_run_spec())["outcome"], 15)
+
+    def test_client_bounds_concurrency(self):
+        self.jobe.latency = 0.05
+        client = JobeClient(max_concurrency=2)
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(
+                executor.map(
+                    lambda _: client.run(self.get_run_spec()),
+                    range(6),
+                )
+            )
+
+        self.assertTrue(all(r["outcome"] == 15 for r in results))
+        self.assertEqual(self.jobe.stats["max_running"], 2)
+        self.assertLessEqual(self.jobe.stats["connections"], 2)
+
+    def test_c_execution_results(self):
+        teacher = User.objects.create(**users.teacher_1)
+        course = Course.objects.create(creator=teacher, **courses.course_1)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        testcase_1 = ExerciseTestCase.objects.create(
+            exercise=exercise, stdin="1 2", expected_stdout="3"
+        )
+        testcase_2 = ExerciseTestCase.objects.create(
+            exercise=exercise, stdin="2 2", expected_stdout="5"
+        )
+
+        results = get_code_execution_results(exercise=exercise, code=C_PROGRAM)
+        self.assertEqual(results["state"], "completed")
+        self.assertEqual(
+            [(t["id"], t["passed"], t["stdout"]) for t in results["tests"]],
+            [(testcase_1.pk, True, "3\n"), (testcase_2.pk, False, "4\n")],
+        )
+
+        results = get_code_execution_results(exercise=exercise, code="int main(")
+        self.assertIn("compilation_errors", results)
+
+        # attachments missing from jobe are uploaded when a run needs them
+        ExerciseTestCaseAttachment.objects.create(
+            testcase=testcase_1,
+            attachment=SimpleUploadedFile("data.txt", b"abc"),
+        )
+        testcase_2.delete()
+        results = get_code_execution_results(
+            exercise=exercise, code=C_PROGRAM_READING_FILE
+        )
+        self.assertEqual(results["tests"][0]["stdout"], "abc")
+        self.assertEqual(len(self.jobe.files), 1)
+
+    @override_settings(JOBE_C_COMPILE_ONCE=True)
+    def test_c_execution_results_compiled_once(self):
+        teacher = User.objects.create(**users.teacher_1)
+        course = Course.objects.create(creator=teacher, **courses.course_1)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        testcases = [
+            ExerciseTestCase.objects.create(
+                exercise=exercise, stdin=f"{i} 2", expected_stdout=str(i + 2)
+            )
+            for i in range(5)
+        ]
+        testcases[-1].expected_stdout = "0"
+        testcases[-1].save()
+
+        results = get_code_execution_results(exercise=exercise, code=C_PROGRAM)
+        self.assertEqual(
+            results["tests"],
+            [
+                {
+                    "id": t.pk,
+                    "passed": i < 4,
+                    "stdout": f"{i + 2}\n",
+                    "stderr": "",
+                    "error": None,
+                }
+                for i, t in enumerate(testcases)
+            ],
+        )
+        self.assertEqual(self.jobe.stats["runs"], 1)
+        self.assertEqual(self.jobe.stats["compilations"], 1)
+
+        # each test case runs in a separate process
+        results = get_code_execution_results(
+            exercise=exercise,
+            code="""
+            #include <stdio.h>
+            #include <stdlib.h>
+            int runs = 0;
+            int main(void) {
+                int a, b;
+                scanf("%d %d", &a, &b);
+                fprintf(stderr, "%d", ++runs);
+                if (a == 1) abort();
+                return a == 2;
+            }
+            """,
+        )
+        self.assertEqual(
+            [(t["stderr"], t["error"]) for t in results["tests"]],
+            [
+                ("1", None),
+                ("1", "runtime_error"),
+                ("1", "runtime_error"),
+                ("1", None),
+                ("1", None),
+            ],
+        )
+
+        # compilation errors are reported for the submitted code alone
+        results = get_code_execution_results(exercise=exercise, code="int main(")
+        self.assertIn("1:", results["compilation_errors"])
+        self.assertNotIn("__evo", results["compilation_errors"])
+
+        # each test case gets its own copy of its attachments
+        ExerciseTestCaseAttachment.objects.create(
+            testcase=testcases[0],
+            attachment=SimpleUploadedFile("data.txt", b"abc"),
+        )
+        ExerciseTestCaseAttachment.objects.create(
+            testcase=testcases[1],
+            attachment=SimpleUploadedFile("data.txt", b"def"),
+        )
+        results = get_code_execution_results(
+            exercise=exercise, code=C_PROGRAM_READING_FILE
+        )
+        self.assertEqual([t["stdout"] for t in results["tests"][:2]], ["abc", "def"])
+
+    def test_client_bounds_global_concurrency(self):
+        self.jobe.latency = 0.05
+        client = JobeClient(max_concurrency=4, global_max_concurrency=1)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                executor.map(
+                    lambda _: client.run(self.get_run_spec()),
+                    range(4),
+                )
+            )
+
+        self.assertTrue(all(r["outcome"] == 15 for r in results))
+        self.assertEqual(self.jobe.stats["max_running"], 1)
+
+    @override_settings(CODE_EXECUTION_MAX_THREADS=4)
+    def test_c_testcases_run_concurrently(self):
+        self.jobe.latency = 0.05
+        teacher = User.objects.create(**users.teacher_1)
+        course = Course.objects.create(creator=teacher, **courses.course_1)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        testcases = [
+            ExerciseTestCase.objects.create(
+                exercise=exercise, stdin=f"{i} 2", expected_stdout=str(i + 2)
+            )
+            for i in range(5)
+        ]
+
+        results = get_code_execution_results(exercise=exercise, code=C_PROGRAM)
+        self.assertEqual([t["id"] for t in results["tests"]], [t.pk for t in testcases])
+        self.assertTrue(all(t["passed"] for t in results["tests"]))
+        self.assertEqual(self.jobe.stats["max_running"], 4)
+
+        # code that doesn't compile is only sent once
+        results = get_code_execution_results(exercise=exercise, code="int main(")
+        self.assertIn("compilation_errors", results)
+        self.assertEqual(self.jobe.stats["runs"], 6)
+
+    @override_settings(CODE_EXECUTION_MAX_THREADS=4)
+    def test_bulk_run_participation_slot_code(self):
+        self.jobe.latency = 0.05
+        teacher = User.objects.create(**users.teacher_1)
+        course = Course.objects.create(creator=teacher, **courses.course_1)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        ExerciseTestCase.objects.create(
+            exercise=exercise, stdin="1 2", expected_stdout="3"
+        )
+        event = Event.objects.create(
+            course=course, creator=teacher, **events.exam_1_all_at_once
+        )
+        rule = EventTemplateRule.objects.create(
+            template=event.template, rule_type=EventTemplateRule.ID_BASED
+        )
+        rule.exercises.set([exercise])
+
+        slots = []
+        for i in range(6):
+            student = User.objects.create(username=f"student_{i}", email=f"{i}@a.com")
+            participation = EventParticipation.objects.create(
+                user=student, event_id=event.pk
+            )
+            slot = participation.slots.get()
+            # identical submissions are only run once
+            slot.answer_text = C_PROGRAM + f"// {i}" if i % 2 == 0 else "int main("
+            slot.save()
+            slots.append(slot)
+
+        bulk_run_participation_slot_code_task.apply(args=([s.pk for s in slots],))
+
+        for i, slot in enumerate(slots):
+            slot.refresh_from_db()
+            self.assertEqual(slot.execution_results["state"], "completed")
+            if i % 2 == 0:
+                self.assertTrue(slot.execution_results["tests"][0]["passed"])
+            else:
+                self.assertIn("compilation_errors", slot.execution_results)
+        self.assertEqual(self.jobe.stats["runs"], 4)
+        self.assertEqual(self.jobe.stats["max_running"], 4)
+
+    def test_execution_results_cache(self):
+        teacher = User.objects.create(**users.teacher_1)
+        course = Course.objects.create(creator=teacher, **courses.course_1)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.C, text="sum"
+        )
+        testcase = ExerciseTestCase.objects.create(
+            exercise=exercise, stdin="1 2", expected_stdout="3"
+        )
+
+        results = get_code_execution_results(exercise=exercise, code=C_PROGRAM)
+        self.assertTrue(results["tests"][0]["passed"])
+        self.assertEqual(self.jobe.stats["runs"], 1)
+
+        # identical code is answered from the cache
+        self.assertEqual(
+            get_code_execution_results(exercise=exercise, code=C_PROGRAM), results
+        )
+        self.assertEqual(self.jobe.stats["runs"], 1)
+        self.assertEqual(
+            get_execution_cache_stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        )
+
+        # changing the code or the test cases changes the results
+        get_code_execution_results(exercise=exercise, code=C_PROGRAM + "\n")
+        self.assertEqual(self.jobe.stats["runs"], 2)
+        testcase.expected_stdout = "4"
+        testcase.save()
+        results = get_code_execution_results(exercise=exercise, code=C_PROGRAM)
+        self.assertFalse(results["tests"][0]["passed"])
+        self.assertEqual(self.jobe.stats["runs"], 3)
+        ExerciseTestCaseAttachment.objects.create(
+            testcase=testcase,
+            attachment=SimpleUploadedFile("data.txt", b"abc"),
+        )
+        get_code_execution_results(exercise=exercise, code=C_PROGRAM)
+        self.assertEqual(self.jobe.stats["runs"], 4)
+
+        # results caused by the state of jobe aren't cached
+        code = C_PROGRAM + "// overload"
+        self.jobe.overloaded_runs = 100
+        with override_settings(JOBE_MAX_RETRIES=0):
+            results = get_code_execution_results(exercise=exercise, code=code)
+        self.assertEqual(results["tests"][0]["error"], "overload")
+        self.jobe.overloaded_runs = 0
+        results = get_code_execution_results(exercise=exercise, code=code)
+        self.assertEqual(results["tests"][0]["error"], None)
+        self.assertEqual(
+            get_execution_cache_stats(), {"hits": 1, "misses": 6, "hit_rate": 1 / 7}
+        )
+
+
+# speaks the protocol of coding/ts/worker.js, without running any code
+FAKE_NODE_WORKER = """
+const rl = require("readline").createInterface({ input: process.stdin });
+const write = (obj) => process.stdout.write(JSON.stringify(obj) + "\\n");
+const memory = [];
+rl.on("line", (line) => {
+  const job = JSON.parse(line);
+  if (job.code === "hang") {
+    while (true) {}
+  }
+  if (job.code === "crash") {
+    process.exit(1);
+  }
+  if (job.code === "grow") {
+    memory.push(Buffer.alloc(64 * 1024 * 1024, 1));
+  }
+  if (job.code === "noise") {
+    process.stdout.write("not json\\n");
+  }
+  const tests = job.testcases.map((t) => ({ id: t.id, passed: true }));
+  write({
+    id: job.id,
+    result: { tests, pid: process.pid },
+    memory: process.memoryUsage().rss,
+  });
+  if (job.code === "spin") {
+    const spin = () => Promise.resolve().then(spin);
+    spin();
+  }
+  setImmediate(() => write({ idle: job.id }));
+});
+rl.on("close", () => process.exit(0));
+write({ ready: true });
+"""
+
+
+class NodeWorkerPoolTestCase(TestCase):
+    def setUp(self):
+        worker_file = tempfile.NamedTemporaryFile("w", suffix=".js", delete=False)
+        worker_file.write(FAKE_NODE_WORKER)
+        worker_file.close()
+        self.worker_path = worker_file.name
+        self.addCleanup(os.unlink, self.worker_path)
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.stop()
+
+    def get_pool(self, **kwargs):
+        pool = NodeWorkerPool(command=["node", self.worker_path], **kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def run_job(self, pool, code="", testcases=None):
+        return pool.run(code, testcases or [{"id": 1, "assertion": ""}], False)
+
+    def test_workers_are_reused_and_recycled(self):
+        pool = self.get_pool(max_jobs=3, max_memory_mb=50)
+
+        results = [self.run_job(pool, testcases=[{"id": i}]) for i in range(4)]
+        self.assertEqual(
+            [r["tests"] for r in results],
+            [[{"id": i, "passed": True}] for i in range(4)],
+        )
+        # the first worker is replaced after 3 jobs
+        self.assertEqual(len({r["pid"] for r in results[:3]}), 1)
+        self.assertNotEqual(results[3]["pid"], results[0]["pid"])
+
+        # and workers whose memory grows past the limit are replaced too
+        grown = self.run_job(pool, "grow")
+        self.assertEqual(grown["pid"], results[3]["pid"])
+        self.assertNotEqual(self.run_job(pool)["pid"], grown["pid"])
+        self.assertEqual(pool.stats, {"started": 3, "recycled": 2, "discarded": 0})
+
+        # unexpected output is ignored
+        self.assertEqual(len(self.run_job(pool, "noise")["tests"]), 1)
+
+    def test_failing_jobs_are_isolated(self):
+        pool = self.get_pool(job_timeout=0.5)
+        pid = self.run_job(pool)["pid"]
+
+        with self.assertRaises(NodeWorkerTimeout):
+            self.run_job(pool, "hang")
+        with self.assertRaises(NodeWorkerCrashed):
+            self.run_job(pool, "crash")
+
+        # each failing job took its worker down with it
+        new_pid = self.run_job(pool)["pid"]
+        self.assertNotEqual(new_pid, pid)
+        self.assertEqual(pool.stats, {"started": 3, "recycled": 0, "discarded": 2})
+
+        # a job that leaves work behind completes, but its worker is discarded
+        spun = self.run_job(pool, "spin")
+        self.assertEqual(spun["pid"], new_pid)
+        self.assertEqual(len(spun["tests"]), 1)
+        self.assertNotEqual(self.run_job(pool)["pid"], new_pid)
+        self.assertEqual(pool.stats, {"started": 4, "recycled": 0, "discarded": 3})
+
+    def test_pool_bounds_workers(self):
+        pool = self.get_pool(size=2)
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda _: self.run_job(pool), range(12)))
+
+        self.assertEqual(len(results), 12)
+        self.assertLessEqual(len({r["pid"] for r in results}), 2)
+
+    def test_js_execution_results(self):
+        teacher = User.objects.create(**users.teacher_1)
+        course = Course.objects.create(creator=teacher, **courses.course_1)
+        exercise = Exercise.objects.create(
+            course=course, exercise_type=Exercise.JS, text="js"
+        )
+        testcase = ExerciseTestCase.objects.create(exercise=exercise, code="assert(1)")
+
+        with override_settings(NODE_WORKER_PATH=self.worker_path):
+            self.pools.append(get_node_worker_pool())
+            results = get_code_execution_results(exercise=exercise, code="code")
+        self.assertEqual(results["tests"], [{"id": testcase.pk, "passed": True}])
+        self.assertEqual(results["state"], "completed")
+
+        # show code that times out isn't cached, as workers can time out
+        # because of load
+        with override_settings(
+            NODE_WORKER_PATH=self.worker_path, NODE_WORKER_JOB_TIMEOUT_SECONDS=0.5
+        ):
+            self.pools.append(get_node_worker_pool())
+            hits = get_execution_cache_stats()["hits"]
+            for _ in range(2):
+                results = get_code_execution_results(exercise=exercise, code="hang")
+                self.assertEqual(results["tests"][0]["error"], "internal_error")
+            self.assertEqual(get_execution_cache_stats()["hits"], hits)
+
+        # show code whose worker crashes is reported as a sandbox error rather
+        # than as a non-coding exercise, and isn't cached either
+        with override_settings(NODE_WORKER_PATH=self.worker_path):
+            self.pools.append(get_node_worker_pool())
+            hits = get_execution_cache_stats()["hits"]
+            for _ in range(2):
+                results = get_code_execution_results(exercise=exercise, code="crash")
+                self.assertEqual(results["tests"][0]["error"], "internal_error")
+                self.assertEqual(results["execution_error"], "Couldn't run the code")
+            self.assertEqual(get_execution_cache_stats()["hits"], hits)
+
+
+# stand-ins for the modules coding/ts depends on: the compiler only strips
+# type annotations, declares the functions of the code it compiles, and
+# reports the `user_` functions that are used without being declared
+FAKE_TYPESCRIPT = r"""
+const USED = /\b(user_\w+)\(/g;
+const DECLARED = /function (user_\w+)\((.*?)\)(: \w+)?/g;
+const strip = (s) => '"use strict";\n' + s.replace(/:\s*(any|number)/g, "");
+const declare = (s) =>
+  [...s.matchAll(DECLARED)].map((m) => `declare ${m[0]};`).join("\n");
+
+function check(fileNames, files) {
+  const declared = new Set(
+    fileNames.flatMap((f) => [...files[f].matchAll(DECLARED)].map((m) => m[1]))
+  );
+  return fileNames
+    .filter((f) => !f.endsWith(".d.ts"))
+    .flatMap((f) => [...files[f].matchAll(USED)].map((m) => m[1]))
+    .filter((name) => !declared.has(name))
+    .map((name) => ({ messageText: `Cannot find name '${name}'.` }));
+}
+
+module.exports = {
+  version: "fake",
+  createCompilerHost: () => ({}),
+  createSourceFile: (fileName, text) => ({ fileName, text }),
+  flattenDiagnosticMessageText: (text) => text,
+  transpileModule: (source) => ({ outputText: strip(source), diagnostics: [] }),
+  createProgram(fileNames, options, host) {
+    const files = {};
+    for (const f of fileNames) files[f] = host.readFile(f);
+    return {
+      getSourceFile: (f) => host.getSourceFile(f),
+      getDeclarationDiagnostics: () => [],
+      diagnostics: check(fileNames, files),
+      emit(sourceFile) {
+        if (!options.noEmit) {
+          const base = sourceFile.fileName.replace(/\.ts$/, "");
+          host.writeFile(base + ".js", strip(sourceFile.text));
+          if (options.declaration) {
+            host.writeFile(base + ".d.ts", declare(sourceFile.text));
+          }
+        }
+        return { diagnostics: [] };
+      },
+    };
+  },
+  getPreEmitDiagnostics: (program) => program.diagnostics,
+};
+"""
+
+FAKE_VM2 = """
+const vm = require("vm");
+class VM {
+  constructor({ sandbox, timeout }) {
+    this.context = vm.createContext({ ...sandbox });
+    this.timeout = timeout;
+  }
+  run(code) {
+    return vm.runInContext(code, this.context, { timeout: this.timeout });
+  }
+}
+module.exports = { VM };
+"""
+
+# runs the given programs with coding/ts/runJs.js, outputting the results and
+# the stats of the compilation cache after each of them
+RUN_TS_PROGRAMS = """
+const Module = require("module");
+const [standIns, tsDir, programs] = process.argv.slice(2).map(JSON.parse);
+const resolveFilename = Module._resolveFilename;
+Module._resolveFilename = function (request, ...args) {
+  return standIns[request] ?? resolveFilename.call(this, request, ...args);
+};
+const { runProgram } = require(tsDir + "/runJs");
+const { getCacheStats } = require(tsDir + "/tsCompilation");
+const outputs = programs.map(([code, testcases]) => ({
+  result: runProgram(code, testcases, true),
+  stats: getCacheStats(),
+}));
+console.log(JSON.stringify(outputs));
+"""
+
+TS_SUM = "function user_sum(a: number, b: number): number { return a + b }"
+
+
+class TypeScriptCompilationTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.stand_ins = {}
+        for name, source in (("typescript", FAKE_TYPESCRIPT), ("vm2", FAKE_VM2)):
+            self.stand_ins[name] = os.path.join(self.tmp_dir, name + ".js")
+            with open(self.stand_ins[name], "w") as f:
+                f.write(source)
+        self.script_path = os.path.join(self.tmp_dir, "run.js")
+        with open(self.script_path, "w") as f:
+            f.write(RUN_TS_PROGRAMS)
+
+    def run_programs(self, *programs, cache_size=1000):
+        env = {**os.environ, "TS_TRANSPILE_CACHE_SIZE": str(cache_size)}
+        env.pop("TS_TRANSPILE_CACHE_DIR", None)
+        output = subprocess.run(
+            [
+                "node",
+                self.script_path,
+                json.dumps(self.stand_ins),
+                json.dumps(os.path.dirname(settings.NODE_WORKER_PATH)),
+                json.dumps(programs),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return json.loads(output)
+
+    def test_testcases_run_against_user_code(self):
+        testcases = [
+            {"id": 1, "assertion": "assert.strictEqual(user_sum(1, 2), 3)"},
+            {"id": 2, "assertion": "assert.strictEqual(user_sum(1, 2), 4)"},
+        ]
+        missing = [{"id": 3, "assertion": "assert.strictEqual(user_diff(2, 1), 1)"}]
+        passing, undeclared = [
+            output["result"]
+            for output in self.run_programs((TS_SUM, testcases), (TS_SUM, missing))
+        ]
+
+        # show the placeholders in the transpiled test cases are replaced by
+        # the identifiers of the sandbox
+        self.assertEqual([t["passed"] for t in passing["tests"]], [True, False])
+        self.assertIn("expected value 4, but got 3", passing["tests"][1]["error"])
+
+        # show the test cases are type-checked against the user code
+        self.assertEqual(
+            undeclared["compilation_errors"], "Cannot find name 'user_diff'."
+        )
+
+    def test_compilations_are_cached(self):
+        testcases = [{"id": 1, "assertion": "assert.strictEqual(user_sum(1, 2), 3)"}]
+        other_code = TS_SUM + "\n"
+        outputs = self.run_programs(
+            (TS_SUM, testcases),
+            (TS_SUM, testcases),
+            (other_code, testcases),
+            (TS_SUM, testcases),
+            cache_size=2,
+        )
+        for output in outputs:
+            self.assertTrue(output["result"]["tests"][0]["passed"])
+
+        def stats(hits, misses, size):
+            return {"hits": hits, "diskHits": 0, "misses": misses, "size": size}
+
+        self.assertEqual(
+            [output["stats"] for output in outputs],
+            [
+                # the user code and the test cases are compiled
+                stats(0, 2, 2),
+                # the same submission is answered from the cache
+                stats(2, 2, 2),
+                # the test cases are reused by new code, which evicts the
+                # least recently used compilation
+                stats(3, 3, 2),
+                # ...which has to be compiled again
+                stats(4, 4, 2),
+            ],
+        )
@@ -3,10 +3,14 @@ from courses.models import (
     Course,
     Event,
     EventParticipation,
+    EventParticipationSlot,
     EventTemplateRule,
     Exercise,
 )
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from courses.logic.batch_assessment import SCORE_QUANTUM, EventBatchAssessor
 from users.models import User
 
 from data import users, courses, exercises, events
@@ -346,6 +350,259 @@ class SubmissionAssessorTestCase(TestCase):
         # ==> 4.5 / 5 * 2 = 1.8
         self.assertEqual(self.slot_clz.score, Decimal("1.8"))
 
+    def test_persisted_scores(self):
+        """
+        Shows that computed scores are persisted and read back without running
+        the assessment again, and that they're invalidated by changes to the
+        answers, the exercises, and the rules they depend on
+        """
+        choices = self.msc.choices.all()
+        correct_choice = choices.get(correctness=1)
+        incorrect_choice = choices.get(correctness=0)
+
+        self.slot_msc.selected_choices.set([correct_choice])
+        self.assertEqual(self.slot_msc.score, 2)
+        self.assertEqual(self.participation.score, "2.00")
+
+        # freshly loaded instances read the persisted scores
+        slot = EventParticipationSlot.objects.get(pk=self.slot_msc.pk)
+        participation = EventParticipation.objects.get(pk=self.participation.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(slot.score, 2)
+            self.assertEqual(participation.score, "2.00")
+            self.assertEqual(
+                participation.assessment_progress,
+                EventParticipation.PARTIALLY_ASSESSED,
+            )
+
+        # changing the answer invalidates the slot and its participation
+        slot.selected_choices.set([incorrect_choice])
+        participation.refresh_from_db()
+        self.assertFalse(slot.is_computed_score_up_to_date)
+        self.assertFalse(participation.is_computed_score_up_to_date)
+        self.assertEqual(slot.score, 0)
+        self.assertEqual(participation.score, "0.00")
+
+        # the participation is only invalidated once until it's computed again
+        def count_participation_writes(context):
+            return len(
+                [
+                    q
+                    for q in context.captured_queries
+                    if q["sql"].startswith('UPDATE "courses_eventparticipation"')
+                ]
+            )
+
+        with CaptureQueriesContext(connection) as context:
+            slot.set_selected_choices([correct_choice])
+            slot.set_selected_choices([incorrect_choice])
+        self.assertEqual(count_participation_writes(context), 1)
+        participation.refresh_from_db()
+        self.assertFalse(participation.is_computed_score_up_to_date)
+        self.assertEqual(participation.score, "0.00")
+        with CaptureQueriesContext(connection) as context:
+            slot.set_selected_choices([correct_choice])
+        self.assertEqual(count_participation_writes(context), 1)
+        participation.refresh_from_db()
+        self.assertEqual(participation.score, "2.00")
+        slot.set_selected_choices([incorrect_choice])
+
+        # changing the correctness of a choice invalidates the slot
+        incorrect_choice.correctness = -0.5
+        incorrect_choice.save()
+        slot.refresh_from_db()
+        self.assertEqual(slot.score, -1)
+
+        # changing the weight of the populating rule invalidates the slot
+        self.rule_msc.weight = 4
+        self.rule_msc.save()
+        slot.refresh_from_db()
+        self.assertEqual(slot.score, -2)
+
+        # a manually assigned score takes precedence over the computed one
+        slot.score = 3
+        slot.save()
+        participation.refresh_from_db()
+        self.assertEqual(participation.score, "3.00")
+
+        # changes to sub-slots invalidate their parent slot
+        sub_slot = self.slot_clz.sub_slots.first()
+        self.slot_clz.refresh_from_db()
+        self.slot_clz.score
+        sub_slot.selected_choices.set([sub_slot.exercise.choices.first()])
+        self.slot_clz.refresh_from_db()
+        self.assertFalse(self.slot_clz.is_computed_score_up_to_date)
+
+    def test_scores_dont_depend_on_cache_state(self):
+        """
+        Shows that freshly computed and persisted scores have the same type
+        and precision, and that participation scores are formatted like they
+        were before scores were persisted
+        """
+        # 1 / 3 of the max score
+        self.rule_msc.weight = Decimal("1")
+        self.rule_msc.save()
+        self.msc.choices.create(correctness=-1)
+        choices = self.msc.choices.all()
+        self.slot_msc.selected_choices.set([choices.get(correctness=1)])
+        self.mmc.choices.update(correctness=1)
+
+        for slot in self.participation.slots.base_slots():
+            computed = slot.score
+            persisted = EventParticipationSlot.objects.get(pk=slot.pk).score
+            self.assertEqual(computed, persisted)
+            self.assertEqual(str(computed), str(persisted))
+
+        computed = EventParticipation.objects.get(pk=self.participation.pk).score
+        persisted = EventParticipation.objects.get(pk=self.participation.pk).score
+        self.assertEqual(computed, persisted)
+        self.assertRegex(computed, r"^-?\d+\.\d\d$")
+
+        # participations none of whose slots are assessed have a score of "0"
+        exam = Event.objects.create(
+            course=self.course, creator=self.teacher_1, **events.exam_1_one_at_a_time
+        )
+        rule = EventTemplateRule.objects.create(
+            template=exam.template, rule_type=EventTemplateRule.ID_BASED, weight=2
+        )
+        rule.exercises.set([self.open])
+        participation = EventParticipation.objects.create(
+            event_id=exam.pk, user=self.student_1
+        )
+        self.assertEqual(participation.score, "0")
+        self.assertEqual(EventParticipation.objects.get(pk=participation.pk).score, "0")
+
+    def test_batch_assessment(self):
+        """
+        Shows that EventBatchAssessor gives the same scores as assessing
+        each slot individually
+        """
+        # include placeholders for all cloze sub-exercises except the last one
+        for sub_exercise in list(self.clz.sub_exercises.all())[:-1]:
+            self.clz.text += f" [[{sub_exercise.pk}]]"
+        self.clz.save()
+
+        participation_2 = EventParticipation.objects.create(
+            event_id=self.event.pk, user=self.student_2
+        )
+
+        self.slot_msc.selected_choices.set([self.msc.choices.get(correctness=0.5)])
+        self.slot_mmc.selected_choices.set(self.mmc.choices.filter(correctness__gt=0))
+        for sub_slot in self.slot_clz.sub_slots.all():
+            sub_slot.selected_choices.set([sub_slot.exercise.choices.last()])
+        self.slot_js.execution_results = {
+            "tests": [{"passed": True}, {"passed": False}, {"passed": True}]
+        }
+        self.slot_js.save()
+        self.slot_open.answer_text = "answer"
+        self.slot_open.save()
+
+        slot_2_mmc = participation_2.slots.get(populating_rule=self.rule_mmc)
+        slot_2_mmc.selected_choices.set([self.mmc.choices.first()])
+        slot_2_mmc.score = Decimal("1.5")
+        slot_2_mmc.save()
+        slot_2_js = participation_2.slots.get(populating_rule=self.rule_js)
+        slot_2_js.answer_text = "code that wasn't run"
+        slot_2_js.save()
+
+        assessor = EventBatchAssessor(self.event)
+        assessor.assess()
+
+        slots = EventParticipationSlot.objects.filter(participation__event=self.event)
+        self.assertEqual(len(assessor.slot_scores), slots.count())
+        for slot in slots:
+            score = slot.score
+            self.assertEqual(
+                assessor.slot_scores[slot.pk],
+                # batch scores have the precision of persisted ones
+                Decimal(score).quantize(SCORE_QUANTUM) if score is not None else None,
+            )
+
+        self.assertIsNone(assessor.slot_scores[self.slot_open.pk])
+        self.assertIsNone(assessor.slot_scores[slot_2_js.pk])
+        self.assertEqual(assessor.slot_scores[slot_2_mmc.pk], Decimal("1.5"))
+
+        for participation in (self.participation, participation_2):
+            participation.refresh_from_db()
+            self.assertEqual(
+                str(assessor.participation_scores[participation.pk]),
+                participation.score,
+            )
+            self.assertEqual(
+                assessor.participation_assessment_progress[participation.pk],
+                participation.assessment_progress,
+            )
+
+        """
+        Show that persisting the scores makes them up to date
+        """
+        EventParticipationSlot.objects.filter(participation__event=self.event).update(
+            _computed_score_version=None
+        )
+        assessor = EventBatchAssessor(self.event)
+        assessor.assess()
+        assessor.persist_stale_scores()
+        for slot in slots.all():
+            self.assertTrue(slot.is_computed_score_up_to_date)
+            self.assertEqual(
+                assessor.computed_slot_scores[slot.pk], slot._computed_score
+            )
+
+    def test_persisted_max_score(self):
+        """
+        Shows that the max score of exercises is persisted and invalidated by
+        changes to their choices, test cases, and sub-exercises
+        """
+        self.assertEqual(
+            Exercise.objects.get(pk=self.mmc.pk).get_max_score(), Decimal("2.5")
+        )
+        mmc = Exercise.objects.get(pk=self.mmc.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(mmc.get_max_score(), Decimal("2.5"))
+
+        choice = self.mmc.choices.create(text="new", correctness=1, _ordering=100)
+        mmc.refresh_from_db()
+        self.assertFalse(mmc.is_max_score_up_to_date)
+        self.assertEqual(mmc.get_max_score(), Decimal("3.5"))
+
+        choice.correctness = 0
+        choice.save()
+        mmc.refresh_from_db()
+        self.assertEqual(mmc.get_max_score(), Decimal("2.5"))
+
+        self.assertEqual(self.js.get_max_score(), 4)
+        self.js.testcases.create(code="345", _ordering=100)
+        js = Exercise.objects.get(pk=self.js.pk)
+        self.assertEqual(js.get_max_score(), 5)
+
+        # computed and persisted max scores have the same type and precision
+        for exercise in (self.mmc, self.msc, self.js):
+            Exercise.objects.filter(pk=exercise.pk).update(
+                _computed_max_score_version=None
+            )
+            computed = Exercise.objects.get(pk=exercise.pk).get_max_score()
+            persisted = Exercise.objects.get(pk=exercise.pk).get_max_score()
+            self.assertEqual(computed, persisted)
+            self.assertEqual(str(computed), str(persisted))
+
+        # changes to sub-exercises invalidate their parent
+        for sub_exercise in self.clz.sub_exercises.all():
+            self.clz.text += f" [[{sub_exercise.pk}]]"
+        self.clz.save()
+        clz = Exercise.objects.get(pk=self.clz.pk)
+        self.assertEqual(clz.get_max_score(), 4)
+
+        sub_exercise = clz.sub_exercises.get(_ordering=0)
+        sub_exercise.child_weight = 3
+        sub_exercise.save()
+        clz.refresh_from_db()
+        self.assertEqual(clz.get_max_score(), 5)
+
+        sub_exercise.choices.filter(correctness=1).update(correctness=0.5)
+        sub_exercise.choices.get(correctness=0).delete()
+        clz.refresh_from_db()
+        self.assertEqual(clz.get_max_score(), Decimal("3.5"))
+
     def test_open_answer_assessment(self):
         pass
 
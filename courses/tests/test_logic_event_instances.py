@@ -1,14 +1,20 @@
 from courses.logic.event_instances import ExercisePicker
+from courses.logic.exercise_index import get_exercise_index
 from courses.models import (
     Course,
     Event,
+    EventParticipation,
     EventTemplate,
     EventTemplateRule,
     EventTemplateRuleClause,
     Exercise,
+    PracticeSeenExercise,
     Tag,
 )
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from users.models import User
 
 
 class GetExercisesFromTemplateTestCase(TestCase):
@@ -164,6 +170,131 @@ class GetExercisesFromTemplateTestCase(TestCase):
             self.assertIn(exercises[2].pk, [self.e3.pk, self.e4.pk, self.e5.pk])
             self.assertIn(exercises[3].pk, [self.e6.pk])
 
+    def test_exercise_index(self):
+        # show the index resolves rules like ExerciseQuerySet.satisfying
+        def assert_index_matches_queryset():
+            self.course.refresh_from_db()
+            index = get_exercise_index(self.course)
+            for rule in self.template.rules.all().prefetch_related("clauses__tags"):
+                if rule.rule_type == EventTemplateRule.ID_BASED:
+                    continue
+                for public_only in (False, True):
+                    qs = Exercise.objects.base_exercises().filter(course=self.course)
+                    if public_only:
+                        qs = qs.public()
+                    self.assertSetEqual(
+                        index.get_exercise_ids_satisfying(
+                            rule, public_only=public_only
+                        ),
+                        set(qs.satisfying(rule).values_list("pk", flat=True)),
+                    )
+
+        assert_index_matches_queryset()
+
+        # show the index is kept up to date with changes to exercises and tags
+        version = self.course.exercise_index_version
+        self.e6.public_tags.remove(self.tag9)
+        self.e3.private_tags.add(self.tag2)
+        self.e5.state = Exercise.PUBLIC
+        self.e5.save()
+        self.e4.delete()
+        self.tag6.delete()
+        assert_index_matches_queryset()
+        self.assertGreater(self.course.exercise_index_version, version)
+
+        # saving an exercise without changing fields relevant to the
+        # index doesn't invalidate it
+        version = self.course.exercise_index_version
+        e1 = Exercise.objects.get(pk=self.e1.pk)
+        e1.text = "changed"
+        e1.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.exercise_index_version, version)
+
+    def test_get_random_exercises_by_id(self):
+        # show only id's of exercises in the initial queryset are sampled
+        initial_qs = Exercise.objects.filter(pk__in=[self.e1.pk, self.e2.pk])
+        ids = {self.e1.pk, self.e2.pk, self.e3.pk, self.e4.pk, self.e5.pk}
+        for _ in range(0, 10):
+            exercises = ExercisePicker.get_random_exercises_by_id(initial_qs, ids, 2)
+            self.assertSetEqual({e.pk for e in exercises}, {self.e1.pk, self.e2.pk})
+
+        # show only the picked id's are sent to the database, so the queries
+        # don't grow with the number of candidates
+        all_ids = set(Exercise.objects.values_list("pk", flat=True))
+        with CaptureQueriesContext(connection) as context:
+            exercises = ExercisePicker.get_random_exercises_by_id(
+                Exercise.objects.all(), all_ids, 2
+            )
+        self.assertEqual(len(exercises), 2)
+        for pk in all_ids - {e.pk for e in exercises}:
+            self.assertNotRegex(context.captured_queries[0]["sql"], rf"[( ]{pk}[,)]")
+
+    def test_exclude_seen_in_practice(self):
+        user = User.objects.create(username="student", email="student@a.com")
+        Exercise.objects.filter(course=self.course).update(state=Exercise.PUBLIC)
+        practice = Event.objects.create(
+            event_type=Event.SELF_SERVICE_PRACTICE, course=self.course, creator=user
+        )
+        EventTemplateRule.objects.create(
+            template=practice.template,
+            rule_type=EventTemplateRule.FULLY_RANDOM,
+            amount=5,
+        )
+
+        # show the exercises assigned in a practice are recorded as seen
+        participation = EventParticipation.objects.create(
+            user=user, event_id=practice.pk
+        )
+        seen_ids = set(
+            participation.slots.base_slots().values_list("exercise_id", flat=True)
+        )
+        self.assertEqual(len(seen_ids), 5)
+        self.assertSetEqual(
+            set(
+                PracticeSeenExercise.objects.filter(
+                    user=user, course=self.course
+                ).values_list("exercise_id", flat=True)
+            ),
+            seen_ids,
+        )
+        self.assertFalse(
+            Exercise.objects.filter(pk__in=seen_ids)
+            .not_seen_in_practice_by(user)
+            .exists()
+        )
+
+        # show exercises seen in practice aren't picked again
+        for _ in range(0, 5):
+            picked_ids = {
+                e.pk
+                for e, _ in ExercisePicker().get_exercises_from(
+                    practice.template,
+                    public_only=True,
+                    exclude_seen_in_practice=True,
+                )
+            }
+            self.assertEqual(len(picked_ids), 5)
+            self.assertSetEqual(picked_ids & seen_ids, set())
+
+        # show the same holds for id-based rules
+        id_practice = Event.objects.create(
+            event_type=Event.SELF_SERVICE_PRACTICE, course=self.course, creator=user
+        )
+        rule = EventTemplateRule.objects.create(
+            template=id_practice.template,
+            rule_type=EventTemplateRule.ID_BASED,
+            amount=5,
+        )
+        rule.exercises.set(seen_ids)
+        for exclude_seen_in_practice, picked_count in ((False, 5), (True, 0)):
+            picked = ExercisePicker().get_exercises_from(
+                id_practice.template,
+                public_only=True,
+                exclude_seen_in_practice=exclude_seen_in_practice,
+            )
+            self.assertEqual(len(picked), picked_count)
+
     # def test_integration_with_event_instance_manager(self):
     #     # show passing an EventTemplate to EventInstanceManager generates an
     #     # EventInstance with the correct exercises
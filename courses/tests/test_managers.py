@@ -2,6 +2,7 @@ from courses.models import (
     Course,
     Event,
     EventParticipation,
+    EventParticipationSlot,
     EventTemplate,
     EventTemplateRule,
     EventTemplateRuleClause,
@@ -10,6 +11,7 @@ from courses.models import (
 )
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.utils import timezone
 from users.models import User
 
 
@@ -736,3 +738,74 @@ class EventParticipationManagerTestCase(TestCase):
 
             self.assertNotEqual(slot_0.exercise.pk, slot_1.exercise.pk)
             self.assertNotEqual(slot_1.exercise.pk, slot_2.exercise.pk)
+
+    def test_slot_tree_bulk_creation(self):
+        user = User.objects.create(email="tree@aaa.com", username="tree")
+        participation = EventParticipation.objects.create(
+            event_id=self.event.pk, user=user
+        )
+        participation.slots.all().delete()
+
+        nested = Exercise.objects.create(
+            text="nested",
+            state=Exercise.PRIVATE,
+            course=self.course,
+            exercise_type=Exercise.AGGREGATED,
+            sub_exercises=[
+                {"text": "n0", "exercise_type": Exercise.OPEN_ANSWER},
+                {"text": "n1", "exercise_type": Exercise.AGGREGATED},
+            ],
+        )
+        inner = nested.sub_exercises.get(text="n1")
+        for text in ["m0", "m1", "m2"]:
+            Exercise.objects.create(
+                text=text,
+                parent=inner,
+                course=self.course,
+                exercise_type=Exercise.OPEN_ANSWER,
+            )
+
+        rule = self.template.rules.first()
+        base_slots = EventParticipationSlot.objects.bulk_create_slot_tree(
+            participation,
+            [(self.e6, rule), (nested, rule), (self.e4, None)],
+            first_slot_seen_at=timezone.now(),
+        )
+
+        self.assertEqual([s.slot_number for s in base_slots], [0, 1, 2])
+        self.assertTrue(all(s.pk is not None for s in base_slots))
+        self.assertEqual(participation.slots.base_slots().count(), 3)
+        self.assertIsNotNone(
+            participation.slots.base_slots().get(slot_number=0).seen_at
+        )
+        self.assertIsNone(participation.slots.base_slots().get(slot_number=1).seen_at)
+
+        nested_slot = participation.slots.base_slots().get(slot_number=1)
+        self.assertEqual(
+            [(s.exercise, s.slot_number) for s in nested_slot.sub_slots.all()],
+            [(e, i) for i, e in enumerate(nested.sub_exercises.all())],
+        )
+        inner_slot = nested_slot.sub_slots.get(exercise=inner)
+        self.assertEqual(
+            [(s.exercise, s.slot_number) for s in inner_slot.sub_slots.all()],
+            [(e, i) for i, e in enumerate(inner.sub_exercises.all())],
+        )
+        # show slots at any depth know the number of their base slot
+        self.assertEqual(participation.base_slot_count, 3)
+        self.assertEqual({s.base_slot_number for s in inner_slot.sub_slots.all()}, {1})
+        self.assertEqual(inner_slot.base_slot_number, 1)
+        self.assertEqual(
+            participation.slots.base_slots().get(slot_number=2).sub_slots.count(),
+            self.e4.sub_exercises.count(),
+        )
+
+        # exercises and rules from other courses are rejected before writing
+        with self.assertRaises(ValidationError):
+            EventParticipationSlot.objects.bulk_create_slot_tree(
+                participation, [(self.e1_other_course, None)]
+            )
+        with self.assertRaises(ValidationError):
+            EventParticipationSlot.objects.bulk_create_slot_tree(
+                participation, [(self.e1, self.rule_template_other_course)]
+            )
+        self.assertEqual(participation.slots.base_slots().count(), 3)
@@ -1,5 +1,6 @@
 from decimal import Decimal
 from time import time
+from unittest.mock import patch
 from django.forms import ValidationError
 
 from courses.tests.data import courses
@@ -196,6 +197,71 @@ class ModelPropertiesTestCase(TestCase):
             e1.access_rule_exceptions = ["abc", True]
             e1.save()
 
+    def test_event_state_transitions(self):
+        now = timezone.localtime(timezone.now())
+        e1 = Event.objects.create(
+            course=self.course,
+            name="test_event_1",
+            event_type=Event.EXAM,
+            begin_timestamp=now - timezone.timedelta(minutes=10),
+            end_timestamp=now - timezone.timedelta(minutes=1),
+            close_automatically=True,
+        )
+        e1.state = Event.PLANNED
+        e1.save()
+        e2 = Event.objects.create(
+            course=self.course, name="test_event_2", event_type=Event.EXAM
+        )
+        e2.state = Event.RESTRICTED
+        e2.save()
+
+        # show reading the state doesn't query or write to the db
+        e1 = Event.objects.get(pk=e1.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(e1.state, Event.CLOSED)
+        self.assertEqual(e1._event_state, Event.PLANNED)
+
+        # show events can be filtered by their effective state
+        self.assertIn(e1, Event.objects.in_state(Event.CLOSED))
+        self.assertNotIn(e1, Event.objects.in_state(Event.PLANNED))
+        self.assertNotIn(e1, Event.objects.in_state(Event.OPEN))
+
+        # show due transitions are persisted in batch, and a planned event
+        # that's already past its end is opened before being closed
+        saved_states = []
+        save = Event.save
+
+        def record_save(event, *args, **kwargs):
+            if event.pk == e1.pk:
+                saved_states.append(event._event_state)
+            return save(event, *args, **kwargs)
+
+        with patch.object(Event, "save", record_save):
+            transitioned = Event.objects.apply_due_state_transitions()
+        self.assertSetEqual({e.pk for e in transitioned}, {e1.pk, e2.pk})
+        self.assertListEqual(saved_states, [Event.OPEN, Event.CLOSED])
+        e1.refresh_from_db()
+        e2.refresh_from_db()
+        self.assertEqual(e1._event_state, Event.CLOSED)
+        # a restricted event with no users allowed past closure is closed
+        self.assertEqual(e2._event_state, Event.CLOSED)
+        self.assertListEqual(Event.objects.apply_due_state_transitions(), [])
+
+        # show restricted events are opened when all participants are allowed
+        e2.state = Event.RESTRICTED
+        e2.save()
+        EventParticipation.objects.create(user=self.user, event_id=e2.pk)
+        e2.users_allowed_past_closure.add(self.user)
+        e2.refresh_from_db()
+        self.assertEqual(e2.state, Event.OPEN)
+
+        # and closed when no users are allowed past closure anymore
+        e2.state = Event.RESTRICTED
+        e2.save()
+        e2.users_allowed_past_closure.clear()
+        e2.refresh_from_db()
+        self.assertEqual(e2.state, Event.CLOSED)
+
     def test_participation_current_exercise_property(self):
         pass
 
@@ -1,9 +1,24 @@
+import json
 from decimal import Decimal
 from time import sleep
+from unittest.mock import patch
 from django.utils import timezone
 from courses.logic import privileges
+from courses.logic.enrollments import get_enrolled_user_ids, is_user_enrolled
+from courses.logic.batch_assessment import EventBatchAssessor
+from courses.logic.participation_reports import (
+    get_participation_report_rows,
+    refresh_stale_participation_scores,
+)
+from courses.logic.submission_buffer import flush_all_buffered_submissions
+from courses.logic.privileges import (
+    get_privileges_by_user,
+    get_user_privileges,
+    invalidate_user_privileges,
+)
 from courses.models import (
     Course,
+    CourseRole,
     Event,
     EventParticipation,
     EventParticipationSlot,
@@ -14,7 +29,9 @@ from courses.models import (
     UserCourseEnrollment,
     UserCoursePrivilege,
 )
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient, force_authenticate
 from users.models import User
 from data import events
@@ -1540,6 +1557,687 @@ class EventParticipationViewSetTestCase(BaseTestCase):
         # self.assertIn("solution", exercise)
         self.assertIn("correctness", exercise["choices"][0])
 
+    def test_pregenerated_participation_claim(self):
+        from django_celery_beat.models import PeriodicTask
+
+        self.event.state = Event.PLANNED
+        self.event.begin_timestamp = timezone.now() + timezone.timedelta(minutes=5)
+        self.event.save()
+
+        def get_scheduled_tasks():
+            return PeriodicTask.objects.filter(
+                task="courses.tasks.pregenerate_exam_participations_task",
+                args__contains=str(self.event.pk),
+            )
+
+        # show pre-generation has been scheduled for the event
+        self.assertEqual(get_scheduled_tasks().count(), 1)
+
+        # show rescheduling the event reschedules its task instead of adding one
+        self.event.begin_timestamp += timezone.timedelta(minutes=30)
+        self.event.save()
+        self.assertEqual(get_scheduled_tasks().count(), 1)
+        self.assertEqual(
+            get_scheduled_tasks().get().clocked.clocked_time,
+            self.event.participation_pregeneration_timestamp,
+        )
+
+        # show unscheduling the event removes its task
+        self.event.state = Event.DRAFT
+        self.event.save()
+        self.assertFalse(get_scheduled_tasks().exists())
+        self.event.state = Event.PLANNED
+        self.event.save()
+        self.assertEqual(get_scheduled_tasks().count(), 1)
+
+        users = EventParticipation.pregenerated.get_users_to_pregenerate_for(self.event)
+        self.assertEqual(set(users), {self.student_1, self.student_2})
+        pregenerated = EventParticipation.pregenerated.pregenerate(
+            self.event, users.values_list("pk", flat=True)
+        )
+        self.assertEqual(len(pregenerated), 2)
+
+        # show unclaimed participations are excluded from the claimed ones, while
+        # the default manager still sees them, and their slots aren't seen yet
+        self.assertEqual(self.event.participations.claimed().count(), 0)
+        self.assertEqual(self.event.participations.count(), 2)
+        self.assertFalse(
+            EventParticipationSlot.objects.filter(
+                participation__event=self.event, seen_at__isnull=False
+            ).exists()
+        )
+        self.assertFalse(
+            EventParticipation.pregenerated.get_users_to_pregenerate_for(
+                self.event
+            ).exists()
+        )
+
+        self.event.state = Event.OPEN
+        self.event.save()
+
+        # show starting the exam claims the pre-generated participation
+        self.client.force_authenticate(user=self.student_1)
+        response = self.client.post(
+            f"/courses/{self.course.pk}/events/{self.event.pk}/participations/"
+        )
+        self.assertEqual(response.status_code, 200)
+        claimed = [p for p in pregenerated if p.user == self.student_1][0]
+        self.assertEqual(response.data["id"], claimed.pk)
+
+        claimed.refresh_from_db()
+        self.assertTrue(claimed.claimed)
+        self.assertIsNotNone(claimed.slots.base_slots().get(slot_number=0).seen_at)
+        self.assertEqual(self.event.participations.claimed().count(), 1)
+        self.assertEqual(
+            EventParticipation.pregenerated.filter(event=self.event).count(), 1
+        )
+
+        # show unclaimed participations are discarded when the event closes
+        self.event.state = Event.CLOSED
+        self.event.save()
+        self.assertFalse(
+            EventParticipation.pregenerated.filter(event=self.event).exists()
+        )
+        self.assertEqual(self.event.participations.count(), 1)
+        self.assertEqual(self.event.participations.claimed().count(), 1)
+
+    def test_participation_report(self):
+        participation_1 = EventParticipation.objects.create(
+            event_id=self.event.pk, user=self.student_1
+        )
+        participation_2 = EventParticipation.objects.create(
+            event_id=self.event.pk, user=self.student_2
+        )
+        participation_2.score = "7.5"
+        participation_2.save()
+
+        self.client.force_authenticate(user=self.teacher_1)
+        url = f"/courses/{self.course.pk}/participation_report/"
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            {
+                self.event.id.hashid: [
+                    {
+                        "id": participation_1.pk,
+                        "user": self.student_1.pk,
+                        "score": participation_1.score,
+                    },
+                    {
+                        "id": participation_2.pk,
+                        "user": self.student_2.pk,
+                        "score": "7.5",
+                    },
+                ]
+            },
+        )
+
+        # show the report can be streamed as csv and ndjson
+        response = self.client.get(url, {"report_format": "csv"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "exam,id,user,score")
+        self.assertEqual(
+            lines[2],
+            f"{self.event.id.hashid},{participation_2.pk},{self.student_2.pk},7.5",
+        )
+
+        response = self.client.get(url, {"report_format": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            rows[0],
+            {
+                "exam": self.event.id.hashid,
+                "id": participation_1.pk,
+                "user": self.student_1.pk,
+                "score": participation_1.score,
+            },
+        )
+        self.assertEqual(len(rows), 2)
+
+        # show participations invalidated after their scores have been refreshed
+        # are assessed while building the report instead of having no score
+        def refresh_then_invalidate(exams):
+            refresh_stale_participation_scores(exams)
+            participation_1.slots.base_slots().first().invalidate_score()
+
+        with patch(
+            "courses.logic.participation_reports.refresh_stale_participation_scores",
+            side_effect=refresh_then_invalidate,
+        ):
+            rows = list(get_participation_report_rows(self.course))
+        self.assertEqual(rows[0].score, participation_1.score)
+        self.assertTrue(
+            EventParticipation.objects.get(
+                pk=participation_1.pk
+            ).is_computed_score_up_to_date
+        )
+
+        # show stale scores are refreshed in chunks
+        from data import users
+
+        participation_3 = EventParticipation.objects.create(
+            event_id=self.event.pk, user=User.objects.create(**users.student_3)
+        )
+        EventParticipation.objects.filter(event_id=self.event.pk).update(
+            _computed_score_version=None
+        )
+        with patch("courses.logic.participation_reports.REPORT_CHUNK_SIZE", 1), patch(
+            "courses.logic.participation_reports.EventBatchAssessor",
+            wraps=EventBatchAssessor,
+        ) as assessor_class:
+            rows = list(get_participation_report_rows(self.course))
+        self.assertEqual(
+            [
+                call.kwargs["participation_ids"]
+                for call in assessor_class.call_args_list
+            ],
+            [[participation_1.pk], [participation_3.pk]],
+        )
+        self.assertEqual(
+            [(row.id, row.score) for row in rows],
+            [
+                (participation_1.pk, participation_1.score),
+                (participation_2.pk, "7.5"),
+                (participation_3.pk, participation_3.score),
+            ],
+        )
+
+    def test_event_statistics(self):
+        EventTemplateRule.objects.filter(template=self.event.template).update(weight=2)
+        correct_choice = self.exercise_2.choices.get(correctness=1)
+        incorrect_choice = self.exercise_2.choices.get(correctness=0)
+
+        participations = [
+            EventParticipation.objects.create(event_id=self.event.pk, user=user)
+            for user in (self.student_1, self.student_2)
+        ]
+        for participation, choice in zip(
+            participations, (correct_choice, incorrect_choice)
+        ):
+            slot = participation.slots.get(exercise=self.exercise_2)
+            slot.selected_choices.set([choice])
+
+        url = f"/courses/{self.course.pk}/events/{self.event.pk}/statistics/"
+
+        # show only teachers can access statistics
+        self.client.force_authenticate(user=self.student_1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(user=self.teacher_1)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["participation_count"], 2)
+
+        exercise_statistics = [
+            e for e in response.data["exercises"] if e["exercise"] == self.exercise_2.pk
+        ][0]
+        self.assertEqual(exercise_statistics["slot_count"], 2)
+        self.assertEqual(exercise_statistics["mean_score"], 1)
+        self.assertEqual(exercise_statistics["difficulty"], 0.5)
+        # the participant who answered correctly has the higher total score
+        self.assertEqual(exercise_statistics["discrimination"], 1)
+        self.assertEqual(
+            {c["choice"]: c["count"] for c in exercise_statistics["choices"]},
+            {correct_choice.pk: 1, incorrect_choice.pk: 1},
+        )
+
+        # show statistics are recomputed when the assessment changes
+        slot = participations[1].slots.get(exercise=self.exercise_2)
+        slot.selected_choices.set([correct_choice])
+        response = self.client.get(url)
+        exercise_statistics = [
+            e for e in response.data["exercises"] if e["exercise"] == self.exercise_2.pk
+        ][0]
+        self.assertEqual(exercise_statistics["difficulty"], 1)
+
+    def test_participations_exercises_by_reference(self):
+        from data import exercises as exercise_data
+
+        cloze = Exercise.objects.create(course=self.course, **exercise_data.cloze_prv_1)
+        rule = EventTemplateRule.objects.create(
+            template=self.event.template, rule_type=EventTemplateRule.ID_BASED
+        )
+        rule.exercises.set([cloze])
+        sub_exercise_ids = set(cloze.sub_exercises.values_list("pk", flat=True))
+        self.assertTrue(sub_exercise_ids)
+
+        participations = [
+            EventParticipation.objects.create(event_id=self.event.pk, user=user)
+            for user in (self.student_1, self.student_2)
+        ]
+
+        self.client.force_authenticate(user=self.teacher_1)
+        url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/"
+        response = self.client.get(url, {"exercises_by_reference": True})
+        self.assertEqual(response.status_code, 200)
+
+        # show slots only reference their exercise
+        self.assertEqual(len(response.data["participations"]), 2)
+        for participation in response.data["participations"]:
+            for slot in participation["slots"]:
+                self.assertIn(
+                    slot["exercise"], (self.exercise_1.pk, self.exercise_2.pk, cloze.pk)
+                )
+                self.assertIn("sub_slots", slot)
+
+        # show each exercise is serialized once, including the sub-exercises
+        # that sub-slots reference
+        exercises = response.data["exercises"]
+        self.assertEqual(
+            set(exercises.keys()),
+            {self.exercise_1.pk, self.exercise_2.pk, cloze.pk} | sub_exercise_ids,
+        )
+        for participation in response.data["participations"]:
+            for slot in participation["slots"]:
+                for sub_slot in slot["sub_slots"]:
+                    self.assertIn(sub_slot["exercise"], exercises)
+
+        # show the side-loaded exercises are the same as the nested ones
+        nested_response = self.client.get(url, {"include_details": True})
+        for slot in nested_response.data[0]["slots"]:
+            self.assertEqual(slot["exercise"], exercises[slot["exercise"]["id"]])
+        self.assertEqual(
+            participations[0].slots.base_slots().count(),
+            len(response.data["participations"][0]["slots"]),
+        )
+
+    def create_participations_of_different_sizes(self):
+        self.event.state = Event.OPEN
+        self.event.save()
+        short_participation = EventParticipation.objects.create(
+            event_id=self.event.pk, user=self.student_1
+        )
+
+        for i in range(10):
+            rule = EventTemplateRule.objects.create(
+                template=self.event.template, rule_type=EventTemplateRule.ID_BASED
+            )
+            rule.exercises.set(
+                [
+                    Exercise.objects.create(
+                        course=self.course,
+                        text=f"exercise {i}",
+                        exercise_type=Exercise.OPEN_ANSWER,
+                        state=Exercise.PRIVATE,
+                    )
+                ]
+            )
+        long_participation = EventParticipation.objects.create(
+            event_id=self.event.pk, user=self.student_2
+        )
+        self.assertEqual(short_participation.base_slot_count, 2)
+        self.assertEqual(long_participation.base_slot_count, 12)
+        # persist the max scores of the exercises, which are otherwise
+        # computed by the first request that serializes them
+        for exercise in Exercise.objects.all():
+            exercise.get_max_score()
+        # warm the cached set of enrolled users, shared by all the participants
+        get_enrolled_user_ids(Course.objects.get(pk=self.course.pk))
+
+        return short_participation, long_participation
+
+    def test_cursor_moves_dont_depend_on_participation_size(self):
+        (
+            short_participation,
+            long_participation,
+        ) = self.create_participations_of_different_sizes()
+
+        # show moving the cursor runs the same queries regardless of
+        # the number of slots of the participation
+        for participation in (short_participation, long_participation):
+            self.client.force_authenticate(user=participation.user)
+            url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{participation.pk}/"
+            with self.assertNumQueries(15):
+                response = self.client.post(url + "go_forward/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["exercise"]["id"], self.exercise_2.pk)
+            self.assertEqual(
+                response.data["is_last"], participation is short_participation
+            )
+            self.assertIsNotNone(
+                participation.slots.base_slots().get(slot_number=1).seen_at
+            )
+
+            with self.assertNumQueries(12):
+                response = self.client.post(url + "go_back/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["exercise"]["id"], self.exercise_1.pk)
+
+        # show the cursor can't be moved past the last slot
+        self.client.force_authenticate(user=self.student_1)
+        url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{short_participation.pk}/"
+        response = self.client.post(url + "go_forward/")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(url + "go_forward/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_cursor_moves_are_idempotent(self):
+        _, participation = self.create_participations_of_different_sizes()
+        self.client.force_authenticate(user=participation.user)
+        url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{participation.pk}/"
+
+        # show repeating a move from the same cursor position doesn't
+        # move the cursor again
+        for _ in range(2):
+            response = self.client.post(url + "go_forward/", {"cursor": 0})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["exercise"]["id"], self.exercise_2.pk)
+        participation.refresh_from_db()
+        self.assertEqual(participation.current_slot_cursor, 1)
+
+        for _ in range(2):
+            response = self.client.post(url + "go_back/", {"cursor": 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["exercise"]["id"], self.exercise_1.pk)
+        participation.refresh_from_db()
+        self.assertEqual(participation.current_slot_cursor, 0)
+
+        response = self.client.post(url + "go_forward/", {"cursor": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+        # show a move that races with another one leaves the cursor where
+        # the first one moved it instead of failing
+        first = EventParticipation.objects.get(pk=participation.pk)
+        second = EventParticipation.objects.get(pk=participation.pk)
+        self.assertEqual(first.move_current_slot_cursor_forward(), 1)
+        self.assertEqual(second.move_current_slot_cursor_forward(), 1)
+        participation.refresh_from_db()
+        self.assertEqual(participation.current_slot_cursor, 1)
+
+    def test_slot_scope_checks_dont_depend_on_participation_size(self):
+        (
+            short_participation,
+            long_participation,
+        ) = self.create_participations_of_different_sizes()
+
+        # show updating a submission runs the same queries regardless of
+        # the number of slots of the participation
+        for participation in (short_participation, long_participation):
+            self.client.force_authenticate(user=participation.user)
+            url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{participation.pk}/slots/"
+            current_slot = participation.slots.base_slots().get(slot_number=0)
+            choice = self.exercise_1.choices.first()
+            with self.assertNumQueries(16):
+                response = self.client.patch(
+                    url + f"{current_slot.pk}/patch_submission/",
+                    {"selected_choices": [choice.pk]},
+                )
+            self.assertEqual(response.status_code, 200)
+
+            # show slots outside of the window are out of scope
+            next_slot = participation.slots.base_slots().get(slot_number=1)
+            response = self.client.patch(
+                url + f"{next_slot.pk}/patch_submission/",
+                {"selected_choices": [self.exercise_2.choices.first().pk]},
+            )
+            self.assertEqual(response.status_code, 403)
+
+    def test_submissions_record_when_slots_are_answered(self):
+        (
+            short_participation,
+            long_participation,
+        ) = self.create_participations_of_different_sizes()
+        # show all the slots at once
+        Event.objects.filter(pk=self.event.pk).update(exercises_shown_at_a_time=None)
+        self.client.force_authenticate(user=self.student_2)
+        url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{long_participation.pk}/slots/"
+
+        # show answering by selecting choices records when the slot is answered
+        slot = long_participation.slots.base_slots().get(slot_number=0)
+        response = self.client.patch(
+            url + f"{slot.pk}/patch_submission/",
+            {"selected_choices": [self.exercise_1.choices.first().pk]},
+        )
+        self.assertEqual(response.status_code, 200)
+        slot.refresh_from_db()
+        answered_at = slot.answered_at
+        self.assertIsNotNone(answered_at)
+
+        # show the time of the first answer is kept, and replacing the choices
+        # invalidates the score of the slot and of the participation once
+        score_version = slot._score_version
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                url + f"{slot.pk}/patch_submission/",
+                {"selected_choices": [self.exercise_1.choices.last().pk]},
+            )
+        self.assertEqual(response.status_code, 200)
+        slot.refresh_from_db()
+        self.assertEqual(slot.answered_at, answered_at)
+        self.assertEqual(slot._score_version, score_version + 1)
+        self.assertEqual(
+            len(
+                [
+                    q
+                    for q in context.captured_queries
+                    if q["sql"].startswith('UPDATE "courses_eventparticipationslot"')
+                ]
+            ),
+            1,
+        )
+        self.assertEqual(
+            len(
+                [
+                    q
+                    for q in context.captured_queries
+                    if q["sql"].startswith('UPDATE "courses_eventparticipation"')
+                ]
+            ),
+            1,
+        )
+
+        # show an answer text is recorded with a single write to the slot,
+        # only once an actual answer has been given
+        slot = long_participation.slots.base_slots().get(slot_number=5)
+        response = self.client.patch(
+            url + f"{slot.pk}/patch_submission/", {"answer_text": ""}
+        )
+        self.assertEqual(response.status_code, 200)
+        slot.refresh_from_db()
+        self.assertIsNone(slot.answered_at)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                url + f"{slot.pk}/patch_submission/", {"answer_text": "abc"}
+            )
+        self.assertEqual(response.status_code, 200)
+        slot_writes = [
+            q
+            for q in context.captured_queries
+            if q["sql"].startswith('UPDATE "courses_eventparticipationslot" SET')
+            and '"answer_text"' in q["sql"]
+        ]
+        self.assertEqual(len(slot_writes), 1)
+        self.assertIn('"answered_at"', slot_writes[0]["sql"])
+        self.assertIn('"_score_version"', slot_writes[0]["sql"])
+        self.assertEqual(
+            len(
+                [
+                    q
+                    for q in context.captured_queries
+                    if q["sql"].startswith('UPDATE "courses_eventparticipationslot"')
+                ]
+            ),
+            1,
+        )
+        slot.refresh_from_db()
+        self.assertIsNotNone(slot.answered_at)
+
+    def test_submission_batches(self):
+        (
+            short_participation,
+            long_participation,
+        ) = self.create_participations_of_different_sizes()
+        self.client.force_authenticate(user=self.student_2)
+        url = f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{long_participation.pk}/patch_submissions/"
+        slot = long_participation.slots.base_slots().get(slot_number=0)
+        out_of_scope_slot = long_participation.slots.base_slots().get(slot_number=5)
+        choice_1, choice_2 = self.exercise_1.choices.all()[:2]
+
+        # show updates are applied in order of sequence number, and updates
+        # to slots outside of the window are dropped
+        with self.assertNumQueries(17):
+            response = self.client.patch(
+                url,
+                [
+                    {"slot": slot.pk, "seq": 1, "selected_choices": [choice_1.pk]},
+                    {"slot": slot.pk, "seq": 3, "answer_text": "new"},
+                    {"slot": slot.pk, "seq": 2, "answer_text": "old"},
+                    {"slot": out_of_scope_slot.pk, "seq": 4, "answer_text": "abc"},
+                ],
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"applied": 3, "stale": 0, "out_of_scope": 1})
+        slot.refresh_from_db()
+        self.assertEqual(slot.answer_text, "new")
+        self.assertEqual(list(slot.selected_choices.all()), [choice_1])
+        self.assertEqual(slot.submission_sequence, 3)
+        self.assertIsNotNone(slot.answered_at)
+        out_of_scope_slot.refresh_from_db()
+        self.assertEqual(out_of_scope_slot.answer_text, "")
+
+        # show stale replays are dropped
+        response = self.client.patch(
+            url,
+            [
+                {"slot": slot.pk, "seq": 2, "selected_choices": [choice_2.pk]},
+                {"slot": slot.pk, "seq": 3, "answer_text": "replayed"},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"applied": 0, "stale": 2, "out_of_scope": 0})
+        slot.refresh_from_db()
+        self.assertEqual(slot.answer_text, "new")
+        self.assertEqual(list(slot.selected_choices.all()), [choice_1])
+
+        # show choices of other exercises, slots of other participations, and
+        # sequence numbers that can't be stored are rejected, and nothing is applied
+        for update in (
+            {"slot": slot.pk, "seq": 2**63, "answer_text": "abc"},
+            {"slot": slot.pk, "selected_choices": [self.exercise_2.choices.first().pk]},
+            {
+                "slot": short_participation.slots.base_slots()[0].pk,
+                "answer_text": "abc",
+            },
+        ):
+            response = self.client.patch(
+                url,
+                [{"slot": slot.pk, "seq": 5, "answer_text": "abc"}, update],
+                format="json",
+            )
+            self.assertEqual(response.status_code, 400)
+        slot.refresh_from_db()
+        self.assertEqual(slot.answer_text, "new")
+
+        # show users can't update the submissions of others' participations
+        self.client.force_authenticate(user=self.student_1)
+        response = self.client.patch(
+            url, [{"slot": slot.pk, "answer_text": "abc"}], format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(SUBMISSION_WRITE_BEHIND=True)
+    def test_buffered_submissions(self):
+        (
+            short_participation,
+            long_participation,
+        ) = self.create_participations_of_different_sizes()
+        choice_1, choice_2 = self.exercise_1.choices.all()[:2]
+
+        def get_url(participation):
+            return f"/courses/{self.course.pk}/events/{self.event.pk}/participations/{participation.pk}/"
+
+        def get_slot(participation):
+            return participation.slots.base_slots().get(slot_number=0)
+
+        # show submissions are buffered and coalesced instead of being saved
+        self.client.force_authenticate(user=self.student_1)
+        slot = get_slot(short_participation)
+        slot_url = get_url(short_participation) + f"slots/{slot.pk}/"
+        # no writes to the database happen, only the reads needed for validation
+        with self.assertNumQueries(10):
+            response = self.client.patch(
+                slot_url + "patch_submission/", {"selected_choices": [choice_1.pk]}
+            )
+        self.assertEqual(response.status_code, 200)
+        for data in ({"answer_text": "abc"}, {"selected_choices": [choice_2.pk]}):
+            response = self.client.patch(slot_url + "patch_submission/", data)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["selected_choices"], [choice_2.pk])
+        self.assertEqual(response.data["answer_text"], "abc")
+
+        slot.refresh_from_db()
+        self.assertEqual(slot.answer_text, "")
+        self.assertFalse(slot.selected_choices.exists())
+        self.assertIsNone(slot.answered_at)
+        score_version = slot._score_version
+
+        # show buffered submissions aren't flushed by requests of users that
+        # can't access the participation
+        self.client.force_authenticate(user=self.student_2)
+        response = self.client.get(slot_url)
+        self.assertEqual(response.status_code, 403)
+        slot.refresh_from_db()
+        self.assertEqual(slot.answer_text, "")
+        self.client.force_authenticate(user=self.student_1)
+
+        # show users read their own writes
+        response = self.client.get(slot_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["selected_choices"], [choice_2.pk])
+        self.assertEqual(response.data["answer_text"], "abc")
+
+        slot.refresh_from_db()
+        self.assertEqual(slot.answer_text, "abc")
+        self.assertEqual(list(slot.selected_choices.all()), [choice_2])
+        self.assertIsNotNone(slot.answered_at)
+        self.assertGreater(slot._score_version, score_version)
+
+        # show buffered submissions are persisted periodically
+        self.client.force_authenticate(user=self.student_2)
+        slot = get_slot(long_participation)
+        response = self.client.patch(
+            get_url(long_participation) + f"slots/{slot.pk}/patch_submission/",
+            {"selected_choices": [choice_1.pk]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(slot.selected_choices.exists())
+        # a failed flush is retried by the next one
+        with patch(
+            "courses.logic.submissions.persist_submissions",
+            side_effect=RuntimeError,
+        ):
+            with self.assertRaises(RuntimeError):
+                flush_all_buffered_submissions()
+        self.assertFalse(slot.selected_choices.exists())
+        self.assertEqual(flush_all_buffered_submissions(), 1)
+        self.assertEqual(list(slot.selected_choices.all()), [choice_1])
+        self.assertEqual(flush_all_buffered_submissions(), 0)
+
+        # show buffered submissions are persisted when turning in
+        response = self.client.patch(
+            get_url(long_participation) + f"slots/{slot.pk}/patch_submission/",
+            {"selected_choices": [choice_2.pk]},
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(
+            get_url(long_participation),
+            {"state": EventParticipation.TURNED_IN},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(slot.selected_choices.all()), [choice_2])
+
     def test_view_queryset(self):
         # show that, for each event, you can only access that events's
         # participations from the events's endpoint
@@ -1702,6 +2400,80 @@ class CoursePrivilegeTestCase(BaseTestCase):
         )
         self.assertEqual(response.status_code, 400)
 
+    def test_cached_privileges(self):
+        def get_course():
+            return Course.objects.get(pk=self.course.pk)
+
+        self.assertEqual(get_user_privileges(self.teacher_2, get_course()), [])
+
+        # show privileges are cached
+        course = get_course()
+        get_user_privileges(self.teacher_2, course)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_privileges(self.teacher_2, course), [])
+
+        # show cached privileges are invalidated by changes to per-user
+        # privileges, roles, role memberships, and the course creator
+        UserCoursePrivilege.objects.create(
+            user=self.teacher_2,
+            course=self.course,
+            allow_privileges=[privileges.MANAGE_EVENTS],
+        )
+        self.assertEqual(
+            get_user_privileges(self.teacher_2, get_course()),
+            [privileges.MANAGE_EVENTS],
+        )
+
+        role = CourseRole.objects.create(
+            course=self.course,
+            name="role",
+            allow_privileges=[privileges.UPDATE_COURSE],
+        )
+        self.teacher_2.roles.add(role)
+        self.assertEqual(
+            get_user_privileges(self.teacher_2, get_course()),
+            [privileges.UPDATE_COURSE, privileges.MANAGE_EVENTS],
+        )
+        role.allow_privileges = [privileges.ASSESS_PARTICIPATIONS]
+        role.save()
+        self.assertEqual(
+            get_user_privileges(self.teacher_2, get_course()),
+            [privileges.ASSESS_PARTICIPATIONS, privileges.MANAGE_EVENTS],
+        )
+
+        self.teacher_2.roles.clear()
+        self.assertEqual(
+            get_user_privileges(self.teacher_2, get_course()),
+            [privileges.MANAGE_EVENTS],
+        )
+        role.users.add(self.teacher_2)
+        self.assertEqual(
+            get_user_privileges(self.teacher_2, get_course()),
+            [privileges.ASSESS_PARTICIPATIONS, privileges.MANAGE_EVENTS],
+        )
+
+        course = get_course()
+        course.creator = self.teacher_2
+        course.save()
+        self.assertEqual(
+            get_user_privileges(self.teacher_2, get_course()),
+            privileges.TEACHER_PRIVILEGES,
+        )
+        self.assertEqual(get_user_privileges(self.teacher_1, get_course()), [])
+
+        # show privileges of many users are resolved in two queries
+        invalidate_user_privileges(self.course.pk)
+        course = get_course()
+        users = [self.teacher_1, self.teacher_2, self.student_1]
+        with self.assertNumQueries(2):
+            privileges_by_user = get_privileges_by_user(users, course)
+        self.assertEqual(
+            privileges_by_user,
+            {user.pk: get_user_privileges(user, course) for user in users},
+        )
+        with self.assertNumQueries(0):
+            get_privileges_by_user(users, course)
+
     def test_course_enrollments_endpoint(self):
         from data import users
 
@@ -1796,6 +2568,60 @@ class CoursePrivilegeTestCase(BaseTestCase):
         self.assertEqual(response.status_code, 204)
         self.assertFalse(student_2 in self.course.enrolled_users.all())
 
+    def test_cached_enrollments(self):
+        def get_course():
+            return Course.objects.get(pk=self.course.pk)
+
+        def is_enrolled_with_warm_cache(user):
+            course = get_course()
+            get_enrolled_user_ids(course)
+            return is_user_enrolled(user, course)
+
+        # show single enrollment checks run an EXISTS query without loading
+        # the set of the enrolled users
+        course = get_course()
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(is_user_enrolled(self.student_1, course))
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn("LIMIT 1", context.captured_queries[0]["sql"])
+
+        # show enrollment checks are answered from the cache once it's warm
+        get_enrolled_user_ids(course)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_user_enrolled(self.student_1, course))
+            self.assertFalse(is_user_enrolled(self.teacher_2, course))
+
+        # show the cache is invalidated when users are enrolled or unenrolled,
+        # both through the course and by creating or deleting enrollments
+        self.course.enroll_users([self.teacher_2.pk])
+        self.assertTrue(is_enrolled_with_warm_cache(self.teacher_2))
+        self.course.unenroll_users([self.teacher_2.pk])
+        self.assertFalse(is_enrolled_with_warm_cache(self.teacher_2))
+
+        enrollment = UserCourseEnrollment.objects.create(
+            user=self.teacher_2, course=self.course
+        )
+        self.assertTrue(is_enrolled_with_warm_cache(self.teacher_2))
+        self.assertTrue(is_user_enrolled(self.teacher_2, get_course()))
+        enrollment.delete()
+        self.assertFalse(is_enrolled_with_warm_cache(self.teacher_2))
+        self.assertFalse(is_user_enrolled(self.teacher_2, get_course()))
+
+        # show the course list reports the requesting user's enrollments and
+        # bookmarks without loading the enrolled and bookmarking users
+        other_course = Course.objects.create(name="other_course")
+        other_course.bookmarked_by.add(self.student_1)
+        self.client.force_authenticate(self.student_1)
+        response = self.client.get("/courses/")
+        self.assertEqual(response.status_code, 200)
+        flags = {
+            course["id"]: (course["enrolled"], course["bookmarked"])
+            for course in response.data
+        }
+        self.assertEqual(
+            flags, {self.course.pk: (True, False), other_course.pk: (False, True)}
+        )
+
 
 class BulkActionsMixinsTestCase(BaseTestCase):
     def setUp(self):
@@ -5,10 +5,19 @@ from rest_framework import filters, mixins, status, viewsets
 from courses.abstract_models import LockableModel
 
 from courses.logic.privileges import get_user_privileges
+from courses.logic.request_cache import (
+    clear_request_cache,
+    get_or_resolve,
+    get_request_scoped_object,
+)
+from courses.logic.submission_buffer import (
+    flush_buffered_submissions,
+    is_write_behind_enabled,
+)
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from courses.models import Course
+from courses.models import Course, EventParticipation
 
 
 class LockableModelViewSetMixin:
@@ -40,15 +49,88 @@ class LockableModelViewSetMixin:
         return Response(status=status_code)
 
 
+class DiscardPregeneratedParticipationsMixin:
+    """
+    For viewsets nested under an event template: participations pre-generated
+    for the template's event are discarded when the template rules are edited,
+    as they might no longer satisfy them
+    """
+
+    def discard_pregenerated_participations(self):
+        EventParticipation.pregenerated.filter(
+            event__template_id=self.kwargs["template_pk"]
+        ).delete()
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.discard_pregenerated_participations()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.discard_pregenerated_participations()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.discard_pregenerated_participations()
+
+
 class RequestingUserPrivilegesMixin:
     @cached_property
     def user_privileges(self):
-        return get_user_privileges(
-            self.request.user,
-            self.kwargs["course_pk"],
+        try:
+            course = get_request_scoped_object(
+                self.request, Course, self.kwargs["course_pk"]
+            )
+        except (ValueError, Course.DoesNotExist):
+            return []
+        return get_user_privileges(self.request.user, course)
+
+
+class RequestScopedObjectMixin:
+    """
+    Caches the object returned by `get_object` for the rest of the request, so
+    that it's only fetched once even though it's accessed by the conditions of
+    the access policy, by the serializer context, and by the action itself
+    """
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return get_or_resolve(
+            self.request,
+            (type(self), "get_object", self.kwargs[lookup_url_kwarg]),
+            super().get_object,
         )
 
 
+class FlushBufferedSubmissionsMixin:
+    """
+    When submissions are buffered (see courses.logic.submission_buffer),
+    persists the buffered submissions to the participation being accessed
+    before handling the request, so that users read their own writes and
+    actions operate on the latest submissions
+    """
+
+    # name of the url kwarg that contains the id of the participation
+    participation_url_kwarg = "pk"
+    # actions that write to the buffer instead of reading from the database
+    buffering_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        # only flush once the user has been authenticated and allowed to
+        # access the participation by the permission checks
+        super().initial(request, *args, **kwargs)
+        participation_id = self.kwargs.get(self.participation_url_kwarg)
+        if (
+            is_write_behind_enabled()
+            and participation_id is not None
+            and self.action not in self.buffering_actions
+            and flush_buffered_submissions([participation_id]) > 0
+        ):
+            # the objects fetched by the permission checks don't reflect
+            # the submissions that have just been persisted
+            clear_request_cache(request)
+
+
 class RestrictedListMixin:
     def restricted_list(self, qs):
         serializer = self.get_serializer_class()(
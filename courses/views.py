@@ -2,8 +2,10 @@ import os
 
 from coding.helpers import get_code_execution_results, send_jobe_request
 from demo_mode.logic import is_demo_mode
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import IntegrityError
-from django.http import FileResponse, Http404
+from django.db.models import prefetch_related_objects
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, mixins, status, viewsets
@@ -19,7 +21,15 @@ from courses.filters import (
     ExerciseFilter,
     ExerciseSolutionFilter,
 )
+from courses.logic.enrollments import is_user_enrolled
 from courses.logic.event_instances import ExercisePicker
+from courses.logic.event_statistics import get_event_statistics
+from courses.logic.participation_reports import (
+    get_participation_report_as_dict,
+    get_participation_report_rows,
+    stream_participation_report_as_csv,
+    stream_participation_report_as_ndjson,
+)
 from courses.logic.presentation import (
     CHOICE_SHOW_SCORE_FIELDS,
     COURSE_SHOW_PUBLIC_EXERCISES_COUNT,
@@ -28,6 +38,7 @@ from courses.logic.presentation import (
     EVENT_PARTICIPATION_SHOW_SLOTS,
     EVENT_PARTICIPATION_SLOT_SHOW_DETAIL_FIELDS,
     EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE,
+    EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE_BY_REFERENCE,
     EVENT_PARTICIPATION_SLOT_SHOW_SUBMISSION_FIELDS,
     EVENT_SHOW_HIDDEN_FIELDS,
     EVENT_SHOW_PARTICIPATION_EXISTS,
@@ -44,6 +55,12 @@ from courses.logic.privileges import (
     MANAGE_EVENTS,
     MANAGE_EXERCISES,
 )
+from courses.logic.submission_buffer import (
+    buffer_submission,
+    flush_buffered_submissions,
+    is_write_behind_enabled,
+)
+from courses.logic.submissions import apply_submission_batch
 from courses.models import (
     Course,
     CourseRole,
@@ -73,7 +90,7 @@ from .serializers import (
     EventParticipationSerializer,
     EventParticipationSlotSerializer,
     EventParticipationSlotSubmissionSerializer,
-    EventParticipationSummarySerializer,
+    EventParticipationSlotSubmissionUpdateSerializer,
     EventSerializer,
     EventTemplateRuleClauseSerializer,
     EventTemplateRuleSerializer,
@@ -93,8 +110,11 @@ from .view_mixins import (
     BulkCreateMixin,
     BulkGetMixin,
     BulkPatchMixin,
+    DiscardPregeneratedParticipationsMixin,
+    FlushBufferedSubmissionsMixin,
     LockableModelViewSetMixin,
     RequestingUserPrivilegesMixin,
+    RequestScopedObjectMixin,
     RestrictedListMixin,
     ScopeQuerySetByCourseMixin,
 )
@@ -115,7 +135,6 @@ class CourseViewSet(viewsets.ModelViewSet):
             # "roles__users",
             # "privileged_users",
             # "privileged_users__user",
-            "bookmarked_by",
         )
     )
     permission_classes = [policies.CoursePolicy]
@@ -136,6 +155,8 @@ class CourseViewSet(viewsets.ModelViewSet):
         if not self.request.user.is_teacher:
             qs = qs.public()
 
+        qs = qs.with_enrollment_flags(self.request.user)
+
         # TODO review prefetching - previously we were prefetching for only requesting user, now what?
         # qs = qs.prefetch_related(
         #     Prefetch(
@@ -190,14 +211,14 @@ class CourseViewSet(viewsets.ModelViewSet):
         user_id = request.user.pk
 
         if request.method == "PUT":
-            if request.user in course.enrolled_users.all():
+            if is_user_enrolled(request.user, course):
                 return Response(
                     status=status.HTTP_400_BAD_REQUEST,
                     data={"detail": "ALREADY_ENROLLED"},
                 )
             course.enroll_users([user_id], bulk=False)
         else:
-            if request.user not in course.enrolled_users.all():
+            if not is_user_enrolled(request.user, course):
                 return Response(
                     status=status.HTTP_400_BAD_REQUEST,
                     data={"detail": "NOT_ENROLLED"},
@@ -348,40 +369,34 @@ class CourseViewSet(viewsets.ModelViewSet):
     def participation_report(self, request, **kwargs):
         """
         Returns a report mapping all closed exams to the list of participations, showing
-        the participant user id, the participation id, and the score obtained
+        the participant user id, the participation id, and the score obtained.
+
+        With `report_format=csv` or `report_format=ndjson`, the report is instead
+        streamed as one row per participation
         """
         course = self.get_object()
-        exams = (
-            course.events.all()
-            .filter(event_type=Event.EXAM)
-            .values_list("id", flat=True)
-        )
-
-        report = {
-            e.hashid: EventParticipationSummarySerializer(
-                EventParticipation.objects.filter(event_id=e)
-                .with_prefetched_base_slots()
-                .select_related("event"),
-                many=True,
-            ).data
-            for e in exams
-        }
-
-        # TODO consider using this instead of the above for performance reasons
-        # report = {
-        #     e.hashid: [
-        #         {
-        #             "id": p.pk,
-        #             "user": p.user_id,
-        #             "score": p.score,
-        #         }
-        #         for p in EventParticipation.objects.filter(event_id=e)
-        #         .with_prefetched_base_slots()
-        #         .select_related("event")
-        #     ]
-        #     for e in exams
-        # }
+        report_format = request.query_params.get("report_format", "json")
+
+        if report_format == "csv":
+            response = StreamingHttpResponse(
+                stream_participation_report_as_csv(
+                    get_participation_report_rows(course)
+                ),
+                content_type="text/csv",
+            )
+            response[
+                "Content-Disposition"
+            ] = f'attachment; filename="participation_report_{course.pk}.csv"'
+            return response
+        if report_format == "ndjson":
+            return StreamingHttpResponse(
+                stream_participation_report_as_ndjson(
+                    get_participation_report_rows(course)
+                ),
+                content_type="application/x-ndjson",
+            )
 
+        report = get_participation_report_as_dict(course)
         return Response(report, status=status.HTTP_200_OK)
 
     # TODO extract query logic
@@ -699,6 +714,9 @@ class ExerciseViewSet(
         exercise = self.get_object()
         # TODO this is temporary, find a more robust solution
         solutions = exercise.solutions.filter(state=ExerciseSolution.PUBLISHED)
+        # the test cases are the same for all the solutions, and their results
+        # are cached until either the solution or the test cases change
+        prefetch_related_objects([exercise], "testcases__attachments")
         res = {}
         for solution in solutions:
             res[solution.pk] = get_code_execution_results(
@@ -826,7 +844,10 @@ class TagViewSet(
 
 
 class EventViewSet(
-    ScopeQuerySetByCourseMixin, RequestingUserPrivilegesMixin, LockableModelViewSetMixin
+    RequestScopedObjectMixin,
+    ScopeQuerySetByCourseMixin,
+    RequestingUserPrivilegesMixin,
+    LockableModelViewSetMixin,
 ):
     serializer_class = EventSerializer
     queryset = (
@@ -893,6 +914,13 @@ class EventViewSet(
 
         return Response(data)
 
+    @action(methods=["get"], detail=True)
+    def statistics(self, request, **kwargs):
+        """
+        Returns item analysis statistics for the exercises of the event
+        """
+        return Response(get_event_statistics(self.get_object()))
+
 
 # TODO disallow actions and make read-only
 class EventTemplateViewSet(ScopeQuerySetByCourseMixin):
@@ -907,7 +935,11 @@ class EventTemplateViewSet(ScopeQuerySetByCourseMixin):
         )
 
 
-class EventTemplateRuleViewSet(viewsets.ModelViewSet, RequestingUserPrivilegesMixin):
+class EventTemplateRuleViewSet(
+    DiscardPregeneratedParticipationsMixin,
+    viewsets.ModelViewSet,
+    RequestingUserPrivilegesMixin,
+):
     serializer_class = EventTemplateRuleSerializer
     queryset = EventTemplateRule.objects.all()
     permission_classes = [policies.EventTemplatePolicy]
@@ -934,9 +966,12 @@ class EventTemplateRuleViewSet(viewsets.ModelViewSet, RequestingUserPrivilegesMi
                 not in self.user_privileges
             ),
         )
+        self.discard_pregenerated_participations()
 
 
-class EventTemplateRuleClauseViewSet(viewsets.ModelViewSet):
+class EventTemplateRuleClauseViewSet(
+    DiscardPregeneratedParticipationsMixin, viewsets.ModelViewSet
+):
     serializer_class = EventTemplateRuleClauseSerializer
     queryset = EventTemplateRuleClause.objects.all()
     permission_classes = [policies.EventTemplatePolicy]
@@ -949,9 +984,12 @@ class EventTemplateRuleClauseViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(rule_id=self.kwargs["rule_pk"])
+        self.discard_pregenerated_participations()
 
 
 class EventParticipationViewSet(
+    FlushBufferedSubmissionsMixin,
+    RequestScopedObjectMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -973,13 +1011,12 @@ class EventParticipationViewSet(
     """
 
     queryset = (
-        EventParticipation.objects.all()
+        EventParticipation.objects.claimed()
         .select_related(
             "user",
             "event",
         )
         .order_by("-begin_timestamp")
-        .with_prefetched_base_slots()
         # .select_related("event__course__googleclassroomcoursetwin")
     )
     permission_classes = [policies.EventParticipationPolicy]
@@ -1004,11 +1041,20 @@ class EventParticipationViewSet(
 
         # show "computationally expensive" fields only if accessing a single
         # participation or explicitly requesting them in query params
-        if self.action != "list" or "include_details" in self.request.query_params:
+        if (
+            self.action != "list"
+            or "include_details" in self.request.query_params
+            or self.exercises_by_reference
+        ):
             context[EVENT_PARTICIPATION_SLOT_SHOW_DETAIL_FIELDS] = True
             context[EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE] = True
             context[EVENT_PARTICIPATION_SLOT_SHOW_SUBMISSION_FIELDS] = True
 
+        # slots only reference their exercise, which is serialized separately
+        context[
+            EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE_BY_REFERENCE
+        ] = self.exercises_by_reference
+
         # downloading for csv, do processing on answer text
         if "for_csv" in self.request.query_params:
             context["trim_images_in_text"] = True
@@ -1062,8 +1108,27 @@ class EventParticipationViewSet(
             self._paginator = EventParticipationPagination()
         return super().paginator
 
+    @property
+    def exercises_by_reference(self):
+        """
+        When listing participations with `exercises_by_reference`, the slots
+        only contain the id of their exercise, and each exercise is serialized
+        once in a separate `exercises` map
+        """
+        return (
+            self.action == "list"
+            and "exercises_by_reference" in self.request.query_params
+        )
+
     def get_queryset(self):
         qs = super().get_queryset()
+        if self.exercises_by_reference:
+            qs = qs.with_prefetched_base_slot_references()
+        elif self.action not in ("go_forward", "go_back", "patch_submissions"):
+            # moving the cursor only needs the slots in the new window, and
+            # updating submissions the updated slots, which are fetched by
+            # the actions themselves
+            qs = qs.with_prefetched_base_slots()
         try:
             if self.kwargs.get("event_pk") is not None:
                 # accessing as a nested view of event viewset
@@ -1086,36 +1151,113 @@ class EventParticipationViewSet(
         except ValueError:
             raise Http404
 
+    def list(self, request, *args, **kwargs):
+        if not self.exercises_by_reference:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        participations = page if page is not None else list(queryset)
+        serializer = self.get_serializer(participations, many=True)
+
+        def get_slot_exercise_ids(slots):
+            # sub-slots reference their sub-exercise, which are side-loaded too
+            for slot in slots:
+                yield slot.exercise_id
+                yield from get_slot_exercise_ids(slot.sub_slots.all())
+
+        exercise_ids = {
+            exercise_id
+            for participation in participations
+            for exercise_id in get_slot_exercise_ids(
+                serializer.child.get_visible_slots(participation)
+            )
+        }
+        exercises = ExerciseSerializer(
+            Exercise.objects.filter(
+                pk__in=exercise_ids
+            ).with_prefetched_related_objects(),
+            many=True,
+            context=self.get_serializer_context(),
+        ).data
+        exercises_map = {exercise["id"]: exercise for exercise in exercises}
+
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+            response.data["exercises"] = exercises_map
+            return response
+        return Response({"participations": serializer.data, "exercises": exercises_map})
+
     def create(self, request, *args, **kwargs):
         # cannot use get_or_create because the custom manager won't be called
         try:
             participation = self.get_queryset().get(user=request.user)
         except EventParticipation.DoesNotExist:
-            try:
-                participation_pk = EventParticipation.objects.create(
-                    user=request.user, event_id=self.kwargs["event_pk"]
-                ).pk
-                participation = self.get_queryset().get(pk=participation_pk)
-            except IntegrityError:  # race condition detected
-                logger.error("race condition detected for user " + str(request.user))
-                return self.create(request, *args, **kwargs)
-            except Event.DoesNotExist:
-                return Response(status=status.HTTP_404_NOT_FOUND)
+            # claim the participation pre-generated for the user, if there is one
+            pregenerated_participation = EventParticipation.pregenerated.claim(
+                event_id=self.kwargs["event_pk"], user=request.user
+            )
+            if pregenerated_participation is not None:
+                participation = self.get_queryset().get(
+                    pk=pregenerated_participation.pk
+                )
+            else:
+                try:
+                    participation_pk = EventParticipation.objects.create(
+                        user=request.user, event_id=self.kwargs["event_pk"]
+                    ).pk
+                    participation = self.get_queryset().get(pk=participation_pk)
+                except IntegrityError:  # race condition detected
+                    logger.error(
+                        "race condition detected for user " + str(request.user)
+                    )
+                    return self.create(request, *args, **kwargs)
+                except Event.DoesNotExist:
+                    return Response(status=status.HTTP_404_NOT_FOUND)
 
         serializer = self.get_serializer_class()(
             participation, context=self.get_serializer_context()
         )
         return Response(serializer.data)
 
-    # TODO FIXME this action and go_back should NOT prefetch all the related objects to base slots
-    @action(detail=True, methods=["post"])
-    def go_forward(self, request, **kwargs):
-        # TODO make this idempotent (e.g. include the target slot number in request) or add a few seconds throttle
-        # participation = self.get_queryset().get(pk=kwargs["pk"])
+    def get_current_slot(self, participation):
+        """
+        Returns the first slot at the cursor of the given participation,
+        only fetching the slots in the current window instead of all the
+        slots of the participation
+        """
+        return (
+            participation.current_slots.order_by("slot_number")
+            .select_related("exercise", "populating_rule")
+            .prefetch_related("sub_slots", "selected_choices")[0]
+        )
+
+    def move_cursor(self, request, move):
+        """
+        Moves the cursor of the requested participation using the given method
+        and returns the first slot of the new window. Clients can send the
+        `cursor` they're moving from, which makes repeated requests idempotent
+        """
+        from_cursor = request.data.get("cursor")
+        if from_cursor is not None:
+            try:
+                from_cursor = int(from_cursor)
+            except (TypeError, ValueError):
+                return Response(
+                    status=status.HTTP_400_BAD_REQUEST,
+                    data={"detail": "INVALID_CURSOR"},
+                )
+
         participation = self.get_object()
-        participation.move_current_slot_cursor_forward()
+        try:
+            move(participation, from_cursor=from_cursor)
+        except DjangoValidationError as e:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"detail": e.messages},
+            )
 
-        current_slot = participation.current_slots[0]
+        current_slot = self.get_current_slot(participation)
         serializer = EventParticipationSlotSerializer(
             current_slot,
             context={
@@ -1127,27 +1269,38 @@ class EventParticipationViewSet(
         )
         return Response(serializer.data)
 
+    @action(detail=True, methods=["post"])
+    def go_forward(self, request, **kwargs):
+        return self.move_cursor(
+            request, EventParticipation.move_current_slot_cursor_forward
+        )
+
     @action(detail=True, methods=["post"])
     def go_back(self, request, **kwargs):
-        # TODO make this idempotent (e.g. include the target slot number in request)
-        # participation = self.get_queryset().get(pk=kwargs["pk"])
-        participation = self.get_object()
-        participation.move_current_slot_cursor_back()
+        return self.move_cursor(
+            request, EventParticipation.move_current_slot_cursor_back
+        )
 
-        current_slot = participation.current_slots[0]
-        serializer = EventParticipationSlotSerializer(
-            current_slot,
-            context={
-                EVENT_PARTICIPATION_SLOT_SHOW_DETAIL_FIELDS: True,
-                EVENT_PARTICIPATION_SLOT_SHOW_EXERCISE: True,
-                EVENT_PARTICIPATION_SLOT_SHOW_SUBMISSION_FIELDS: True,
-                **self.get_serializer_context(),
-            },
+    @action(detail=True, methods=["patch"])
+    def patch_submissions(self, request, **kwargs):
+        """
+        Endpoint for updating the submissions of many slots of the participation
+        at once, e.g. to replay the changes queued by a client while offline.
+        Updates can carry a sequence number, so that replays of updates older
+        than the ones already applied are dropped
+        """
+        participation = self.get_object()
+        serializer = EventParticipationSlotSubmissionUpdateSerializer(
+            data=request.data, many=True
         )
-        return Response(serializer.data)
+        serializer.is_valid(raise_exception=True)
+        result = apply_submission_batch(participation, serializer.validated_data)
+        return Response(result)
 
 
 class EventParticipationSlotViewSet(
+    FlushBufferedSubmissionsMixin,
+    RequestScopedObjectMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -1171,7 +1324,9 @@ class EventParticipationSlotViewSet(
         EventParticipationSlot.objects.all()
         .select_related("participation", "exercise")
         .prefetch_related("selected_choices")
-    )  # TODO FIXME optimize is_in_scope (no prefetching of base slots)
+    )
+    participation_url_kwarg = "participation_pk"
+    buffering_actions = ("patch_submission",)
 
     def get_capabilities(self):
         """
@@ -1216,7 +1371,10 @@ class EventParticipationSlotViewSet(
         qs = super().get_queryset()
         # TODO add ability to filter by exercise to get usages of an exercise
         return (
-            qs.filter(participation=self.kwargs["participation_pk"])
+            qs.filter(
+                participation=self.kwargs["participation_pk"],
+                participation__claimed=True,
+            )
             .select_related("exercise", "participation", "participation__event")
             .prefetch_related("sub_slots", "selected_choices")
         )
@@ -1232,8 +1390,23 @@ class EventParticipationSlotViewSet(
         Endpoint for updating the submission of a slot - this is preferred over a
         regular PATCH request because the only fields that can be updated are the
         ones related to the submission
+
+        If submissions are buffered (see courses.logic.submission_buffer),
+        the changes to the answer text and selected choices are validated
+        and buffered instead of being saved
         """
-        return self.partial_update(request, **kwargs)
+        if not is_write_behind_enabled():
+            return self.partial_update(request, **kwargs)
+
+        slot = self.get_object()
+        serializer = self.get_serializer(slot, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        submission = buffer_submission(slot, serializer.validated_data)
+        if submission is None:
+            # other fields have been changed, e.g. the attachment
+            flush_buffered_submissions([slot.participation_id])
+            return self.partial_update(request, **kwargs)
+        return Response({**serializer.data, **submission})
 
     @action(detail=True, methods=["post"])
     def run(self, request, **kwargs):
@@ -118,7 +118,7 @@ def create_demo_courses_for(user):
                             )
 
                 # clone event participation
-                for participation in event.participations.all():
+                for participation in event.participations.claimed():
                     # manually instantiate model to prevent triggering manager
                     new_participation = EventParticipation(
                         user=participation.user, event=new_event
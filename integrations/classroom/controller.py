@@ -81,7 +81,9 @@ class GoogleClassroomIntegrationController:
         """
         model_label = f"{EventParticipation._meta.app_label}.{EventParticipation._meta.model_name}"
         participation_ids = list(
-            EventParticipation.objects.filter(event=exam).values_list("pk", flat=True)
+            EventParticipation.objects.claimed()
+            .filter(event=exam)
+            .values_list("pk", flat=True)
         )
 
         method_name = (
@@ -13,7 +13,10 @@ class UserQuerySet(models.QuerySet):
         return self.annotate(
             participation_count=Count(
                 "participations",
-                filter=Q(participations__event__course_id=course_id),
+                filter=Q(
+                    participations__event__course_id=course_id,
+                    participations__claimed=True,
+                ),
             )
         ).filter(participation_count__gt=0)
 
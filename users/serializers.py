@@ -1,4 +1,5 @@
-from courses.logic.privileges import get_user_privileges
+from courses.logic.privileges import get_privileges_by_user, get_user_privileges
+from django.db.models import Manager
 from rest_framework import serializers
 
 from users.models import User
@@ -21,9 +22,20 @@ class UserCreationSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, Manager) else data)
+        course = self.context.get("course")
+        if course is not None:
+            # resolve the privileges of all the users at once
+            self.child.privileges_by_user = get_privileges_by_user(users, course)
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
+        list_serializer_class = UserListSerializer
         fields = [
             "id",
             "full_name",
@@ -51,5 +63,7 @@ class UserSerializer(serializers.ModelSerializer):
             self.fields["course_privileges"] = serializers.SerializerMethodField()
 
     def get_course_privileges(self, obj):
-        # !!
+        privileges_by_user = getattr(self, "privileges_by_user", {})
+        if obj.pk in privileges_by_user:
+            return privileges_by_user[obj.pk]
         return get_user_privileges(obj, self.context["course"])
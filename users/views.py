@@ -1,4 +1,4 @@
-from courses.models import Course, CourseRole, UserCoursePrivilege
+from courses.models import Course
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, viewsets, filters
 from rest_framework.decorators import action
@@ -7,8 +7,6 @@ from users.filters import UserFilter
 
 from users.models import User
 
-from django.db.models import Prefetch
-
 from users.pagination import UserPagination
 
 from . import policies
@@ -34,29 +32,6 @@ class UserViewSet(
     search_fields = ["first_name", "last_name", "email"]
     pagination_class = UserPagination
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-
-        if "course_id" in self.request.query_params:
-            qs = qs.prefetch_related(
-                Prefetch(
-                    "privileged_courses",
-                    queryset=UserCoursePrivilege.objects.filter(
-                        course_id=self.request.query_params["course_id"]
-                    ),
-                    to_attr="prefetched_privileged_courses",
-                ),
-                Prefetch(
-                    "roles",
-                    queryset=CourseRole.objects.filter(
-                        course_id=self.request.query_params["course_id"]
-                    ),
-                    to_attr="prefetched_course_roles",
-                ),
-            )
-
-        return qs
-
     def get_serializer_context(self):
         context = super().get_serializer_context()
         params = context["request"].query_params